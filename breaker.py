@@ -0,0 +1,125 @@
+# breaker.py
+import math
+import threading
+import time
+
+import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Request ditolak lokal karena circuit breaker endpoint sedang terbuka."""
+
+
+class CircuitBreaker:
+    """Circuit breaker untuk satu endpoint upstream (thread-safe).
+
+    closed: semua request lewat; failure_threshold kegagalan beruntun membuka
+    breaker. open: request langsung ditolak (CircuitOpenError) selama masa
+    backoff, yang berlipat dua setiap kali probe gagal (maks. max_backoff).
+    half_open: setelah backoff habis, satu request probe dibiarkan lewat;
+    sukses menutup breaker dan mereset backoff, gagal membukanya lagi.
+    Penjadwal bisa memesan probe itu lebih dulu lewat reserve() agar hanya
+    satu pekerjaan yang dijalankan selama half-open.
+    """
+
+    def __init__(self, name, failure_threshold=5, base_backoff=5.0, max_backoff=300.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = 0.0
+        self.backoff = base_backoff
+        self.probing = False
+        self.reserved_until = 0.0   # Probe half-open dipesan lewat reserve() hingga waktu ini
+        self.rejected = metrics.counter("circuit_rejected", "Request yang ditolak circuit breaker", endpoint=name)
+        metrics.gauge("circuit_state", lambda: _STATE_VALUES[self.state],
+                      "Status circuit breaker (0 closed, 1 half-open, 2 open)", endpoint=name)
+
+    def _refresh(self, now):
+        if self.state == OPEN and now - self.opened_at >= self.backoff:
+            self.state = HALF_OPEN
+            self.probing = False
+            self.reserved_until = 0.0
+
+    def _wait(self, now):
+        self._refresh(now)
+        if self.state == OPEN:
+            return self.opened_at + self.backoff - now
+        if self.state == HALF_OPEN:
+            if self.probing:
+                return self.base_backoff   # Menunggu hasil probe
+            if self.reserved_until > now:
+                return self.reserved_until - now
+        return 0.0
+
+    def retry_after(self, now=None):
+        """Detik sampai request boleh dicoba lagi (0 = boleh sekarang)."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            return self._wait(now)
+
+    def reserve(self, now=None):
+        """Seperti retry_after, tetapi jika 0 di half-open, probe dipesan untuk pemanggil ini.
+
+        Pemanggil lain melihat breaker sibuk sampai probe dikirim (allow) atau
+        pesanan kedaluwarsa setelah base_backoff detik (mis. ternyata tanpa request).
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            wait = self._wait(now)
+            if not wait and self.state == HALF_OPEN:
+                self.reserved_until = now + self.base_backoff
+            return wait
+
+    def allow(self, now=None):
+        """True jika request boleh dikirim; di half-open hanya satu probe sekaligus."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self._refresh(now)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                self.reserved_until = 0.0
+                return True
+        self.rejected.inc()
+        return False
+
+    def success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.trips = 0
+            self.backoff = self.base_backoff
+            self.probing = False
+            self.reserved_until = 0.0
+
+    def failure(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.backoff = min(self.max_backoff, self.base_backoff * 2 ** self.trips)
+                self.trips += 1
+                self.state = OPEN
+                self.opened_at = now
+                self.probing = False
+                return True
+        return False
+
+    def check(self):
+        """Naikkan CircuitOpenError jika request tidak boleh dikirim."""
+        if not self.allow():
+            raise CircuitOpenError(
+                f"Upstream {self.name} sedang gangguan, dicoba lagi dalam {math.ceil(self.retry_after())} detik"
+            )
@@ -0,0 +1,154 @@
+# cache.py
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+
+from metrics import TimedLock
+
+
+def normalize_key(text):
+    """Kunci normal untuk teks alamat (huruf kecil, spasi dirapikan)."""
+    return " ".join(text.lower().split())
+
+
+def snap_coordinate(lat, lon, grid):
+    """Kunci koordinat yang dibulatkan ke grid (derajat), mis. 0.0005 ≈ 55 m."""
+    return f"{round(lat / grid) * grid:.6f},{round(lon / grid) * grid:.6f}"
+
+
+class SqliteStore:
+    """Penyimpanan persisten sederhana (SQLite) untuk TTLCache.
+
+    max_rows (opsional) membatasi jumlah baris: purge_expired() membuang
+    baris yang paling cepat kedaluwarsa jika tabel melebihinya.
+    """
+
+    def __init__(self, path, table="cache", max_rows=None):
+        self.table = table
+        self.max_rows = max_rows
+        self.lock = TimedLock(f"sqlite_{table}")
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def get(self, key):
+        """Kembalikan (value, expires) atau None."""
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT value, expires FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires):
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires),
+            )
+
+    def purge_expired(self, now=None):
+        """Hapus baris kedaluwarsa (dan kelebihan di atas max_rows). Kembalikan jumlah baris yang dihapus."""
+        with self.lock, self.conn:
+            removed = self.conn.execute(
+                f"DELETE FROM {self.table} WHERE expires < ?", (now or time.time(),)
+            ).rowcount
+            if self.max_rows is not None:
+                removed += self.conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} "
+                    f"ORDER BY expires LIMIT max(0, (SELECT COUNT(*) FROM {self.table}) - ?))",
+                    (self.max_rows,),
+                ).rowcount
+        return removed
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class TTLCache:
+    """Cache LRU terbatas dengan masa berlaku (TTL) per entri, thread-safe.
+
+    Jika diberi store (mis. SqliteStore), entri juga ditulis ke disk sehingga
+    restart berikutnya bisa langsung memakai hasil lama tanpa request jaringan.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, store=None, name="cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self.data = OrderedDict()
+        self.lock = TimedLock(name)
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self.data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.data[key]
+
+        if self.store is not None:
+            stored = self.store.get(key)
+            if stored is not None and stored[1] > now:
+                with self.lock:
+                    self._put(key, stored[0], stored[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                return stored[0]
+
+        with self.lock:
+            self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + (ttl if ttl is not None else self.ttl)
+        with self.lock:
+            self._put(key, value, expires)
+        if self.store is not None:
+            self.store.set(key, value, expires)
+
+    def _put(self, key, value, expires):
+        self.data[key] = (value, expires)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def purge(self):
+        """Buang entri kedaluwarsa dari memori dan store. Kembalikan jumlah baris store yang dihapus."""
+        now = time.time()
+        with self.lock:
+            for key in [key for key, (_, expires) in self.data.items() if expires <= now]:
+                del self.data[key]
+        return self.store.purge_expired(now) if self.store is not None else 0
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
@@ -3,16 +3,22 @@ import socket
 import threading
 import sys
 import time
+import config
 
-SERVER_HOST = "192.168.182.227"  # Ganti dengan IP publik/server Anda saat deploy
-SERVER_PORT = 5005
+# Alamat server: --server/--port, env TRAFFIC_SERVER/SERVER_PORT, atau trafficflow.json
+cfg = config.load(("server", "port"), argv=None if __name__ == "__main__" else [],
+                  description="Client teks monitor lalu lintas")
+SERVER_HOST = cfg.server
+SERVER_PORT = cfg.port
+PING_INTERVAL = 30  # detik; keepalive agar server tidak menganggap client mati
 
 def receive_messages(sock):
     """Terima pesan dari server."""
     while True:
         try:
             data, _ = sock.recvfrom(1024)
-            print(data.decode())
+            if data != b"PONG":
+                print(data.decode())
         except Exception as e:
             print(f"[ERROR] {e}")
             break
@@ -29,9 +35,14 @@ if __name__ == "__main__":
 
     try:
         print("[CLIENT] Menunggu pesan dari server. Tekan Ctrl+C untuk keluar.")
+        last_ping = time.time()
         while True:
             time.sleep(1)
+            if time.time() - last_ping >= PING_INTERVAL:
+                sock.sendto(b"PING", (SERVER_HOST, SERVER_PORT))
+                last_ping = time.time()
     except KeyboardInterrupt:
         print("\n[CLIENT] Keluar.")
+        sock.sendto(b"QUIT", (SERVER_HOST, SERVER_PORT))
         sock.close()
         sys.exit()
\ No newline at end of file
@@ -3,20 +3,48 @@ import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import re
-import os 
+import time
+from collections import deque
+import config
+import protocol
+from logwriter import LogWriter
 
 # === Konfigurasi Server ===
-SERVER_HOST = "192.168.14.67" 
-SERVER_PORT = 5005
+# Alamat server: --server/--port, env TRAFFIC_SERVER/SERVER_PORT, atau trafficflow.json
+cfg = config.load(("server", "port"), argv=None if __name__ == "__main__" else [],
+                  description="Monitor lalu lintas (GUI)")
+SERVER_HOST = cfg.server
+SERVER_PORT = cfg.port
+PING_INTERVAL = 30  # detik; keepalive agar server tidak menganggap client mati
 
 # === Konfigurasi File Log ===
 LOG_FILE = "traffic_monitor_log.txt"
-if not os.path.exists(LOG_FILE):
-    try:
-        with open(LOG_FILE, "w", encoding="utf-8") as f:
-            f.write("--- Log Monitor Lalu Lintas Dimulai ---\n")
-    except IOError as e:
-        print(f"Peringatan: Gagal membuat file log awal: {e}")
+LOG_MAX_BYTES = 5 * 1024 * 1024   # File log diputar setelah ukuran ini (riwayat lengkap tetap di disk)
+LOG_VIEW_LINES = 500              # Baris terakhir yang ditampilkan di widget log
+FRAME_INTERVAL_MS = 100           # Tampilan (data & log) digambar ulang maksimal 10× per detik
+RECV_BUFFER = 1024 * 1024         # Buffer socket (byte) agar burst update tidak dibuang kernel
+
+# Kolom tabel dashboard: id kolom → (judul, lebar, key data untuk sorting)
+DASHBOARD_COLUMNS = {
+    "lokasi": ("Lokasi", 200, "kunci"),
+    "jalan": ("Jalan", 200, "lokasi"),
+    "kecepatan": ("Kecepatan (km/jam)", 120, "kecepatan"),
+    "kemacetan": ("Kemacetan (%)", 110, "kemacetan"),
+    "confidence": ("Confidence", 90, "confidence"),
+    "waktu": ("Waktu Update", 150, "waktu"),
+}
+
+
+# Pola pesan teks [LALU LINTAS] (fallback jika server tidak memakai mode biner)
+TRAFFIC_PATTERN = re.compile(
+    r"\[LALU LINTAS\] (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) \| "
+    r"Lokasi: ([^|]+) \| "
+    r"Kecepatan: (\d+) km/jam \| "
+    r"Kemacetan: ([\d.]+)% \| "
+    r"Confidence: ([\d.]+)"
+)
+# Alamat pantauan di akhir pesan teks server2 (key untuk UNSUBSCRIBE); server lama tidak mengirimnya
+ADDRESS_PATTERN = re.compile(r"\| Alamat: ([^|]+)$")
 
 
 class TrafficMonitorApp:
@@ -63,11 +91,19 @@ class TrafficMonitorApp:
         # --- PERUBAHAN 2: Tambahkan Tombol Reset ---
         self.reset_button = ttk.Button(search_frame, text="Reset", command=self.request_reset, style="Danger.TButton")
         self.reset_button.pack(side="left", padx=(5, 0))
+
+        # Mode dashboard: pantau banyak lokasi sekaligus (SUBSCRIBE) dalam satu tabel
+        self.add_button = ttk.Button(search_frame, text="Tambah", command=self.request_subscribe)
+        self.add_button.pack(side="left", padx=(5, 0))
+        self.dashboard_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_frame, text="Dashboard", variable=self.dashboard_mode,
+                        command=self.toggle_dashboard).pack(side="left", padx=(10, 0))
         
         
         # --- LabelFrame untuk Data Real-Time ---
         realtime_labelframe = ttk.LabelFrame(root, text="ℹ️ Data Real-Time", style="TLabelframe")
         realtime_labelframe.pack(fill="x", padx=20, pady=5)
+        self.realtime_labelframe = realtime_labelframe
 
         info_frame = ttk.Frame(realtime_labelframe, style="TFrame", padding=5)
         info_frame.pack(fill="x", padx=10, pady=5)
@@ -111,21 +147,69 @@ class TrafficMonitorApp:
         # --- LabelFrame untuk Log ---
         log_labelframe = ttk.LabelFrame(root, text="📜 Riwayat & Log Server", style="TLabelframe")
         log_labelframe.pack(fill="both", expand=True, padx=20, pady=(10, 20)) 
+        self.log_labelframe = log_labelframe
+
+        # --- LabelFrame untuk Dashboard (disembunyikan sampai mode dashboard aktif) ---
+        self.dashboard_labelframe = ttk.LabelFrame(root, text="📊 Dashboard Lokasi", style="TLabelframe")
+        self.tree = ttk.Treeview(self.dashboard_labelframe, columns=tuple(DASHBOARD_COLUMNS), show="headings", height=12)
+        for column, (title, width, _) in DASHBOARD_COLUMNS.items():
+            self.tree.heading(column, text=title, command=lambda c=column: self.sort_dashboard(c))
+            self.tree.column(column, width=width, anchor="w" if column in ("lokasi", "jalan") else "center")
+        tree_scroll = ttk.Scrollbar(self.dashboard_labelframe, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=tree_scroll.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        tree_scroll.pack(side="right", fill="y")
+        self.tree.tag_configure("hijau", background="#d4edda")
+        self.tree.tag_configure("kuning", background="#fff3cd")
+        self.tree.tag_configure("merah", background="#f8d7da")
+        self.tree.bind("<Delete>", self.request_unsubscribe)
+        # Baris tabel: kunci lokasi → nilai yang sedang tampil; urutan baris mengikuti sort_column
+        self.rows = {}
+        self.row_order = []
+        self.dirty_rows = set()
+        self.sort_column = "kemacetan"
+        self.sort_reverse = True
 
         self.log_text = scrolledtext.ScrolledText(log_labelframe, wrap=tk.WORD, height=15, font=("Consolas", 10), relief=tk.FLAT)
         self.log_text.pack(fill="both", expand=True, padx=5, pady=5)
         self.log_text.config(state=tk.DISABLED, background="#ffffff") 
 
+        # Log: file ditulis thread latar; widget hanya menyimpan LOG_VIEW_LINES baris terakhir
+        self.log_writer = LogWriter(LOG_FILE, max_bytes=LOG_MAX_BYTES, header="--- Log Monitor Lalu Lintas Dimulai ---")
+        self.pending_log = []
+        self.log_lines = 0
+
+        # Datagram dari thread penerima; diproses sekaligus tiap frame di main thread
+        self.inbox = deque()
+        # State terakhir per lokasi dan lokasi yang terakhir berubah (ditampilkan di frame berikutnya)
+        self.latest = {}
+        self.display_pending = None
+        self.congestion_style = None
+
+        # Tabel nama dari server (protokol biner): id → nama jalan/lokasi
+        self.names = {}
+        self.requested_names = set()
+        # State terakhir per lokasi (mode delta): loc_id → record lengkap
+        self.streams = {}
+        self.resync_pending = set()
+
         # Buat socket
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         try:
-            self.sock.sendto(b"JOIN", (SERVER_HOST, SERVER_PORT))
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER)
+        except OSError:
+            pass  # Batas OS lebih kecil; pakai default
+        try:
+            # Minta protokol biner + delta; server lama tetap mengirim teks
+            self.sock.sendto(b"JOIN:BIN,DELTA", (SERVER_HOST, SERVER_PORT))
         except Exception as e:
             messagebox.showerror("Koneksi Gagal", f"Tidak dapat terhubung ke server di {SERVER_HOST}:{SERVER_PORT}\nError: {e}")
             self.root.destroy()
             return
             
         threading.Thread(target=self.receive_messages, daemon=True).start()
+        self.root.after(FRAME_INTERVAL_MS, self.render_frame)
+        self.root.after(PING_INTERVAL * 1000, self.send_ping)
 
     def request_new_location(self, event=None):
         """Ambil teks dari entry dan kirim ke server."""
@@ -169,8 +253,15 @@ class TrafficMonitorApp:
             foreground=self.default_label_fg, 
             font=self.default_label_font
         )
+        self.congestion_style = None
         self.confidence_var.set("—")
         self.timestamp_var.set("—")
+        self.latest.clear()
+        self.display_pending = None
+        self.tree.delete(*self.rows)
+        self.rows.clear()
+        self.row_order = []
+        self.dirty_rows.clear()
 
 
     def update_display(self, data_dict):
@@ -188,53 +279,199 @@ class TrafficMonitorApp:
         else:
             color, fg = "#f8d7da", "#721c24" # Merah
         
-        self.congestion_label.config(background=color, foreground=fg, font=font_style)
+        # Style label hanya diganti jika kategori warnanya berubah
+        if self.congestion_style != color:
+            self.congestion_label.config(background=color, foreground=fg, font=font_style)
+            self.congestion_style = color
         self.confidence_var.set(f"{data_dict.get('confidence', 0):.4f}")
-        self.timestamp_var.set(data_dict.get("waktu", "—"))
+        self.timestamp_var.set(self.format_time(data_dict))
+
+    @staticmethod
+    def format_time(data_dict):
+        """Waktu update, dengan penanda jika data basi."""
+        waktu = data_dict.get("waktu", "—")
+        return f"{waktu} (basi)" if data_dict.get("basi") else waktu
 
     def add_log(self, raw_message):
-        """Tambahkan pesan ke GUI log DAN simpan ke file."""
-        try:
-            self.log_text.config(state=tk.NORMAL)
-            self.log_text.insert(tk.END, f"{raw_message}\n")
-            self.log_text.yview(tk.END) 
-            self.log_text.config(state=tk.DISABLED)
-        except tk.TclError as e:
-            print(f"Error updating GUI log: {e}")
+        """Tambahkan pesan ke GUI log DAN simpan ke file (keduanya dibatch, tidak menulis langsung)."""
+        self.log_writer.write(raw_message)
+        self.pending_log.append(raw_message)
+
+    def show(self, parsed):
+        """Catat state terbaru satu lokasi; digambar pada frame berikutnya (update beruntun digabung)."""
+        self.latest[parsed["kunci"]] = parsed
+        self.dirty_rows.add(parsed["kunci"])
+        self.display_pending = parsed
+
+    def request_subscribe(self, event=None):
+        """Tambah lokasi ke dashboard (SUBSCRIBE) tanpa melepas lokasi lain."""
+        address = self.address_entry.get().strip()
+        if not address:
+            messagebox.showwarning("Input Kosong", "Silakan masukkan nama jalan atau lokasi.")
+            return
+        self.send_command(f"SUBSCRIBE:{address}")
+        self.add_log(f"[CLIENT] Menambah lokasi ke dashboard: '{address}'")
+        self.address_entry.delete(0, tk.END)
+        if not self.dashboard_mode.get():
+            self.dashboard_mode.set(True)
+            self.toggle_dashboard()
+
+    def request_unsubscribe(self, event=None):
+        """Hapus baris terpilih dari dashboard (UNSUBSCRIBE)."""
+        for key in self.tree.selection():
+            self.send_command(f"UNSUBSCRIBE:{key}")
+            self.add_log(f"[CLIENT] Berhenti memantau: '{key}'")
+            self.tree.delete(key)
+            self.rows.pop(key, None)
+            self.latest.pop(key, None)
+            self.dirty_rows.discard(key)
+            self.row_order.remove(key)
+
+    def toggle_dashboard(self):
+        """Tukar panel data tunggal dengan tabel dashboard."""
+        if self.dashboard_mode.get():
+            self.realtime_labelframe.pack_forget()
+            self.dashboard_labelframe.pack(fill="both", expand=True, padx=20, pady=5, before=self.log_labelframe)
+        else:
+            self.dashboard_labelframe.pack_forget()
+            self.realtime_labelframe.pack(fill="x", padx=20, pady=5, before=self.log_labelframe)
 
-        try:
-            with open(LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(f"{raw_message}\n")
-        except IOError as e:
-            print(f"ERROR: Gagal menyimpan log ke {LOG_FILE}: {e}")
+    def sort_dashboard(self, column):
+        """Klik judul kolom: urutkan menurut kolom itu (klik lagi membalik urutan)."""
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = column in ("kemacetan",)
+        for col, (title, _, _) in DASHBOARD_COLUMNS.items():
+            arrow = (" ▼" if self.sort_reverse else " ▲") if col == self.sort_column else ""
+            self.tree.heading(col, text=title + arrow)
+        self.reorder_rows()
+
+    def reorder_rows(self):
+        """Urutkan ulang semua baris (setelah ganti kolom sort); hanya baris yang posisinya salah yang dipindah."""
+        field = DASHBOARD_COLUMNS[self.sort_column][2]
+        order = sorted(self.rows, key=lambda k: self.latest[k][field], reverse=self.sort_reverse)
+        current = self.row_order
+        for index, key in enumerate(order):
+            if current[index] != key:
+                self.tree.move(key, "", index)
+                current.remove(key)
+                current.insert(index, key)
+
+    def row_position(self, value):
+        """Indeks sisip (binary search) untuk nilai sort value di row_order yang sudah terurut."""
+        field = DASHBOARD_COLUMNS[self.sort_column][2]
+        lo, hi = 0, len(self.row_order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            other = self.latest[self.row_order[mid]][field]
+            if (other >= value) if self.sort_reverse else (other <= value):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def render_dashboard(self):
+        """Perbarui baris dashboard yang datanya berubah sejak frame sebelumnya (di tempat, tanpa membangun ulang tabel)."""
+        if not self.dirty_rows:
+            return
+        field = DASHBOARD_COLUMNS[self.sort_column][2]
+        sort_index = list(DASHBOARD_COLUMNS).index(self.sort_column)
+        moved = []   # (key, nilai & tag baris baru, atau None jika baris sudah ada)
+        for key in self.dirty_rows:
+            data = self.latest.get(key)
+            if data is None:
+                continue
+            values = (key, data["lokasi"], data["kecepatan"], data["kemacetan"], f"{data['confidence']:.4f}", self.format_time(data))
+            old = self.rows.get(key)
+            if old == values:
+                continue
+            congestion = data["kemacetan"]
+            tag = "hijau" if congestion < 30 else "kuning" if congestion < 70 else "merah"
+            if old is None:
+                moved.append((key, values, tag))
+            else:
+                self.tree.item(key, values=values, tags=(tag,))
+                if old[sort_index] != values[sort_index]:
+                    # Lepas dulu agar isi tabel tetap sama dengan row_order selama penyisipan
+                    self.tree.detach(key)
+                    self.row_order.remove(key)
+                    moved.append((key, None, None))
+            self.rows[key] = values
+        self.dirty_rows.clear()
+        # Baris lain tetap terurut; hanya baris baru / yang nilai sort-nya berubah disisipkan (binary search)
+        for key, values, tag in moved:
+            index = self.row_position(self.latest[key][field])
+            self.row_order.insert(index, key)
+            if values is None:
+                self.tree.move(key, "", index)
+            else:
+                self.tree.insert("", index, iid=key, values=values, tags=(tag,))
+
+    def render_frame(self):
+        """Satu frame: proses semua datagram yang masuk sejak frame sebelumnya, lalu gambar ulang sekali."""
+        while self.inbox:
+            data = self.inbox.popleft()
+            if protocol.is_binary(data):
+                decoded = protocol.decode(data)
+                if decoded:
+                    self.handle_binary_message(*decoded)
+                continue
+            # Snapshot teks bisa berisi beberapa pesan, satu per baris
+            for raw_msg in data.decode("utf-8", errors="replace").strip().split("\n"):
+                self.handle_received_message(raw_msg.strip())
+        if self.display_pending is not None:
+            self.update_display(self.display_pending)
+            self.display_pending = None
+        self.render_dashboard()
+        self.flush_log_view()
+        self.root.after(FRAME_INTERVAL_MS, self.render_frame)
+
+    def flush_log_view(self):
+        """Masukkan baris log yang menunggu ke widget sekaligus, lalu buang baris lama di atas LOG_VIEW_LINES."""
+        if self.pending_log:
+            lines = self.pending_log[-LOG_VIEW_LINES:]
+            self.pending_log = []
+            try:
+                # Gulir otomatis hanya jika pengguna sedang melihat bagian bawah log
+                at_bottom = self.log_text.yview()[1] >= 0.999
+                self.log_text.config(state=tk.NORMAL)
+                self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+                self.log_lines += len(lines)
+                excess = self.log_lines - LOG_VIEW_LINES
+                if excess > 0:
+                    self.log_text.delete("1.0", f"{excess + 1}.0")
+                    self.log_lines = LOG_VIEW_LINES
+                self.log_text.config(state=tk.DISABLED)
+                if at_bottom:
+                    self.log_text.yview(tk.END)
+            except tk.TclError as e:
+                print(f"Error updating GUI log: {e}")
 
     def parse_message(self, message):
         """Parsing pesan data lalu lintas (Regex)."""
-        pattern = (
-            r"\[LALU LINTAS\] (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) \| "
-            r"Lokasi: ([^|]+) \| "
-            r"Kecepatan: (\d+) km/jam \| "
-            r"Kemacetan: ([\d.]+)% \| "
-            r"Confidence: ([\d.]+)"
-        )
-        match = re.search(pattern, message)
+        match = TRAFFIC_PATTERN.search(message)
         if match:
+            address = ADDRESS_PATTERN.search(message)
             return {
                 "waktu": match.group(1),
+                # Key baris = alamat pantauan; tanpa alamat (server lama / koridor) pakai nama jalan
+                "kunci": address.group(1).strip() if address else match.group(2).strip(),
                 "lokasi": match.group(2).strip(),
                 "kecepatan": int(match.group(3)),
                 "kemacetan": float(match.group(4)),
-                "confidence": float(match.group(5))
+                "confidence": float(match.group(5)),
+                "basi": "| BASI" in message,   # Data lama, upstream server sedang gangguan
             }
         return None
 
     def receive_messages(self):
-        """Thread untuk menerima pesan UDP."""
+        """Thread untuk menerima pesan UDP; datagram hanya diantrekan, diproses per frame di main thread."""
         while True:
             try:
                 data, _ = self.sock.recvfrom(2048)
-                raw_msg = data.decode("utf-8", errors="replace").strip()
-                self.root.after(0, self.handle_received_message, raw_msg)
+                self.inbox.append(data)
             except Exception as e:
                 if self.sock._closed:
                     print("[CLIENT] Socket ditutup, thread penerima berhenti.")
@@ -246,12 +483,14 @@ class TrafficMonitorApp:
     # --- PERUBAHAN 5: Modifikasi handler untuk mengenali pesan RESET ---
     def handle_received_message(self, raw_msg):
         """Fungsi yang dipanggil di main thread untuk memproses pesan."""
+        if raw_msg == "PONG":
+            return
         self.add_log(raw_msg)
         
         if raw_msg.startswith("[LALU LINTAS]"):
             parsed = self.parse_message(raw_msg)
             if parsed:
-                self.update_display(parsed)
+                self.show(parsed)
         
         # Cek apakah ini pesan konfirmasi reset atau standby dari server
         elif "Pemantauan dihentikan" in raw_msg or "mode standby" in raw_msg:
@@ -259,9 +498,98 @@ class TrafficMonitorApp:
             self.clear_display()
 
 
+    def handle_binary_message(self, msg_type, records):
+        """Proses datagram biner (tabel nama atau batch update) di main thread."""
+        if msg_type == protocol.MSG_NAMES:
+            for name_id, name in records:
+                self.names[name_id] = name
+                self.requested_names.discard(name_id)
+            return
+
+        missing = set()
+        for record in records:
+            record = self.apply_stream_record(msg_type, record)
+            if record is None:
+                continue
+            road = self.names.get(record["road_id"])
+            if road is None:
+                missing.add(record["road_id"])
+                road = f"#{record['road_id']}"
+            location = self.names.get(record["loc_id"])
+            if location is None:
+                missing.add(record["loc_id"])
+                location = f"#{record['loc_id']}"
+            parsed = {
+                "waktu": time.strftime(protocol.TIMESTAMP_FORMAT, time.localtime(record["epoch"])),
+                "kunci": location,
+                "lokasi": road,
+                "kecepatan": record["current_speed"],
+                "kemacetan": record["congestion_percent"],
+                "confidence": record["confidence"],
+                "basi": bool(record["flags"] & protocol.FLAG_STALE),
+            }
+            self.add_log(
+                f"[LALU LINTAS] {parsed['waktu']} | Lokasi: {parsed['lokasi']} | "
+                f"Kecepatan: {parsed['kecepatan']} km/jam | Kemacetan: {parsed['kemacetan']}% | "
+                f"Confidence: {parsed['confidence']}" + (" | BASI" if parsed["basi"] else "")
+            )
+            self.show(parsed)
+
+        # Nama belum dikenal (paket tabel nama hilang): minta ulang sekali
+        missing -= self.requested_names
+        if missing:
+            self.requested_names |= missing
+            self.send_command("NAMES:" + ",".join(str(i) for i in sorted(missing)))
+
+    def apply_stream_record(self, msg_type, record):
+        """Gabungkan keyframe/delta ke state lokasi. Kembalikan state lengkap, atau None jika perlu resync."""
+        loc_id = record["loc_id"]
+        state = self.streams.get(loc_id)
+        if msg_type == protocol.MSG_UPDATE:
+            # Keyframe selalu diterima kecuali lebih tua dari state yang ada
+            if state is not None and 0 < state["seq"] - record["seq"] < 0x80000000:
+                return None
+            self.streams[loc_id] = record
+            self.resync_pending.discard(loc_id)
+            return record
+
+        if state is None or record["seq"] != (state["seq"] + 1) & 0xFFFFFFFF:
+            if state is not None and record["seq"] <= state["seq"]:
+                return None  # Duplikat / terlambat
+            # Ada paket yang hilang: minta update yang terlewat sekali sampai keyframe diterima
+            # (server mengirim keyframe terakhir saja jika sudah keluar dari buffer replay)
+            if loc_id not in self.resync_pending:
+                self.resync_pending.add(loc_id)
+                if state is None:
+                    self.send_command(f"RESYNC:{loc_id}")
+                else:
+                    self.send_command(f"REPLAY:{loc_id},{(state['seq'] + 1) & 0xFFFFFFFF}")
+            return None
+
+        state = dict(state)
+        state.update(record)
+        state["epoch"] = self.streams[loc_id]["epoch"] + record["age"]
+        del state["age"]
+        self.streams[loc_id] = state
+        return state
+
+    def send_ping(self):
+        """Kirim keepalive berkala ke server."""
+        self.send_command("PING")
+        self.root.after(PING_INTERVAL * 1000, self.send_ping)
+
+    def send_command(self, command):
+        """Kirim perintah kontrol kecil ke server (PING, QUIT, NAMES, RESYNC, REPLAY)."""
+        try:
+            self.sock.sendto(command.encode(), (SERVER_HOST, SERVER_PORT))
+        except OSError as e:
+            print(f"[GUI ERROR] Gagal mengirim {command}: {e}")
+
     def on_closing(self):
         """Handler saat jendela ditutup."""
         print("[CLIENT] Menutup aplikasi...")
+        self.send_command("QUIT")
+        self.log_writer.close()
         self.sock.close()
         self.root.destroy()
 
@@ -0,0 +1,116 @@
+# config.py
+# Konfigurasi bersama server & client: default < file < environment < flag CLI.
+#
+# File konfigurasi berformat JSON (key = nama opsi di OPTIONS), dibaca dari
+# --config, env TRAFFIC_CONFIG, atau CONFIG_FILE di direktori kerja jika ada.
+# Variabel .env dimuat lebih dulu bila python-dotenv terpasang. Setiap entry
+# point hanya menampilkan opsi yang dipakainya, mis.:
+#
+#   python server2.py --port 5006 --watch "Jalan Darmo, Surabaya;Jalan Ahmad Yani, Surabaya"
+#   python server2.py --upstream http://127.0.0.1:8081      # mock_tomtom.py
+#   python clientGui.py --server 192.168.1.10
+import argparse
+import json
+import os
+import sys
+from typing import NamedTuple
+
+CONFIG_FILE = "trafficflow.json"
+CONFIG_ENV = "TRAFFIC_CONFIG"
+
+
+class Option(NamedTuple):
+    env: str        # Nama variabel environment
+    type: type      # str, int, float, list (string dipisah ';'), atau dict (objek JSON nama → list)
+    default: object
+    help: str
+
+
+OPTIONS = {
+    "host": Option("SERVER_HOST", str, "0.0.0.0", "alamat bind server"),
+    "port": Option("SERVER_PORT", int, 5005, "port UDP server"),
+    "server": Option("TRAFFIC_SERVER", str, "127.0.0.1", "alamat server yang dihubungi client"),
+    "interval": Option("UPDATE_INTERVAL", float, 3.5, "interval update awal (detik)"),
+    "watch": Option("WATCH_LOCATIONS", list, (), "lokasi yang dipantau sejak start, dipisah ';'"),
+    "upstream": Option("TOMTOM_BASE_URL", str, "https://api.tomtom.com", "URL dasar TomTom API (atau mock_tomtom.py)"),
+    "workers": Option("SERVER_WORKERS", int, 1, "jumlah proses worker (SO_REUSEPORT)"),
+    "corridors": Option("CORRIDORS", dict, {}, 'koridor jalan, JSON {"nama": ["alamat titik", ...]}'),
+}
+
+
+def _split(value):
+    if isinstance(value, str):
+        value = value.split(";")
+    return tuple(item.strip() for item in value if item and item.strip())
+
+
+def _convert(option, value):
+    if option.type is list:
+        return _split(value)
+    if option.type is dict:
+        if isinstance(value, str):
+            value = json.loads(value) if value.strip() else {}
+        if not isinstance(value, dict):
+            raise ValueError(value)
+        return {str(name): _split(items) for name, items in value.items()}
+    return option.type(value)
+
+
+def _read_file(path, required):
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        if required:
+            raise ValueError(f"File konfigurasi tidak ditemukan: {path}")
+        return {}
+    except json.JSONDecodeError as e:
+        raise ValueError(f"File konfigurasi {path} tidak valid: {e}")
+    if not isinstance(data, dict):
+        raise ValueError(f"File konfigurasi {path} harus berisi objek JSON")
+    return data
+
+
+def _load_dotenv():
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+
+def load(names, argv=None, description=None):
+    """Namespace berisi opsi `names` (key OPTIONS) dari default, file, env, dan argv.
+
+    argv=None memakai sys.argv[1:]; argumen yang tidak dikenal diabaikan.
+    Nilai yang tidak valid menghentikan program dengan pesan error argparse.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    _load_dotenv()
+    # --help baru ditambahkan setelah semua opsi terdaftar agar tampil lengkap
+    parser = argparse.ArgumentParser(description=description, add_help=False)
+    parser.add_argument("--config", metavar="FILE",
+                        help=f"file konfigurasi JSON (default: ${CONFIG_ENV} atau {CONFIG_FILE})")
+    pre, _ = parser.parse_known_args(argv)
+    path = pre.config or os.getenv(CONFIG_ENV)
+    try:
+        data = _read_file(path or CONFIG_FILE, required=bool(path))
+    except ValueError as e:
+        parser.error(str(e))
+
+    for name in names:
+        option = OPTIONS[name]
+        value, source = option.default, None
+        if name in data:
+            value, source = data[name], path or CONFIG_FILE
+        if os.getenv(option.env) is not None:
+            value, source = os.environ[option.env], option.env
+        try:
+            value = _convert(option, value)
+        except (TypeError, ValueError):
+            parser.error(f"Nilai {name} tidak valid dari {source}: {value!r}")
+        parser.add_argument(f"--{name}", type=lambda v, o=option: _convert(o, v), default=value,
+                            help=f"{option.help} (env {option.env}, default: %(default)s)")
+    parser.add_argument("-h", "--help", action="help", help="tampilkan bantuan ini lalu keluar")
+    args, _ = parser.parse_known_args(argv)
+    return args
@@ -0,0 +1,117 @@
+# corridor.py
+# Agregasi koridor jalan: sekelompok titik pantau bernama yang diterbitkan
+# sebagai satu topik.
+#
+# Setiap update titik anggota memperbarui jumlah berbobot (bobot = panjang
+# segmen jalan titik itu) dengan mengurangi kontribusi lamanya lalu menambah
+# yang baru, jadi kecepatan rata-rata koridor dihitung O(1) per update. Titik
+# terpadat hanya dicari ulang dari semua anggota jika titik terpadat saat ini
+# membaik.
+from flowdata import TrafficSummary
+
+
+class Corridor:
+    """Agregat satu koridor aktif: ringkasan terakhir tiap titik anggota.
+
+    Punya atribut key & name seperti lokasi watch-list, sehingga bisa
+    diterbitkan lewat jalur publish yang sama (stream, snapshot, REPLAY).
+    """
+
+    def __init__(self, key, name, members):
+        self.key = key
+        self.name = name
+        self.members = tuple(dict.fromkeys(members))   # key titik anggota (tanpa duplikat)
+        self.latest = {}                # key titik → (TrafficSummary, bobot)
+        self.weight = 0.0               # Jumlah bobot anggota yang sudah punya data
+        self.speed = 0.0                # Jumlah kecepatan × bobot
+        self.free_speed = 0.0
+        self.confidence = 0.0
+        self.stale = 0                  # Jumlah anggota yang datanya basi
+        self.epoch = 0
+        self.worst = None               # key titik dengan kemacetan tertinggi
+        self.published = 0.0            # Waktu monotonic publikasi terakhir, atau publikasi terjadwal (diatur server)
+
+    def _add(self, summary, weight, sign):
+        self.weight += sign * weight
+        self.speed += sign * weight * summary.current_speed
+        self.free_speed += sign * weight * summary.free_flow_speed
+        self.confidence += sign * weight * summary.confidence
+        self.stale += sign * summary.stale
+
+    def update(self, key, summary, length=None):
+        """Catat ringkasan terbaru titik key. length = panjang segmen (meter); None/0 → bobot 1."""
+        old = self.latest.get(key)
+        if old is not None:
+            self._add(*old, -1)
+        weight = length or 1.0
+        self.latest[key] = (summary, weight)
+        self._add(summary, weight, 1)
+        self.epoch = max(self.epoch, summary.epoch)
+        if self.worst is None:
+            self.worst = key
+        elif key != self.worst:
+            if summary.congestion_percent > self.latest[self.worst][0].congestion_percent:
+                self.worst = key
+        elif old is not None and summary.congestion_percent < old[0].congestion_percent:
+            # Titik terpadat membaik: anggota lain mungkin kini lebih padat
+            self.worst = max(self.latest, key=lambda k: self.latest[k][0].congestion_percent)
+
+    def summary(self):
+        """TrafficSummary agregat, atau None jika belum ada anggota yang punya data.
+
+        Kecepatan & confidence: rata-rata berbobot panjang segmen. Kemacetan,
+        koordinat, dan nama jalan: milik titik terpadat. Basi jika ada anggota basi.
+        """
+        if not self.latest:
+            return None
+        worst = self.latest[self.worst][0]
+        return TrafficSummary(
+            self.epoch, worst.latitude, worst.longitude, worst.road_name,
+            round(self.speed / self.weight), round(self.free_speed / self.weight),
+            worst.congestion_percent, round(self.confidence / self.weight, 3), self.stale > 0,
+        )
+
+
+class CorridorIndex:
+    """Definisi koridor (key → nama & alamat titik) dan koridor yang sedang aktif."""
+
+    def __init__(self):
+        self.definitions = {}   # key koridor → (nama, alamat titik)
+        self.active = {}        # key koridor → Corridor
+        self.by_member = {}     # key titik → set Corridor aktif yang memuatnya
+
+    def define(self, key, name, addresses):
+        self.definitions[key] = (name, tuple(addresses))
+
+    def activate(self, key, members):
+        """Aktifkan koridor key dengan titik anggota members (key titik yang sudah dipantau)."""
+        corridor = self.active.get(key)
+        if corridor is None:
+            corridor = self.active[key] = Corridor(key, self.definitions[key][0], members)
+            for member in corridor.members:
+                self.by_member.setdefault(member, set()).add(corridor)
+        return corridor
+
+    def deactivate(self, key):
+        """Nonaktifkan koridor key. Kembalikan Corridor-nya, atau None jika tidak aktif."""
+        corridor = self.active.pop(key, None)
+        if corridor is not None:
+            for member in corridor.members:
+                corridors = self.by_member.get(member)
+                corridors.discard(corridor)
+                if not corridors:
+                    del self.by_member[member]
+        return corridor
+
+    def of_member(self, key):
+        """Koridor aktif yang memuat titik key."""
+        return self.by_member.get(key, ())
+
+    def holds(self, key):
+        """True jika titik key masih dibutuhkan koridor aktif."""
+        return key in self.by_member
+
+    def clear(self):
+        """Nonaktifkan semua koridor (definisi tetap)."""
+        self.active.clear()
+        self.by_member.clear()
@@ -0,0 +1,26 @@
+# eventbus.py
+from logutil import get_logger
+
+log = get_logger("eventbus")
+
+
+class EventBus:
+    """Bus event internal sederhana di atas event loop asyncio.
+
+    Handler didaftarkan per topik dan dipanggil sinkron oleh publish, yang
+    hanya dipanggil dari thread event loop (hasil worker HTTP kembali ke loop
+    lewat run_in_executor sebelum diterbitkan).
+    """
+
+    def __init__(self):
+        self.handlers = {}
+
+    def subscribe(self, topic, handler):
+        self.handlers.setdefault(topic, []).append(handler)
+
+    def publish(self, topic, *args):
+        for handler in self.handlers.get(topic, ()):
+            try:
+                handler(*args)
+            except Exception as e:
+                log.error("[BUS ERROR] Handler '%s' gagal: %s", topic, e)
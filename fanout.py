@@ -0,0 +1,170 @@
+# fanout.py
+import asyncio
+import time
+
+import metrics
+import protocol
+from logutil import get_logger
+
+log = get_logger("fanout")
+
+DATAGRAMS_OUT = metrics.counter("datagrams_out", "Datagram terkirim ke client")
+BYTES_OUT = metrics.counter("bytes_out", "Byte terkirim ke client")
+SEND_ERRORS = metrics.counter("send_errors", "Pengiriman ke client yang gagal")
+FLUSH_SECONDS = metrics.histogram("broadcast_seconds", "Lama satu flush batch fan-out")
+
+
+class SubscriptionIndex:
+    """Indeks lokasi → subscriber dan client → lokasi.
+
+    Set subscriber per lokasi disimpan sebagai frozenset yang diganti utuh setiap
+    kali berubah (copy-on-write), sehingga snapshot yang sedang dipakai untuk
+    fan-out tidak ikut berubah. Dipakai dari thread event loop saja.
+    """
+
+    def __init__(self):
+        self.by_location = {}
+        self.by_client = {}
+
+    def subscribe(self, addr, key):
+        """Daftarkan addr ke lokasi key. Kembalikan False jika sudah terdaftar."""
+        subs = self.by_location.get(key, frozenset())
+        if addr in subs:
+            return False
+        self.by_location[key] = subs | {addr}
+        self.by_client.setdefault(addr, set()).add(key)
+        return True
+
+    def unsubscribe(self, addr, key):
+        """Hapus addr dari lokasi key. Kembalikan True jika lokasi tidak punya subscriber lagi."""
+        return self._unsubscribe(addr, key)
+
+    def unsubscribe_all(self, addr):
+        """Hapus semua langganan addr. Kembalikan daftar lokasi yang kini tanpa subscriber."""
+        orphaned = []
+        for key in list(self.by_client.get(addr, ())):
+            if self._unsubscribe(addr, key):
+                orphaned.append(key)
+        return orphaned
+
+    def _unsubscribe(self, addr, key):
+        subs = self.by_location.get(key, frozenset()) - {addr}
+        if subs:
+            self.by_location[key] = subs
+        else:
+            self.by_location.pop(key, None)
+        topics = self.by_client.get(addr)
+        if topics is not None:
+            topics.discard(key)
+            if not topics:
+                del self.by_client[addr]
+        return not subs
+
+    def subscribers(self, key):
+        return self.by_location.get(key, frozenset())
+
+    def topics(self, addr):
+        return set(self.by_client.get(addr, ()))
+
+    def clear(self):
+        self.by_location.clear()
+        self.by_client.clear()
+
+
+class Sender:
+    """Pengirim di atas transport asyncio: pesan dikumpulkan lalu dikirim per batch.
+
+    Pesan teks dikirim apa adanya. Record biner dikumpulkan per client lalu
+    digabung menjadi sesedikit mungkin datagram (di bawah MTU); tabel nama
+    dikirim lebih dulu hanya untuk ID yang belum dikenal client tersebut (atau
+    yang sudah dipakai ulang untuk nama lain oleh NameTable).
+    transport.sendto tidak pernah memblokir, jadi tidak perlu thread terpisah.
+    """
+
+    def __init__(self, transport, on_error=None, batch_window=0.02):
+        self.transport = transport
+        self.on_error = on_error
+        self.batch_window = batch_window
+        self.batch = []
+        self.flush_handle = None
+        self.known_names = {}
+
+    def _put(self, item):
+        self.batch.append(item)
+        if self.flush_handle is None:
+            # Tunggu sebentar agar update dari beberapa lokasi bisa digabung
+            loop = asyncio.get_running_loop()
+            self.flush_handle = loop.call_later(self.batch_window, self.flush)
+
+    def send(self, payload, addrs):
+        """Antrekan satu payload (sudah di-encode sekali) untuk dikirim ke banyak alamat."""
+        if addrs:
+            self._put(("raw", payload, addrs, None))
+
+    def send_now(self, payload, addr):
+        """Kirim langsung tanpa menunggu batch (balasan perintah)."""
+        if self._sendto(payload, addr):
+            DATAGRAMS_OUT.inc()
+            BYTES_OUT.inc(len(payload))
+
+    def send_record(self, record, addrs, names, msg_type=protocol.MSG_UPDATE):
+        """Antrekan satu record biner; names = pasangan (id, nama) yang dirujuk record."""
+        if addrs:
+            self._put((msg_type, record, addrs, names))
+
+    def forget(self, addr):
+        """Lupakan tabel nama yang sudah dikirim ke addr (client keluar / minta ulang)."""
+        self.known_names.pop(addr, None)
+
+    def flush(self):
+        self.flush_handle = None
+        batch, self.batch = self.batch, []
+        start = time.perf_counter()
+        sent, nbytes = self._flush(batch)
+        FLUSH_SECONDS.observe(time.perf_counter() - start)
+        # Penghitung diperbarui sekali per batch, bukan per datagram
+        DATAGRAMS_OUT.inc(sent)
+        BYTES_OUT.inc(nbytes)
+
+    def _flush(self, batch):
+        """Kirim isi batch. Kembalikan (jumlah datagram, jumlah byte) yang terkirim."""
+        sent = nbytes = 0
+        pending = {}
+        for kind, payload, addrs, names in batch:
+            if kind == "raw":
+                for addr in addrs:
+                    if self._sendto(payload, addr):
+                        sent += 1
+                        nbytes += len(payload)
+            else:
+                for addr in addrs:
+                    entry = pending.get(addr)
+                    if entry is None:
+                        entry = pending[addr] = {protocol.MSG_NAMES: []}
+                    known = self.known_names.setdefault(addr, {})
+                    for name_id, name in names:
+                        if known.get(name_id) != name:
+                            known[name_id] = name
+                            entry[protocol.MSG_NAMES].append(protocol.encode_name(name_id, name))
+                    entry.setdefault(kind, []).append(payload)
+
+        # Tabel nama selalu dikirim lebih dulu (MSG_NAMES bernilai terkecil)
+        for addr, entry in pending.items():
+            for msg_type in sorted(entry):
+                for datagram in protocol.pack(msg_type, entry[msg_type]):
+                    if self._sendto(datagram, addr):
+                        sent += 1
+                        nbytes += len(datagram)
+        return sent, nbytes
+
+    def _sendto(self, payload, addr):
+        try:
+            self.transport.sendto(payload, addr)
+            return True
+        except Exception as e:
+            SEND_ERRORS.inc()
+            log.warning("[SEND ERROR] Gagal kirim ke %s: %s", addr, e)
+            self.known_names.pop(addr, None)
+            if self.on_error:
+                self.on_error(addr)
+            return False
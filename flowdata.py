@@ -0,0 +1,133 @@
+# flowdata.py
+# Ekstraksi ringan response TomTom dan record ringkasan lalu lintas.
+#
+# Response flowSegmentData sebagian besar berisi geometri segmen, sedangkan
+# server hanya butuh beberapa angka. Alih-alih json.loads seluruh body (satu
+# dict per titik koordinat), field yang dibutuhkan diambil langsung dari bytes
+# dengan regex; geometri disimpan sebagai tuple (lat, lon). Geometri hanya
+# di-parse untuk segmen yang belum dikenal (dicek dari kedua ujungnya), karena
+# bagian itulah yang mahal. Jika body tidak berbentuk seperti biasa, ekstraksi
+# jatuh kembali ke json.loads penuh.
+import json
+import re
+import time
+from typing import NamedTuple
+
+from protocol import TIMESTAMP_FORMAT
+
+UNKNOWN_ROAD = "Unknown Road"
+
+_NUMBER = rb"(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)"
+_CURRENT_SPEED = re.compile(rb'"currentSpeed"\s*:\s*' + _NUMBER)
+_FREE_FLOW_SPEED = re.compile(rb'"freeFlowSpeed"\s*:\s*' + _NUMBER)
+_CONFIDENCE = re.compile(rb'"confidence"\s*:\s*' + _NUMBER)
+_ROAD_CLOSURE = re.compile(rb'"roadClosure"\s*:\s*(true|false)')
+# Geometri: pola untuk JSON ringkas (format TomTom) jauh lebih cepat; pola berspasi hanya sebagai cadangan
+_COORDINATE = re.compile(rb'"latitude":([-+\d.eE]+),"longitude":([-+\d.eE]+)')
+_COORDINATE_SPACED = re.compile(rb'"latitude"\s*:\s*([-+\d.eE]+)\s*,\s*"longitude"\s*:\s*([-+\d.eE]+)')
+_STREET_NAME = re.compile(rb'"streetName"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+class FlowSample(NamedTuple):
+    """Field flowSegmentData yang dipakai server, plus geometri segmen."""
+    current_speed: float
+    free_flow_speed: float
+    confidence: float
+    road_closure: bool
+    coordinates: tuple   # ((lat, lon), ...); kosong jika response tanpa geometri
+
+
+class TrafficSummary(NamedTuple):
+    """Ringkasan lalu lintas satu lokasi pada satu waktu.
+
+    Tuple biasa (tanpa dict per instance) dan ter-serialisasi JSON sebagai list,
+    sehingga bisa dikirim antar worker dan dibangun ulang dengan from_list.
+    """
+    epoch: int
+    latitude: float
+    longitude: float
+    road_name: str
+    current_speed: float
+    free_flow_speed: float
+    congestion_percent: float
+    confidence: float
+    stale: bool = False
+
+    @property
+    def timestamp(self):
+        return time.strftime(TIMESTAMP_FORMAT, time.localtime(self.epoch))
+
+    @classmethod
+    def from_flow(cls, lat, lon, road_name, sample, epoch=None):
+        current_speed, free_speed = sample.current_speed, sample.free_flow_speed
+        congestion = max(0, min(1, 1 - (current_speed / free_speed))) if free_speed > 0 else 0
+        return cls(int(time.time()) if epoch is None else epoch, lat, lon, road_name,
+                   current_speed, free_speed, round(congestion * 100, 1), sample.confidence)
+
+    @classmethod
+    def from_list(cls, values):
+        """Bangun ulang dari bentuk JSON (list) yang dikirim worker lain."""
+        return values if isinstance(values, cls) else cls(*values)
+
+
+def _number(text):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def _flow_from_json(body, geometry=True):
+    flow = json.loads(body).get("flowSegmentData", {})
+    coords = flow.get("coordinates", {}).get("coordinate", []) if geometry else ()
+    return FlowSample(
+        flow.get("currentSpeed", 0),
+        flow.get("freeFlowSpeed", 1),
+        flow.get("confidence", 0),
+        bool(flow.get("roadClosure", False)),
+        tuple((c["latitude"], c["longitude"]) for c in coords if "latitude" in c and "longitude" in c),
+    )
+
+
+def _geometry(body, known):
+    """Koordinat segmen; jika known(ujung awal, ujung akhir) sudah punya geometrinya, tuple itu dipakai ulang."""
+    first = _COORDINATE_SPACED.search(body)
+    if first is None:
+        return ()
+    if known is not None:
+        last = _COORDINATE_SPACED.match(body, body.rfind(b'"latitude"'))
+        if last is not None:
+            coords = known((float(first.group(1)), float(first.group(2))),
+                           (float(last.group(1)), float(last.group(2))))
+            if coords:
+                return coords
+    pairs = _COORDINATE.findall(body) or _COORDINATE_SPACED.findall(body)
+    return tuple((float(lat), float(lon)) for lat, lon in pairs)
+
+
+def parse_flow(body, geometry=True, known=None):
+    """FlowSample dari body response flowSegmentData (bytes).
+
+    geometry=False melewati koordinat segmen. known(awal, akhir) opsional
+    mengembalikan geometri yang sudah tersimpan untuk segmen dengan ujung itu.
+    """
+    current = _CURRENT_SPEED.search(body)
+    free = _FREE_FLOW_SPEED.search(body)
+    if current is None or free is None:
+        return _flow_from_json(body, geometry)
+    confidence = _CONFIDENCE.search(body)
+    closure = _ROAD_CLOSURE.search(body)
+    coords = _geometry(body, known) if geometry else ()
+    return FlowSample(
+        _number(current.group(1)),
+        _number(free.group(1)),
+        float(confidence.group(1)) if confidence else 0,
+        closure is not None and closure.group(1) == b"true",
+        coords,
+    )
+
+
+def parse_street_name(body, default=UNKNOWN_ROAD):
+    """Nama jalan alamat pertama dari body response reverseGeocode (bytes)."""
+    match = _STREET_NAME.search(body)
+    if match is None:
+        return default
+    return json.loads(match.group(1)) or default
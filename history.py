@@ -0,0 +1,343 @@
+# history.py
+# Penyimpanan riwayat lalu lintas per lokasi: kolom array + file biner append-only.
+#
+# Setiap hasil poll disimpan sebagai titik mentah (epoch, kecepatan, kecepatan
+# bebas, kemacetan×10, confidence×10000) dan sekaligus digabung ke rollup 1 menit,
+# 15 menit, dan 1 jam (jumlah titik, rata-rata/min/maks kecepatan, rata-rata
+# kemacetan & confidence). Data di memori disimpan per kolom dalam array.array
+# dan dipangkas ke kapasitas tiap resolusi; di disk tiap resolusi satu file
+# record tetap yang hanya ditambah, dan dipadatkan ulang jika terlalu besar.
+# Record baru hanya ditampung di buffer memori; thread penulis menuliskannya
+# ke file yang tetap terbuka setiap FLUSH_INTERVAL detik, jadi event loop tidak
+# pernah menunggu disk. Ekor file lama (seek dari belakang) juga dibaca thread
+# penulis saat titik pertama sebuah lokasi masuk.
+import array
+import collections
+import os
+import re
+import struct
+import threading
+import zlib
+
+from logutil import get_logger
+
+log = get_logger("history")
+
+RAW = struct.Struct("!IHHHH")        # epoch, speed, free speed, kemacetan×10, confidence×10000
+ROLLUP = struct.Struct("!IHHHHHH")   # awal bucket, jumlah titik, rata2 speed×10, min speed, maks speed, rata2 kemacetan×10, rata2 confidence×10000
+
+RAW_FIELDS = ("epoch", "current_speed", "free_flow_speed", "congestion_percent", "confidence")
+ROLLUP_FIELDS = ("epoch", "count", "avg_speed", "min_speed", "max_speed", "congestion_percent", "confidence")
+
+# Resolusi rollup: nama → (lebar bucket detik, kapasitas default)
+ROLLUPS = {
+    "1m": (60, 24 * 60),        # 24 jam
+    "15m": (900, 7 * 96),       # 7 hari
+    "1h": (3600, 30 * 24),      # 30 hari
+}
+RAW_CAPACITY = 4096
+FLUSH_INTERVAL = 1.0     # Detik; batas lama record tertahan di buffer sebelum ditulis
+MAX_OPEN_FILES = 256     # File riwayat yang dibiarkan terbuka (yang paling lama tidak dipakai ditutup)
+
+
+def _file_name(key):
+    """Nama file aman untuk key lokasi (karakter lain diganti, plus crc agar tidak bentrok)."""
+    safe = re.sub(r"[^a-z0-9]+", "_", key.lower()).strip("_")[:48]
+    return f"{safe}-{zlib.crc32(key.encode()):08x}"
+
+
+class Columns:
+    """Satu deret waktu berkolom (array.array per field), dipangkas ke kapasitas."""
+
+    def __init__(self, fields, typecodes, capacity):
+        self.fields = fields
+        self.capacity = capacity
+        self.columns = [array.array(code) for code in typecodes]
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def append(self, row):
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        # Pangkas sekaligus setelah 2× kapasitas agar biayanya teramortisasi
+        if len(self.columns[0]) >= 2 * self.capacity:
+            for column in self.columns:
+                del column[:len(column) - self.capacity]
+
+    def tail(self, count):
+        start = max(0, len(self) - min(count, self.capacity))
+        return [tuple(column[i] for column in self.columns) for i in range(start, len(self))]
+
+
+class Bucket:
+    """Akumulator rollup untuk satu bucket waktu yang sedang berjalan."""
+
+    __slots__ = ("start", "count", "speed_sum", "speed_min", "speed_max", "congestion_sum", "confidence_sum")
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.speed_sum = 0
+        self.speed_min = 0xFFFF
+        self.speed_max = 0
+        self.congestion_sum = 0
+        self.confidence_sum = 0
+
+    def add(self, speed, congestion, confidence):
+        self.count += 1
+        self.speed_sum += speed
+        self.speed_min = min(self.speed_min, speed)
+        self.speed_max = max(self.speed_max, speed)
+        self.congestion_sum += congestion
+        self.confidence_sum += confidence
+
+    def row(self):
+        n = self.count
+        return (self.start, min(n, 0xFFFF), round(self.speed_sum * 10 / n), self.speed_min, self.speed_max,
+                round(self.congestion_sum / n), round(self.confidence_sum / n))
+
+
+def _compact(path, record_size, capacity):
+    """Tulis ulang file dengan hanya `capacity` record terakhir (ganti atomik)."""
+    with open(path, "rb") as f:
+        f.seek(-capacity * record_size, os.SEEK_END)
+        data = f.read()
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class Series:
+    """Riwayat satu lokasi: titik mentah + semua rollup, opsional dengan file di disk.
+
+    sink(file, fmt, row, capacity) menerima record baru untuk ditulis; tanpa
+    sink (mis. Series untuk membaca file milik proses lain) tidak ada yang ditulis.
+    """
+
+    def __init__(self, path=None, raw_capacity=RAW_CAPACITY, rollups=ROLLUPS, sink=None):
+        self.path = path
+        self.sink = sink
+        self.raw = Columns(RAW_FIELDS, "IHHHH", raw_capacity)
+        self.rollups = {name: Columns(ROLLUP_FIELDS, "IHHHHHH", capacity) for name, (_, capacity) in rollups.items()}
+        self.widths = {name: width for name, (width, _) in rollups.items()}
+        self.buckets = {}
+        if path:
+            self._load()
+
+    def _file(self, resolution):
+        return f"{self.path}.{resolution}.bin"
+
+    def _read_tail(self, resolution, fmt, capacity):
+        try:
+            with open(self._file(resolution), "rb") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                count = min(size // fmt.size, capacity)
+                f.seek(size - size % fmt.size - count * fmt.size)
+                data = f.read(count * fmt.size)
+        except FileNotFoundError:
+            return []
+        return list(fmt.iter_unpack(data))
+
+    def _load(self):
+        for row in self._read_tail("raw", RAW, self.raw.capacity):
+            self.raw.append(row)
+        for name, columns in self.rollups.items():
+            for row in self._read_tail(name, ROLLUP, columns.capacity):
+                columns.append(row)
+        # Bucket yang belum ditutup sebelum restart dibangun ulang dari titik mentah
+        for name, width in self.widths.items():
+            done = self.rollups[name].columns[0]
+            last_closed = done[-1] if len(done) else -1
+            for epoch, speed, _, congestion, confidence in self.raw.tail(self.raw.capacity):
+                start = epoch - epoch % width
+                if start <= last_closed:
+                    continue
+                bucket = self.buckets.get(name)
+                if bucket is None or bucket.start != start:
+                    bucket = self.buckets[name] = Bucket(start)
+                bucket.add(speed, congestion, confidence)
+
+    def _write(self, resolution, fmt, row, capacity):
+        if self.sink is not None:
+            self.sink(self._file(resolution), fmt, row, capacity)
+
+    def append(self, row):
+        epoch, speed, _, congestion, confidence = row
+        if len(self.raw) and epoch < self.raw.columns[0][-1]:
+            return   # Titik lebih lama dari yang sudah tersimpan (jam mundur / hasil basi)
+        self.raw.append(row)
+        if self.path:
+            self._write("raw", RAW, row, self.raw.capacity)
+        for name, width in self.widths.items():
+            start = epoch - epoch % width
+            bucket = self.buckets.get(name)
+            if bucket is not None and bucket.start != start:
+                closed = bucket.row()
+                self.rollups[name].append(closed)
+                if self.path:
+                    self._write(name, ROLLUP, closed, self.rollups[name].capacity)
+                bucket = None
+            if bucket is None:
+                bucket = self.buckets[name] = Bucket(start)
+            bucket.add(speed, congestion, confidence)
+
+    def query(self, resolution, count):
+        """Baris terbaru (maks. count) dalam resolusi 'raw' atau nama rollup; bucket berjalan ikut disertakan."""
+        if count <= 0:
+            return []
+        if resolution == "raw":
+            return self.raw.tail(count)
+        rows = self.rollups[resolution].tail(count)
+        bucket = self.buckets.get(resolution)
+        if bucket is not None and bucket.count:
+            rows = (rows + [bucket.row()])[-count:]
+        return rows
+
+
+class HistoryStore:
+    """Riwayat semua lokasi. directory=None: hanya di memori.
+
+    append dipanggil dari satu proses penulis per lokasi (worker pemilik di mode
+    multi-worker); proses lain membaca langsung dari file saat query. append
+    tidak menyentuh disk: record ditampung per file lalu ditulis thread penulis
+    (dimulai saat record pertama). Titik pertama sebuah lokasi ditahan sampai
+    thread penulis selesai membaca riwayat lamanya dari disk. query lokasi
+    milik proses lain membaca file, jadi panggil dari executor, bukan dari event loop.
+    """
+
+    def __init__(self, directory=None, raw_capacity=RAW_CAPACITY, flush_interval=FLUSH_INTERVAL,
+                 max_open_files=MAX_OPEN_FILES):
+        self.directory = directory
+        self.raw_capacity = raw_capacity
+        self.flush_interval = flush_interval
+        self.max_open_files = max_open_files
+        self.lock = threading.Lock()
+        self.series = {}
+        self.loading = {}                       # key → titik yang menunggu riwayat lama dimuat thread penulis
+        self.pending = {}                       # file → bytearray record yang belum ditulis
+        self.limits = {}                        # file → (ukuran record, kapasitas) untuk pemadatan
+        self.files = collections.OrderedDict()  # file → handle terbuka (hanya thread penulis), urut LRU
+        self.stopping = threading.Event()
+        self.writer = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _enqueue(self, path, fmt, row, capacity):
+        # Dipanggil dari append (lock sudah dipegang)
+        self.pending.setdefault(path, bytearray()).extend(fmt.pack(*row))
+        self.limits[path] = (fmt.size, capacity)
+        self._start_writer()
+
+    def _start_writer(self):
+        # Dipanggil dengan lock dipegang
+        if self.writer is None and not self.stopping.is_set():
+            self.writer = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self.writer.start()
+
+    def _run(self):
+        while not self.stopping.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def _open(self, path):
+        f = self.files.get(path)
+        if f is not None:
+            self.files.move_to_end(path)
+            return f
+        while len(self.files) >= self.max_open_files:
+            self.files.popitem(last=False)[1].close()
+        f = self.files[path] = open(path, "ab")
+        return f
+
+    def _load_waiting(self):
+        """Muat riwayat lama lokasi yang baru mulai ditulis, lalu tambahkan titik yang tertahan."""
+        with self.lock:
+            keys = list(self.loading)
+        for key in keys:
+            try:
+                series = Series(self._path(key), self.raw_capacity, sink=self._enqueue)
+            except OSError as e:
+                log.warning("[HISTORY ERROR] Gagal membaca riwayat %s: %s", key, e)
+                with self.lock:
+                    self.loading.pop(key, None)
+                continue
+            with self.lock:
+                rows = self.loading.pop(key, None)
+                if rows is None:
+                    continue   # forget() saat sedang dimuat
+                for row in rows:
+                    series.append(row)
+                self.series[key] = series
+
+    def flush(self):
+        """Tulis semua record yang tertunda ke file (dipanggil thread penulis)."""
+        self._load_waiting()
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for path, data in pending.items():
+            try:
+                f = self._open(path)
+                f.write(data)
+                f.flush()
+                record_size, capacity = self.limits[path]
+                if f.tell() > 4 * capacity * record_size:
+                    self.files.pop(path).close()
+                    _compact(path, record_size, capacity)
+            except OSError as e:
+                log.warning("[HISTORY ERROR] Gagal menulis %s: %s", path, e)
+
+    def close(self):
+        """Tulis sisa buffer, hentikan thread penulis, dan tutup semua file."""
+        self.stopping.set()
+        if self.writer is not None:
+            self.writer.join()
+        else:
+            self.flush()
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+
+    def _path(self, key):
+        return os.path.join(self.directory, _file_name(key)) if self.directory else None
+
+    def append(self, key, epoch, fields):
+        """Simpan satu titik. fields = (speed, free speed, kemacetan×10, confidence×10000)."""
+        row = (epoch, *fields)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None and not self.directory:
+                series = self.series[key] = Series(None, self.raw_capacity, sink=self._enqueue)
+            if series is not None:
+                series.append(row)
+                return
+            # Membaca file riwayat lama diserahkan ke thread penulis agar event loop tidak menunggu disk
+            rows = self.loading.get(key)
+            if rows is None:
+                rows = self.loading[key] = []
+                self._start_writer()
+            rows.append(row)
+
+    def query(self, key, resolution="1m", count=60):
+        if resolution != "raw" and resolution not in ROLLUPS:
+            raise ValueError(f"Resolusi tidak dikenal: {resolution}")
+        with self.lock:
+            series = self.series.get(key)
+            if series is not None:
+                return series.query(resolution, count)
+        path = self._path(key)
+        if path is None or not os.path.exists(f"{path}.raw.bin"):
+            return []
+        return Series(path, self.raw_capacity).query(resolution, count)
+
+    def forget(self, key):
+        """Lepas riwayat lokasi dari memori (file di disk tetap)."""
+        with self.lock:
+            self.series.pop(key, None)
+            self.loading.pop(key, None)
+
+    @staticmethod
+    def fields(resolution):
+        return RAW_FIELDS if resolution == "raw" else ROLLUP_FIELDS
@@ -0,0 +1,467 @@
+# loadtest.py
+# Uji beban end-to-end: mock TomTom + server2.py + ribuan client UDP simulasi.
+#
+# Secara default menjalankan mock_tomtom.py dan server2.py sebagai proses anak
+# (server diarahkan ke mock lewat TOMTOM_BASE_URL), lalu membuka N socket client
+# yang masing-masing mengirim JOIN lalu SEARCH ke salah satu dari K lokasi, dan
+# PING berkala. Laporan akhir:
+#   - throughput: datagram & byte yang diterima client per detik
+#   - latensi balasan perintah (SEARCH → OK, PING → PONG), persentil
+#   - latensi fan-out: selisih waktu terima satu update antar subscriber
+#     (relatif terhadap penerima pertama), persentil; snapshot state terakhir
+#     yang dikirim saat subscribe tidak dihitung
+#   - packet loss update: subscriber yang tidak menerima update yang diterima
+#     subscriber lain di lokasi yang sama
+#   - CPU dan memori proses server (dari /proc, khusus Linux)
+#
+# Contoh:
+#   python loadtest.py --clients 2000 --locations 20 --duration 30 --mode bin
+#   python loadtest.py --server 192.168.1.10:5005 --clients 500   # server yang sudah jalan
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import protocol
+
+# Konfigurasi default
+SERVER_PORT = 5105
+MOCK_PORT = 8181
+PING_INTERVAL = 5.0     # Lebih rapat dari client asli agar latensi balasan terukur sepanjang uji
+RAMP_UP = 2.0           # Detik untuk membuka semua client (hindari lonjakan SEARCH sekaligus)
+STARTUP_TIMEOUT = 10.0
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+def format_ms(values):
+    if not values:
+        return "-"
+    return " ".join(f"p{p}={percentile(values, p) * 1000:.1f}ms" for p in (50, 90, 99)) + \
+        f" max={max(values) * 1000:.1f}ms (n={len(values)})"
+
+
+class ProcessSampler:
+    """CPU & RSS proses server (plus proses anaknya, untuk mode multi-worker) dari /proc."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.available = os.path.exists(f"/proc/{pid}/stat")
+        self.start_cpu = self.cpu_seconds() if self.available else 0.0
+        self.start_time = time.monotonic()
+        self.peak_rss = 0
+
+    def _pids(self):
+        pids = [self.pid]
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        fields = f.read().rsplit(")", 1)[1].split()
+                    if int(fields[1]) == self.pid:
+                        pids.append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    continue
+        return pids
+
+    def cpu_seconds(self):
+        total = 0
+        for pid in self._pids():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                total += int(fields[11]) + int(fields[12])   # utime + stime
+            except (OSError, IndexError, ValueError):
+                continue
+        return total / CLK_TCK
+
+    def rss_bytes(self):
+        total = 0
+        for pid in self._pids():
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total += int(line.split()[1]) * 1024
+            except OSError:
+                continue
+        return total
+
+    def sample(self):
+        if self.available:
+            self.peak_rss = max(self.peak_rss, self.rss_bytes())
+
+    def report(self):
+        if not self.available:
+            return "tidak tersedia (butuh /proc dan server yang dijalankan loadtest)"
+        elapsed = time.monotonic() - self.start_time
+        cpu = self.cpu_seconds() - self.start_cpu
+        return (f"CPU {cpu:.2f} s ({cpu / elapsed * 100:.1f}% satu core), "
+                f"RSS sekarang {self.rss_bytes() / 2**20:.1f} MiB, puncak {self.peak_rss / 2**20:.1f} MiB")
+
+
+class Stats:
+    """Pengukuran bersama seluruh client simulasi (satu event loop, tanpa lock)."""
+
+    def __init__(self):
+        self.datagrams = 0
+        self.bytes = 0
+        self.command_latency = []
+        self.ping_latency = []
+        self.fanout_latency = []
+        self.pings_sent = 0
+        self.searches_sent = 0
+        self.search_failed = 0
+        self.errors = 0
+        # Kunci update → [waktu terima pertama, grup lokasi, jumlah penerima]
+        self.updates = {}
+
+    def record_update(self, key, group, now):
+        seen = self.updates.get(key)
+        if seen is None:
+            self.updates[key] = [now, group, 1]
+        else:
+            seen[2] += 1
+            self.fanout_latency.append(now - seen[0])
+
+    def is_resend(self, key, subscribed_at):
+        """True jika update key sudah diterima client lain sebelum subscribed_at (snapshot, bukan fan-out)."""
+        seen = self.updates.get(key)
+        return seen is not None and seen[0] < subscribed_at
+
+
+class LoadClient(asyncio.DatagramProtocol):
+    """Satu client simulasi: JOIN, SEARCH satu lokasi, PING berkala, catat semua yang diterima."""
+
+    def __init__(self, stats, mode, location, group):
+        self.stats = stats
+        self.mode = mode
+        self.location = location
+        self.group = group
+        self.transport = None
+        self.search_sent = None
+        self.subscribed_at = None
+        self.ping_sent = None
+        self.text_seen = {}
+        self.worker = 0
+        self.streams = {}   # loc_id → [seq pertama, seq terakhir, jumlah diterima]
+        self.received = set()   # (loc_id, seq) yang sudah diterima client ini
+        self.snapshot_pending = False   # Update pertama setelah subscribe mungkin snapshot state terakhir
+
+    def connection_made(self, transport):
+        self.transport = transport
+        join = {"text": "JOIN", "bin": "JOIN:BIN", "delta": "JOIN:BIN,DELTA"}[self.mode]
+        transport.sendto(join.encode())
+        # STATS memberi tahu worker mana yang melayani client ini (nomor urut biner per worker)
+        transport.sendto(b"STATS")
+        self.search_sent = time.monotonic()
+        self.stats.searches_sent += 1
+        transport.sendto(f"SEARCH:{self.location}".encode())
+
+    def ping(self, interval):
+        """Kirim PING lalu jadwalkan PING berikutnya. PING yang belum dibalas dianggap hilang."""
+        if self.transport.is_closing():
+            return
+        self.ping_sent = time.monotonic()
+        self.stats.pings_sent += 1
+        self.transport.sendto(b"PING")
+        asyncio.get_running_loop().call_later(interval, self.ping, interval)
+
+    def datagram_received(self, data, addr):
+        now = time.monotonic()
+        stats = self.stats
+        stats.datagrams += 1
+        stats.bytes += len(data)
+
+        if protocol.is_binary(data):
+            decoded = protocol.decode(data)
+            if decoded is None:
+                stats.errors += 1
+                return
+            msg_type, records = decoded
+            if msg_type in (protocol.MSG_UPDATE, protocol.MSG_DELTA) and self.subscribed_at is not None:
+                snapshot, self.snapshot_pending = self.snapshot_pending, False
+                for record in records:
+                    if (record["loc_id"], record["seq"]) in self.received:
+                        continue
+                    self.received.add((record["loc_id"], record["seq"]))
+                    key = (self.worker, record["loc_id"], record["seq"])
+                    if not (snapshot and stats.is_resend(key, self.subscribed_at)):
+                        stats.record_update(key, self.group, now)
+                    stream = self.streams.get(record["loc_id"])
+                    if stream is None:
+                        self.streams[record["loc_id"]] = [record["seq"], record["seq"], 1]
+                    else:
+                        stream[1] = max(stream[1], record["seq"])
+                        stream[2] += 1
+            return
+
+        if data == b"PONG":
+            # Hanya satu PING yang ditunggu per client
+            if self.ping_sent is not None:
+                stats.ping_latency.append(now - self.ping_sent)
+                self.ping_sent = None
+            return
+
+        if data.startswith(b"[LALU LINTAS]"):
+            if self.subscribed_at is not None and b"Gagal" not in data:
+                # Pesan teks di-encode sekali untuk semua subscriber: isi pesan (+ urutan
+                # kemunculannya, karena dua poll dalam detik yang sama bisa identik) = kunci update
+                n = self.text_seen[data] = self.text_seen.get(data, 0) + 1
+                snapshot, self.snapshot_pending = self.snapshot_pending, False
+                if not (snapshot and stats.is_resend((data, n), self.subscribed_at)):
+                    stats.record_update((data, n), self.group, now)
+        elif data.startswith(b"[SERVER] OK: Lokasi pemantauan"):
+            if self.subscribed_at is None:
+                self.subscribed_at = now
+                self.snapshot_pending = True
+                stats.command_latency.append(now - self.search_sent)
+        elif data.startswith(b"[SERVER] STATS:"):
+            self.worker = json.loads(data.split(b":", 1)[1]).get("worker", 0)
+        elif data.startswith(b"[SERVER] GAGAL"):
+            stats.search_failed += 1
+
+    def error_received(self, exc):
+        self.stats.errors += 1
+
+
+def raise_fd_limit(needed):
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def wait_http(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def wait_udp(addr, timeout):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(0.2)
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            sock.sendto(b"PING", addr)
+            try:
+                while True:
+                    if sock.recv(2048) == b"PONG":
+                        return True
+            except OSError:
+                continue
+        return False
+    finally:
+        sock.sendto(b"QUIT", addr)
+        sock.close()
+
+
+def start_processes(args):
+    """Jalankan mock TomTom dan server2.py. Kembalikan (proses mock, proses server)."""
+    output = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "mock_tomtom.py"), "--port", str(args.mock_port),
+         "--latency", str(args.mock_latency), "--jitter", str(args.mock_jitter),
+         "--error-rate", str(args.mock_error_rate), "--spread", str(args.area)],
+        stdout=subprocess.DEVNULL,
+    )
+    if not wait_http(f"http://127.0.0.1:{args.mock_port}/__stats", STARTUP_TIMEOUT):
+        mock.terminate()
+        raise RuntimeError("Mock TomTom tidak bisa dijalankan")
+
+    if wait_udp(("127.0.0.1", args.port), 0.5):
+        mock.terminate()
+        raise RuntimeError(f"Port {args.port} sudah dipakai server lain")
+
+    env = dict(os.environ)
+    env.update({
+        "TOMTOM_API_KEY": "mock",
+        "TOMTOM_BASE_URL": f"http://127.0.0.1:{args.mock_port}",
+        "GEOCODE_CACHE_FILE": "",
+        "SERVER_PORT": str(args.port),
+        "SERVER_WORKERS": str(args.workers),
+        "PYTHONUNBUFFERED": "1",
+    })
+    # Process group sendiri: worker (mode multi-worker) ikut dihentikan bersama induknya
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, "server2.py")],
+                              env=env, stdout=output, stderr=subprocess.STDOUT,
+                              start_new_session=hasattr(os, "killpg"))
+    if not wait_udp(("127.0.0.1", args.port), STARTUP_TIMEOUT):
+        server.terminate()
+        mock.terminate()
+        raise RuntimeError("Server tidak merespons PING")
+    return mock, server
+
+
+def stop_processes(*procs):
+    for proc in procs:
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+    for proc in procs:
+        if proc is None:
+            continue
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)   # Sisa proses anak, jika ada
+            except OSError:
+                pass
+
+
+async def run_clients(args, addr, sampler):
+    loop = asyncio.get_running_loop()
+    stats = Stats()
+    locations = [f"Jalan Uji {i}" for i in range(args.locations)]
+    clients = []
+
+    # Buka client bertahap selama RAMP_UP detik
+    print(f"[LOADTEST] Membuka {args.clients} client ({args.mode}) ke {addr[0]}:{addr[1]} "
+          f"untuk {args.locations} lokasi...")
+    step = args.ramp / max(1, args.clients)
+    for i in range(args.clients):
+        group = i % args.locations
+        client = LoadClient(stats, args.mode, locations[group], group)
+        await loop.create_datagram_endpoint(lambda c=client: c, remote_addr=addr)
+        clients.append(client)
+        if step and i % 50 == 49:
+            await asyncio.sleep(step * 50)
+
+    # PING disebar merata sepanjang interval agar tidak datang serempak
+    for i, client in enumerate(clients):
+        loop.call_later(args.ping_interval * i / len(clients), client.ping, args.ping_interval)
+
+    started = time.monotonic()
+    start_datagrams, start_bytes = stats.datagrams, stats.bytes
+    while time.monotonic() - started < args.duration:
+        sampler.sample()
+        await asyncio.sleep(0.5)
+    # Beri waktu datagram terakhir sampai
+    await asyncio.sleep(0.5)
+    elapsed = time.monotonic() - started
+
+    for client in clients:
+        client.transport.sendto(b"QUIT")
+    await asyncio.sleep(0.1)
+    for client in clients:
+        client.transport.close()
+    return stats, clients, elapsed, stats.datagrams - start_datagrams, stats.bytes - start_bytes
+
+
+def report(args, stats, clients, elapsed, datagrams, nbytes, sampler, mock_stats):
+    subscribed = [c for c in clients if c.subscribed_at is not None]
+    group_sizes = {}
+    for client in subscribed:
+        group_sizes[client.group] = group_sizes.get(client.group, 0) + 1
+
+    expected = received = 0
+    if args.mode == "text":
+        # Hanya update yang terlihat setelah semua subscriber lokasi itu terdaftar yang dihitung
+        ready = {}
+        for client in subscribed:
+            ready[client.group] = max(ready.get(client.group, 0.0), client.subscribed_at)
+        for first, group, count in stats.updates.values():
+            if first >= ready.get(group, float("inf")):
+                expected += group_sizes[group]
+                received += count
+    else:
+        # Mode biner: nomor urut per lokasi → celah = paket hilang
+        for client in subscribed:
+            for first, last, count in client.streams.values():
+                expected += (last - first) % 2**32 + 1
+                received += count
+
+    pongs = len(stats.ping_latency)
+    print()
+    print("=" * 72)
+    print(f"Client              : {len(clients)} ({len(subscribed)} berhasil SEARCH, {stats.search_failed} gagal)")
+    print(f"Durasi ukur         : {elapsed:.1f} s")
+    print(f"Throughput          : {datagrams / elapsed:.0f} datagram/s, {nbytes / elapsed / 1024:.1f} KiB/s")
+    print(f"Update unik         : {len(stats.updates)} ({expected} pengiriman diharapkan)")
+    print(f"Latensi SEARCH      : {format_ms(stats.command_latency)}")
+    print(f"Latensi PING        : {format_ms(stats.ping_latency)}")
+    print(f"Latensi fan-out     : {format_ms(stats.fanout_latency)}")
+    if expected:
+        print(f"Packet loss update  : {(expected - received) / expected:.2%} ({expected - received} dari {expected})")
+    if stats.pings_sent:
+        print(f"Packet loss PING    : {(stats.pings_sent - pongs) / stats.pings_sent:.2%}")
+    print(f"Error client        : {stats.errors}")
+    print(f"Server              : {sampler.report()}")
+    if mock_stats is not None:
+        print(f"Request ke mock     : {mock_stats}")
+    print("=" * 72)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Uji beban TrafficFlow UDP")
+    parser.add_argument("--server", help="host:port server yang sudah berjalan (default: jalankan server2.py + mock)")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="port server yang dijalankan loadtest")
+    parser.add_argument("--workers", type=int, default=1, help="SERVER_WORKERS untuk server yang dijalankan")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--locations", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0, help="detik pengukuran setelah semua client terbuka")
+    parser.add_argument("--mode", choices=("text", "bin", "delta"), default="text")
+    parser.add_argument("--ramp", type=float, default=RAMP_UP, help="detik untuk membuka semua client")
+    parser.add_argument("--ping-interval", type=float, default=PING_INTERVAL)
+    parser.add_argument("--mock-port", type=int, default=MOCK_PORT)
+    parser.add_argument("--mock-latency", type=float, default=50.0, help="latensi mock (ms)")
+    parser.add_argument("--mock-jitter", type=float, default=20.0, help="variasi latensi mock ± (ms)")
+    parser.add_argument("--mock-error-rate", type=float, default=0.0, help="peluang error mock 0..1")
+    parser.add_argument("--area", type=float, default=0.2, help="lebar area lokasi uji (derajat); kecil = titik lebih rapat")
+    parser.add_argument("--server-log", help="simpan output server ke file ini")
+    args = parser.parse_args()
+
+    raise_fd_limit(args.clients + 256)
+
+    mock = server = None
+    if args.server:
+        host, port = args.server.rsplit(":", 1)
+        addr = (socket.gethostbyname(host), int(port))
+        sampler = ProcessSampler(-1)
+    else:
+        mock, server = start_processes(args)
+        addr = ("127.0.0.1", args.port)
+        sampler = ProcessSampler(server.pid)
+
+    try:
+        stats, clients, elapsed, datagrams, nbytes = asyncio.run(run_clients(args, addr, sampler))
+        mock_stats = None
+        if mock is not None:
+            with urllib.request.urlopen(f"http://127.0.0.1:{args.mock_port}/__stats", timeout=2) as response:
+                mock_stats = json.loads(response.read())
+        report(args, stats, clients, elapsed, datagrams, nbytes, sampler, mock_stats)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_processes(server, mock)
+
+
+if __name__ == "__main__":
+    main()
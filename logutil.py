@@ -0,0 +1,62 @@
+# logutil.py
+# Logging bertingkat dengan pembatas laju untuk server.
+#
+# Pesan memakai format %-style (log.info("Client baru: %s", addr)) sehingga
+# template pesan bisa dipakai sebagai kunci pembatas laju: pesan yang sama
+# (mis. satu baris per paket) paling banyak BURST kali per PERIOD detik; sisanya
+# dihitung dan dilaporkan pada pesan berikutnya yang lolos.
+import logging
+import os
+import threading
+import time
+
+LOG_LEVEL = "INFO"         # Default; env LOG_LEVEL dibaca saat setup() (setelah .env dimuat config.load())
+RATE_LIMIT_BURST = 10      # Pesan dengan template sama per periode
+RATE_LIMIT_PERIOD = 10.0   # Detik
+
+
+class RateLimitFilter(logging.Filter):
+    """Batasi pesan per template (logger + level + msg) dengan jendela waktu tetap."""
+
+    def __init__(self, burst=RATE_LIMIT_BURST, period=RATE_LIMIT_PERIOD):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.lock = threading.Lock()
+        self.windows = {}   # kunci → [awal jendela, jumlah dalam jendela, jumlah disembunyikan]
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.period:
+                suppressed = window[2] if window is not None else 0
+                self.windows[key] = [now, 1, 0]
+            elif window[1] < self.burst:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} pesan serupa disembunyikan)"
+        return True
+
+
+def setup(level=None):
+    """Pasang handler konsol (sekali per proses). Level dari argumen atau env LOG_LEVEL."""
+    root = logging.getLogger("trafficflow")
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        handler.addFilter(RateLimitFilter())
+        root.addHandler(handler)
+        root.propagate = False
+    root.setLevel((level or os.getenv("LOG_LEVEL") or LOG_LEVEL).upper())
+    return root
+
+
+def get_logger(name):
+    """Logger anak dari 'trafficflow'; pesan tetap memakai awalan [SERVER]/[... ERROR] sendiri."""
+    return logging.getLogger(f"trafficflow.{name}")
@@ -0,0 +1,117 @@
+# logwriter.py
+# Penulis file log di thread latar untuk client GUI.
+#
+# write() hanya memasukkan baris ke antrean, jadi aman dan murah dipanggil dari
+# main loop Tk. Thread penulis mengambil semua baris yang menunggu sekaligus,
+# menulisnya dalam satu write ke file yang tetap terbuka, lalu flush paling
+# sering setiap FLUSH_INTERVAL detik. Jika file melewati MAX_BYTES, file diputar
+# (log.txt → log.txt.1 → log.txt.2 ...), menyimpan BACKUP_COUNT file lama.
+import os
+import queue
+import threading
+import time
+
+FLUSH_INTERVAL = 1.0              # Detik; batas lama baris tertahan di buffer
+MAX_BYTES = 5 * 1024 * 1024       # Ukuran file sebelum diputar
+BACKUP_COUNT = 3                  # Jumlah file lama yang disimpan
+BUFFER_SIZE = 64 * 1024           # Buffer file (byte)
+
+
+class LogWriter:
+    """Tulis baris log ke file secara batch dari thread latar, dengan rotasi berdasarkan ukuran."""
+
+    def __init__(self, path, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT,
+                 flush_interval=FLUSH_INTERVAL, header=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.header = header
+        self.queue = queue.SimpleQueue()
+        self.file = None
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, line):
+        """Antrekan satu baris (tanpa newline). Tidak pernah memblokir."""
+        if not self.closed:
+            self.queue.put(line)
+
+    def close(self, timeout=2.0):
+        """Tulis sisa antrean, tutup file, dan hentikan thread."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def _open(self):
+        new = not os.path.exists(self.path)
+        self.file = open(self.path, "a", encoding="utf-8", buffering=BUFFER_SIZE)
+        if new and self.header:
+            self.file.write(f"{self.header}\n")
+
+    def _rotate(self):
+        """log → log.1 → log.2 ...; file tertua dibuang."""
+        self.file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def _drain(self, first):
+        """Ambil first plus semua baris yang sudah menunggu. Kembalikan (baris, perlu berhenti)."""
+        lines, stop = [], first is None
+        if not stop:
+            lines.append(first)
+        while not stop:
+            try:
+                line = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if line is None:
+                stop = True
+            else:
+                lines.append(line)
+        return lines, stop
+
+    def _run(self):
+        try:
+            self._open()
+        except OSError as e:
+            print(f"ERROR: Gagal membuka file log {self.path}: {e}")
+            self.closed = True
+            return
+
+        last_flush = time.monotonic()
+        dirty = False
+        stop = False
+        while not stop:
+            try:
+                # Tanpa data tertunda: tidur sampai ada baris baru
+                lines, stop = self._drain(self.queue.get(timeout=self.flush_interval if dirty else None))
+            except queue.Empty:
+                lines = []
+            try:
+                if lines:
+                    self.file.write("\n".join(lines) + "\n")
+                    dirty = True
+                    if self.max_bytes and self.file.tell() >= self.max_bytes:
+                        self._rotate()
+                now = time.monotonic()
+                if dirty and (stop or now - last_flush >= self.flush_interval):
+                    self.file.flush()
+                    dirty = False
+                    last_flush = now
+            except OSError as e:
+                print(f"ERROR: Gagal menyimpan log ke {self.path}: {e}")
+        try:
+            self.file.close()
+        except OSError:
+            pass
@@ -0,0 +1,248 @@
+# metrics.py
+# Counter, gauge, dan histogram ringan untuk jalur panas server.
+#
+# Metrik disimpan di satu registry per proses (REGISTRY) dan bisa dibaca lewat
+# perintah UDP STATS (snapshot JSON) atau endpoint HTTP teks Prometheus
+# (serve_http). Semua metrik thread-safe: sebagian diisi dari thread worker HTTP.
+import asyncio
+import bisect
+import threading
+import time
+
+# Batas bucket default (detik): 0.5 ms .. 10 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    __slots__ = ("lock", "value")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+    def samples(self, name, labels):
+        yield name + "_total" + _label_text(labels), self.value
+
+
+class Gauge:
+    """Gauge yang nilainya dibaca dari fungsi saat snapshot (mis. len(clients))."""
+
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def snapshot(self):
+        try:
+            return self.fn()
+        except Exception:
+            return None
+
+    def samples(self, name, labels):
+        value = self.snapshot()
+        if value is not None:
+            yield name + _label_text(labels), value
+
+
+class Histogram:
+    """Histogram bucket tetap; persentil diperkirakan dari batas atas bucket."""
+
+    __slots__ = ("lock", "buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # Bucket terakhir = +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def percentile(self, q):
+        with self.lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return None
+        target = q * total
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            if running >= target:
+                return bound if bound != float("inf") else self.buckets[-1]
+        return self.buckets[-1]
+
+    def snapshot(self):
+        with self.lock:
+            count, total = self.count, self.sum
+        return {
+            "count": count,
+            "avg": round(total / count, 6) if count else None,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+        }
+
+    def samples(self, name, labels):
+        with self.lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        running = 0
+        for bound, n in zip(self.buckets + ("+Inf",), counts):
+            running += n
+            yield name + "_bucket" + _label_text(labels + (("le", bound),)), running
+        yield name + "_count" + _label_text(labels), count
+        yield name + "_sum" + _label_text(labels), total
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class TimedLock:
+    """threading.Lock yang mencatat lama menunggu lock ke histogram lock_wait_seconds."""
+
+    __slots__ = ("lock", "wait")
+
+    def __init__(self, name, registry=None):
+        self.lock = threading.Lock()
+        self.wait = (registry or REGISTRY).histogram("lock_wait_seconds", "Lama menunggu lock", lock=name)
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self.lock.acquire(False):
+            self.wait.observe(0.0)
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        acquired = self.lock.acquire(True, timeout)
+        self.wait.observe(time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Registry:
+    """Kumpulan metrik per proses, diidentifikasi nama + label."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}   # (nama, label) → metrik
+        self.help = {}
+        self.types = {}
+
+    def _get(self, kind, name, help_text, labels, factory):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(key)
+                if metric is None:
+                    metric = self.metrics[key] = factory()
+                    self.help.setdefault(name, help_text)
+                    self.types.setdefault(name, kind)
+        return metric
+
+    def counter(self, name, help_text="", **labels):
+        return self._get("counter", name, help_text, labels, Counter)
+
+    def histogram(self, name, help_text="", buckets=LATENCY_BUCKETS, **labels):
+        return self._get("histogram", name, help_text, labels, lambda: Histogram(buckets))
+
+    def gauge(self, name, fn, help_text="", **labels):
+        """Daftarkan (atau ganti) gauge berbasis fungsi."""
+        gauge = self._get("gauge", name, help_text, labels, lambda: Gauge(fn))
+        gauge.fn = fn
+        return gauge
+
+    def snapshot(self):
+        """Semua metrik sebagai dict datar {nama{label}: nilai} untuk balasan STATS."""
+        with self.lock:
+            items = sorted(self.metrics.items())
+        return {name + _label_text(labels): metric.snapshot() for (name, labels), metric in items}
+
+    def render_prometheus(self):
+        with self.lock:
+            items = sorted(self.metrics.items())
+        lines = []
+        current = None
+        for (name, labels), metric in items:
+            if name != current:
+                current = name
+                if self.help.get(name):
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {self.types[name]}")
+            for sample, value in metric.samples(name, labels):
+                lines.append(f"{sample} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+gauge = REGISTRY.gauge
+
+
+async def _handle_http(reader, writer, registry):
+    try:
+        request = await asyncio.wait_for(reader.readline(), 5)
+        # Buang header sisa request
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+            pass
+        path = request.split()[1] if len(request.split()) > 1 else b"/"
+        if path == b"/metrics":
+            status, body = "200 OK", registry.render_prometheus().encode()
+        else:
+            status, body = "404 Not Found", b"Not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_http(host, port, registry=None):
+    """Endpoint HTTP /metrics (format teks Prometheus) di event loop yang sedang berjalan."""
+    registry = registry or REGISTRY
+    return await asyncio.start_server(lambda r, w: _handle_http(r, w, registry), host, port)
@@ -0,0 +1,245 @@
+# mock_tomtom.py
+# Server HTTP pengganti TomTom API untuk pengujian lokal dan uji beban.
+#
+# Melayani endpoint yang dipakai server: flowSegmentData, reverseGeocode, dan
+# geocode, dengan latensi dan error yang bisa diatur. Data dibuat deterministik
+# dari koordinat/query (kecepatan berubah pelan mengikuti waktu), jadi tidak
+# butuh API key maupun koneksi internet.
+#
+# Jalan dimodelkan sebagai grid: jalan mendatar dan tegak setiap STREET_SPACING
+# derajat. flowSegmentData mengembalikan satu blok (antar dua persimpangan)
+# beserta geometrinya, sehingga titik-titik di blok yang sama berbagi segmen
+# seperti pada API aslinya. Hasil geocode selalu jatuh di salah satu jalan.
+#
+# Pemakaian:
+#   python mock_tomtom.py --port 8081 --latency 80 --jitter 40 --error-rate 0.02
+#   TOMTOM_BASE_URL=http://127.0.0.1:8081 TOMTOM_API_KEY=mock python server2.py
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Konfigurasi default
+MOCK_HOST = "127.0.0.1"
+MOCK_PORT = 8081
+LATENCY_MS = 50.0       # Rata-rata latensi tiap response
+JITTER_MS = 20.0        # Variasi acak latensi (±)
+ERROR_RATE = 0.0        # Peluang (0..1) response error
+ERROR_STATUS = 503      # Status HTTP untuk error yang disuntikkan
+SPREAD = 0.2            # Lebar area (derajat) tempat hasil geocode tersebar
+STREET_SPACING = 0.002  # Derajat (~220 m) antar jalan di grid
+
+# Titik pusat koordinat hasil geocode (Surabaya)
+BASE_LAT = -7.2575
+BASE_LON = 112.7521
+
+
+def _seed(text):
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def _snap(value):
+    return round(value / STREET_SPACING) * STREET_SPACING
+
+
+def nearest_street(lat, lon):
+    """Jalan terdekat: ("h", lat jalan) untuk jalan mendatar atau ("v", lon jalan) untuk jalan tegak."""
+    if abs(lat - _snap(lat)) <= abs(lon - _snap(lon)):
+        return "h", _snap(lat)
+    return "v", _snap(lon)
+
+
+def geocode_position(query, spread=SPREAD):
+    """Koordinat tetap untuk satu query, tersebar dalam ±spread/2 dari titik pusat, tepat di atas jalan."""
+    h = _seed(query.strip().lower())
+    lat = BASE_LAT + ((h & 0xFFFF) / 0xFFFF - 0.5) * spread
+    lon = BASE_LON + ((h >> 16) / 0xFFFF - 0.5) * spread
+    axis, line = nearest_street(lat, lon)
+    if axis == "h":
+        lat = line
+    else:
+        lon = line
+    return round(lat, 6), round(lon, 6)
+
+
+def segment_geometry(lat, lon):
+    """Blok jalan yang memuat titik: (id segmen, daftar koordinat dari persimpangan ke persimpangan)."""
+    axis, line = nearest_street(lat, lon)
+    along = lon if axis == "h" else lat
+    start = math.floor(along / STREET_SPACING) * STREET_SPACING
+    steps = [start + STREET_SPACING * i / 4 for i in range(5)]
+    if axis == "h":
+        coords = [(line, x) for x in steps]
+    else:
+        coords = [(y, line) for y in steps]
+    return f"{axis}{line:.4f}:{start:.4f}", coords
+
+
+def flow_segment(lat, lon, now=None):
+    """Data flowSegmentData palsu untuk blok jalan di titik itu; kecepatan berosilasi dengan periode beberapa menit."""
+    now = time.time() if now is None else now
+    segment_id, coords = segment_geometry(lat, lon)
+    h = _seed(segment_id)
+    free_speed = 30 + h % 50
+    phase = (h % 1000) / 1000 * 2 * math.pi
+    ratio = 0.55 + 0.4 * math.sin(now / 120 + phase)
+    current_speed = max(1, int(free_speed * ratio))
+    return {
+        "flowSegmentData": {
+            "frc": "FRC2",
+            "currentSpeed": current_speed,
+            "freeFlowSpeed": free_speed,
+            "currentTravelTime": int(3600 / current_speed),
+            "freeFlowTravelTime": int(3600 / free_speed),
+            "confidence": round(0.7 + (h % 30) / 100, 2),
+            "roadClosure": False,
+            "coordinates": {
+                "coordinate": [{"latitude": round(y, 6), "longitude": round(x, 6)} for y, x in coords]
+            },
+        }
+    }
+
+
+def reverse_geocode(lat, lon):
+    axis, line = nearest_street(lat, lon)
+    street = f"Jalan Mock {axis.upper()}{_seed(f'{axis}{line:.4f}') % 1000}"
+    return {
+        "addresses": [{
+            "address": {"streetName": street, "freeformAddress": f"{street}, Surabaya"},
+            "position": f"{lat},{lon}",
+        }]
+    }
+
+
+def geocode(query, spread=SPREAD):
+    lat, lon = geocode_position(query, spread)
+    return {
+        "results": [{
+            "type": "Street",
+            "position": {"lat": lat, "lon": lon},
+            "address": {"freeformAddress": query},
+        }]
+    }
+
+
+class MockState:
+    """Pengaturan latensi/error dan penghitung request (thread-safe)."""
+
+    def __init__(self, latency_ms=LATENCY_MS, jitter_ms=JITTER_MS, error_rate=ERROR_RATE,
+                 error_status=ERROR_STATUS, spread=SPREAD):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.spread = spread
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def delay(self):
+        ms = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # Keep-alive, seperti API aslinya
+
+    def do_GET(self):
+        state = self.server.state
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        path = url.path
+
+        if path == "/__stats":
+            self._send(200, state.stats())
+            return
+
+        if path.startswith("/traffic/services/4/flowSegmentData/"):
+            name = "flow"
+        elif path.startswith("/search/2/reverseGeocode/"):
+            name = "reverse_geocode"
+        elif path.startswith("/search/2/geocode/"):
+            name = "geocode"
+        else:
+            self._send(404, {"error": "Not found"})
+            return
+
+        state.count(name)
+        state.delay()
+        if state.error_rate and random.random() < state.error_rate:
+            state.count("errors")
+            self._send(state.error_status, {"error": "Injected error"})
+            return
+
+        try:
+            if name == "flow":
+                lat, lon = (float(x) for x in params["point"][0].split(","))
+                self._send(200, flow_segment(lat, lon))
+            elif name == "reverse_geocode":
+                lat, lon = (float(x) for x in path.rsplit("/", 1)[1][:-len(".json")].split(","))
+                self._send(200, reverse_geocode(lat, lon))
+            else:
+                query = unquote(path.rsplit("/", 1)[1][:-len(".json")])
+                self._send(200, geocode(query, state.spread))
+        except (KeyError, ValueError) as e:
+            self._send(400, {"error": f"Bad request: {e}"})
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # Terlalu ramai saat uji beban
+
+
+def serve(host=MOCK_HOST, port=MOCK_PORT, state=None):
+    """Buat server mock (belum berjalan). Jalankan dengan serve_forever()."""
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.state = state or MockState()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock TomTom API lokal")
+    parser.add_argument("--host", default=MOCK_HOST)
+    parser.add_argument("--port", type=int, default=MOCK_PORT)
+    parser.add_argument("--latency", type=float, default=LATENCY_MS, help="rata-rata latensi (ms)")
+    parser.add_argument("--jitter", type=float, default=JITTER_MS, help="variasi latensi ± (ms)")
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE, help="peluang error 0..1")
+    parser.add_argument("--error-status", type=int, default=ERROR_STATUS, help="status HTTP error")
+    parser.add_argument("--spread", type=float, default=SPREAD, help="lebar area hasil geocode (derajat)")
+    args = parser.parse_args()
+
+    state = MockState(args.latency, args.jitter, args.error_rate, args.error_status, args.spread)
+    server = serve(args.host, args.port, state)
+    print(f"[MOCK] TomTom mock berjalan di http://{args.host}:{args.port} "
+          f"(latensi {args.latency}±{args.jitter} ms, error {args.error_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"[MOCK] Dimatikan. Request: {state.stats()}")
+
+
+if __name__ == "__main__":
+    main()
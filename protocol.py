@@ -0,0 +1,249 @@
+# protocol.py
+# Protokol datagram biner ringkas untuk update lalu lintas.
+#
+# Setiap datagram: header (magic "TF", versi, tipe, jumlah record) lalu record
+# dengan layout tetap. Nama jalan/lokasi dikirim sekali lewat tabel nama (MSG_NAMES)
+# dan selanjutnya cukup dirujuk dengan ID 16-bit. Mode teks tetap tersedia sebagai
+# fallback untuk client yang tidak meminta mode biner saat JOIN.
+#
+# Mode delta (opsional, JOIN:BIN,DELTA): setelah keyframe (MSG_UPDATE), server
+# hanya mengirim field yang berubah (MSG_DELTA); delta tanpa field = heartbeat.
+# Nomor urut per lokasi membuat client bisa mendeteksi paket hilang dan meminta
+# keyframe ulang dengan RESYNC:<loc_id>, atau meminta record yang terlewat dengan
+# REPLAY:<loc_id>,<seq> (server menyimpan beberapa update terakhir per lokasi).
+import struct
+import threading
+from collections import deque
+
+MAGIC = b"TF"
+VERSION = 2
+MAX_DATAGRAM = 1200   # Byte; aman di bawah MTU umum agar tidak terfragmentasi
+
+MSG_NAMES = 1    # Record: id, panjang, nama UTF-8
+MSG_UPDATE = 2   # Record: update lalu lintas lengkap satu lokasi (keyframe)
+MSG_DELTA = 3    # Record: hanya field yang berubah sejak update sebelumnya
+
+FLAG_STALE = 0x01   # Data terakhir yang masih valid, dikirim ulang karena upstream gangguan
+
+HEADER = struct.Struct("!2sBBH")        # magic, versi, tipe, jumlah record
+NAME = struct.Struct("!HB")             # id nama, panjang nama (maks 255 byte)
+UPDATE = struct.Struct("!HIHIHHHHB")    # loc_id, seq, road_id, epoch, speed, free speed, kemacetan×10, confidence×10000, flags
+DELTA = struct.Struct("!HIBH")          # loc_id, seq, mask field yang berubah, selisih epoch (detik)
+
+# Field yang bisa muncul di record DELTA, urut sesuai bit mask
+DELTA_FIELDS = (
+    ("road_id", struct.Struct("!H")),
+    ("current_speed", struct.Struct("!H")),
+    ("free_flow_speed", struct.Struct("!H")),
+    ("congestion", struct.Struct("!H")),
+    ("confidence", struct.Struct("!H")),
+    ("flags", struct.Struct("!B")),
+)
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class NameTable:
+    """Interning nama (lokasi/jalan) → ID 16-bit, thread-safe.
+
+    Jumlah ID dibatasi capacity. Saat penuh, nama yang tidak ada di live()
+    (mis. lokasi yang sudah tidak dipantau) dibuang dan ID-nya dipakai ulang;
+    Sender mengirim ulang MSG_NAMES untuk ID yang namanya berganti.
+    """
+
+    def __init__(self, capacity=0xFFFF, live=None):
+        self.capacity = capacity
+        self.live = live
+        self.lock = threading.Lock()
+        self.ids = {}
+        self.names = []
+        self.free = []
+
+    def intern(self, name, keep=()):
+        """ID untuk name. keep: nama lain yang baru di-intern pemanggil dan tidak boleh dibuang."""
+        name_id = self.ids.get(name)
+        if name_id is not None:
+            return name_id
+        with self.lock:
+            name_id = self.ids.get(name)
+            if name_id is None:
+                if not self.free and len(self.names) >= self.capacity:
+                    self._collect(keep)
+                if self.free:
+                    name_id = self.free.pop()
+                    self.names[name_id] = name
+                elif len(self.names) < self.capacity:
+                    name_id = len(self.names)
+                    self.names.append(name)
+                else:
+                    raise OverflowError("Tabel nama penuh")
+                self.ids[name] = name_id
+            return name_id
+
+    def _collect(self, keep):
+        live = set(self.live() if self.live is not None else ())
+        live.update(keep)
+        for name, name_id in list(self.ids.items()):
+            if name not in live:
+                del self.ids[name]
+                self.names[name_id] = None
+                self.free.append(name_id)
+
+    def lookup(self, name_id):
+        """Nama untuk name_id, atau None jika ID tidak dikenal / sudah dibuang."""
+        return self.names[name_id] if 0 <= name_id < len(self.names) else None
+
+
+def is_binary(data):
+    return data[:2] == MAGIC
+
+
+def encode_name(name_id, name):
+    raw = name.encode("utf-8")[:255]
+    return NAME.pack(name_id, len(raw)) + raw
+
+
+def summary_fields(road_id, summary, flags=0):
+    """Nilai field record (road_id, speed, free speed, kemacetan×10, confidence×10000, flags) dari TrafficSummary."""
+    return (
+        road_id,
+        min(int(summary.current_speed), 0xFFFF),
+        min(int(summary.free_flow_speed), 0xFFFF),
+        int(round(summary.congestion_percent * 10)),
+        int(round(summary.confidence * 10000)),
+        flags,
+    )
+
+
+def encode_update(loc_id, seq, epoch, fields):
+    """Encode record UPDATE (keyframe) tanpa header."""
+    road_id, speed, free_speed, congestion, confidence, flags = fields
+    return UPDATE.pack(loc_id, seq, road_id, epoch, speed, free_speed, congestion, confidence, flags)
+
+
+def encode_delta(loc_id, seq, age, old_fields, new_fields):
+    """Encode record DELTA: hanya field yang berbeda dari old_fields."""
+    mask = 0
+    parts = []
+    for bit, ((_, fmt), old, new) in enumerate(zip(DELTA_FIELDS, old_fields, new_fields)):
+        if old != new:
+            mask |= 1 << bit
+            parts.append(fmt.pack(new))
+    return DELTA.pack(loc_id, seq, mask, min(max(age, 0), 0xFFFF)) + b"".join(parts)
+
+
+class DeltaStream:
+    """Status stream satu lokasi: nomor urut, state terakhir, dan jadwal keyframe.
+
+    Dipanggil berurutan untuk satu lokasi (watch-list tidak pernah mem-poll
+    lokasi yang sama secara paralel), jadi tidak perlu lock. Record UPDATE
+    terakhir (maks. replay_size) disimpan di ring buffer untuk REPLAY.
+    """
+
+    def __init__(self, loc_id, keyframe_every=10, replay_size=32):
+        self.loc_id = loc_id
+        self.keyframe_every = keyframe_every
+        self.seq = 0
+        self.fields = None
+        self.epoch = 0
+        self.since_keyframe = 0
+        self.last_full = None
+        self.names = ()
+        self.recent = deque(maxlen=replay_size)
+
+    def next(self, fields, epoch, names=()):
+        """Catat state baru. Kembalikan (record UPDATE, record DELTA atau None jika keyframe)."""
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        full = encode_update(self.loc_id, self.seq, epoch, fields)
+        delta = None
+        if self.fields is not None and self.since_keyframe + 1 < self.keyframe_every:
+            delta = encode_delta(self.loc_id, self.seq, epoch - self.epoch, self.fields, fields)
+            self.since_keyframe += 1
+        else:
+            self.since_keyframe = 0
+        self.fields, self.epoch, self.last_full, self.names = fields, epoch, full, names
+        self.recent.append((self.seq, full))
+        return full, delta
+
+    def replay(self, seq):
+        """Record UPDATE sejak nomor urut seq sampai yang terbaru.
+
+        Jika seq sudah keluar dari ring buffer (atau tidak dikenal), hanya
+        keyframe terakhir yang dikembalikan: client tetap tersinkron, hanya
+        update di antaranya yang tidak bisa diulang.
+        """
+        if not self.recent:
+            return []
+        oldest = self.recent[0][0]
+        # Selisih dihitung modulo 2^32 agar tetap benar saat nomor urut berputar
+        offset = (seq - oldest) & 0xFFFFFFFF
+        if offset >= len(self.recent):
+            return [self.last_full]
+        return [record for _, record in list(self.recent)[offset:]]
+
+
+def pack(msg_type, records, limit=MAX_DATAGRAM):
+    """Gabungkan record sejenis menjadi sesedikit mungkin datagram di bawah limit."""
+    datagrams = []
+    chunk, size = [], HEADER.size
+    for record in records:
+        if chunk and size + len(record) > limit:
+            datagrams.append(HEADER.pack(MAGIC, VERSION, msg_type, len(chunk)) + b"".join(chunk))
+            chunk, size = [], HEADER.size
+        chunk.append(record)
+        size += len(record)
+    if chunk:
+        datagrams.append(HEADER.pack(MAGIC, VERSION, msg_type, len(chunk)) + b"".join(chunk))
+    return datagrams
+
+
+def decode(data):
+    """Decode satu datagram biner. Kembalikan (tipe, daftar record) atau None jika tidak valid."""
+    if len(data) < HEADER.size:
+        return None
+    magic, version, msg_type, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        return None
+
+    offset = HEADER.size
+    records = []
+    try:
+        if msg_type == MSG_UPDATE:
+            for fields in UPDATE.iter_unpack(data[offset:offset + count * UPDATE.size]):
+                loc_id, seq, road_id, epoch, speed, free_speed, congestion, confidence, flags = fields
+                records.append({
+                    "loc_id": loc_id,
+                    "seq": seq,
+                    "road_id": road_id,
+                    "epoch": epoch,
+                    "current_speed": speed,
+                    "free_flow_speed": free_speed,
+                    "congestion_percent": congestion / 10,
+                    "confidence": confidence / 10000,
+                    "flags": flags,
+                })
+        elif msg_type == MSG_DELTA:
+            for _ in range(count):
+                loc_id, seq, mask, age = DELTA.unpack_from(data, offset)
+                offset += DELTA.size
+                record = {"loc_id": loc_id, "seq": seq, "age": age}
+                for bit, (name, fmt) in enumerate(DELTA_FIELDS):
+                    if mask & (1 << bit):
+                        record[name] = fmt.unpack_from(data, offset)[0]
+                        offset += fmt.size
+                if "congestion" in record:
+                    record["congestion_percent"] = record.pop("congestion") / 10
+                if "confidence" in record:
+                    record["confidence"] /= 10000
+                records.append(record)
+        elif msg_type == MSG_NAMES:
+            for _ in range(count):
+                name_id, length = NAME.unpack_from(data, offset)
+                offset += NAME.size
+                records.append((name_id, data[offset:offset + length].decode("utf-8", errors="replace")))
+                offset += length
+        else:
+            return None
+    except struct.error:
+        return None
+    return msg_type, records
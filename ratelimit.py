@@ -0,0 +1,71 @@
+# ratelimit.py
+import ipaddress
+import time
+
+
+class ClientRateLimiter:
+    """Token bucket per (alamat client, jenis perintah), plus anggaran bersama per jenis.
+
+    limits: jenis → (token per detik, kapasitas burst). Jenis di per_ip
+    dihitung per IP saja (bukan (ip, port)) agar tidak bisa diakali dengan
+    berganti port; client loopback (uji beban/alat lokal) tetap per (ip, port).
+    shared: jenis → (token per detik, burst) untuk satu bucket bersama semua
+    client, diambil setelah bucket client mengizinkan. Bucket baru dibuat
+    penuh saat perintah pertama. prune() membuang bucket yang sudah terisi
+    penuh lagi (setara bucket baru), jadi bucket tetap ada selama masih
+    berarti, juga jika client QUIT lalu JOIN lagi. Bucket disimpan sebagai
+    list [token, waktu isi terakhir, penolakan beruntun] agar ringan.
+    Hanya disentuh dari thread event loop.
+    """
+
+    def __init__(self, limits, per_ip=(), shared=None):
+        self.limits = limits
+        self.per_ip = frozenset(per_ip)
+        self.shared = shared or {}
+        self.buckets = {}
+        self.shared_buckets = {}
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def _key(self, addr, kind):
+        if kind in self.per_ip and not ipaddress.ip_address(addr[0]).is_loopback:
+            return addr[0], kind
+        return addr, kind
+
+    @staticmethod
+    def _take(buckets, key, rate, capacity, now):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [capacity, now, 0]
+        else:
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return bucket
+        return None
+
+    def acquire(self, addr, kind, now=None):
+        """Ambil satu token. Kembalikan 0 jika diizinkan, atau jumlah penolakan beruntun (1 = yang pertama)."""
+        now = time.monotonic() if now is None else now
+        key = self._key(addr, kind)
+        bucket = self._take(self.buckets, key, *self.limits[kind], now)
+        if bucket is not None:
+            if kind not in self.shared or self._take(self.shared_buckets, kind, *self.shared[kind], now):
+                bucket[2] = 0
+                return 0
+            bucket[0] += 1   # Ditolak anggaran bersama: token client dikembalikan
+        else:
+            bucket = self.buckets[key]
+        bucket[2] += 1
+        return bucket[2]
+
+    def prune(self, now=None):
+        """Buang bucket yang sudah penuh kembali. Kembalikan jumlah yang dibuang."""
+        now = time.monotonic() if now is None else now
+        full = [key for key, (tokens, updated, _) in self.buckets.items()
+                if tokens + (now - updated) * self.limits[key[1]][0] >= self.limits[key[1]][1]]
+        for key in full:
+            del self.buckets[key]
+        return len(full)
@@ -0,0 +1,73 @@
+# registry.py
+import heapq
+import time
+
+
+class ClientRegistry:
+    """Registry client aktif dengan waktu terakhir terlihat, batas ukuran, dan expiry.
+
+    Setiap datagram dari client cukup memperbarui last_seen (O(1)). Heap berisi
+    tenggat expiry diperbarui secara malas: saat entri jatuh tempo dicek ulang
+    terhadap last_seen, dan dimasukkan kembali jika client ternyata masih aktif.
+    Tiap client hanya punya satu entri sah di heap (dicocokkan lewat generation);
+    entri milik client yang sudah dihapus atau didaftarkan ulang dibuang.
+    """
+
+    def __init__(self, timeout=90.0, max_clients=10000):
+        self.timeout = timeout
+        self.max_clients = max_clients
+        self.last_seen = {}
+        self.generations = {}   # addr → generation entri heap yang sah
+        self.generation = 0
+        self.heap = []
+
+    def __contains__(self, addr):
+        return addr in self.last_seen
+
+    def __len__(self):
+        return len(self.last_seen)
+
+    def __iter__(self):
+        return iter(tuple(self.last_seen))
+
+    def _push(self, deadline, addr):
+        self.generation += 1
+        self.generations[addr] = self.generation
+        heapq.heappush(self.heap, (deadline, self.generation, addr))
+
+    def touch(self, addr, now=None):
+        """Catat aktivitas client. Kembalikan True jika client baru, False jika lama, None jika registry penuh."""
+        now = time.monotonic() if now is None else now
+        if addr in self.last_seen:
+            self.last_seen[addr] = now
+            return False
+        if len(self.last_seen) >= self.max_clients:
+            return None
+        self.last_seen[addr] = now
+        self._push(now + self.timeout, addr)
+        # Siklus QUIT → JOIN meninggalkan entri basi; bangun ulang heap jika sudah terlalu banyak
+        if len(self.heap) > 2 * len(self.last_seen) + 64:
+            self.heap = [entry for entry in self.heap if self.generations.get(entry[2]) == entry[1]]
+            heapq.heapify(self.heap)
+        return True
+
+    def remove(self, addr):
+        self.generations.pop(addr, None)
+        return self.last_seen.pop(addr, None) is not None
+
+    def expired(self, now=None):
+        """Keluarkan dan kembalikan client yang tidak terlihat lebih lama dari timeout."""
+        now = time.monotonic() if now is None else now
+        gone = []
+        while self.heap and self.heap[0][0] <= now:
+            _, generation, addr = heapq.heappop(self.heap)
+            if self.generations.get(addr) != generation:
+                continue  # Entri basi (client sudah dihapus / didaftarkan ulang)
+            seen = self.last_seen[addr]
+            if seen + self.timeout <= now:
+                del self.last_seen[addr]
+                del self.generations[addr]
+                gone.append(addr)
+            else:
+                self._push(seen + self.timeout, addr)
+        return gone
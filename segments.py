@@ -0,0 +1,138 @@
+# segments.py
+import math
+import threading
+import time
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def _to_xy(lat, lon, ref_lat):
+    """Proyeksi equirectangular lokal (meter); cukup akurat untuk jarak puluhan meter."""
+    x = math.radians(lon) * EARTH_RADIUS_M * math.cos(math.radians(ref_lat))
+    y = math.radians(lat) * EARTH_RADIUS_M
+    return x, y
+
+
+def distance_to_polyline(lat, lon, coords):
+    """Jarak terdekat (meter) dari titik ke polyline [(lat, lon), ...]."""
+    px, py = _to_xy(lat, lon, lat)
+    points = [_to_xy(a, b, lat) for a, b in coords]
+    if len(points) == 1:
+        return math.hypot(points[0][0] - px, points[0][1] - py)
+    best = float("inf")
+    for (ax, ay), (bx, by) in zip(points, points[1:]):
+        dx, dy = bx - ax, by - ay
+        length2 = dx * dx + dy * dy
+        t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length2))
+        best = min(best, math.hypot(ax + t * dx - px, ay + t * dy - py))
+    return best
+
+
+def polyline_length(coords):
+    """Panjang polyline [(lat, lon), ...] dalam meter (0 jika kurang dari dua titik)."""
+    if len(coords) < 2:
+        return 0.0
+    ref_lat = coords[0][0]
+    points = [_to_xy(a, b, ref_lat) for a, b in coords]
+    return sum(math.hypot(bx - ax, by - ay) for (ax, ay), (bx, by) in zip(points, points[1:]))
+
+
+class _Segment:
+    __slots__ = ("coords", "data", "fetched", "cells")
+
+    def __init__(self, coords, data, fetched, cells):
+        self.coords = coords
+        self.data = data
+        self.fetched = fetched
+        self.cells = cells
+
+
+class SegmentIndex:
+    """Indeks spasial (grid) segmen jalan dari hasil flowSegmentData (FlowSample).
+
+    Satu response flowSegmentData berlaku untuk seluruh segmen jalan, bukan
+    hanya titik yang diminta. Titik pantau lain yang terletak di segmen yang
+    sama (dalam tolerance meter dari geometrinya) dan datanya masih segar
+    (umur < max_age, atau max_age yang diberikan ke find) bisa memakai
+    response itu tanpa request baru, sehingga
+    jumlah request per putaran mengikuti jumlah segmen yang tercakup, bukan
+    jumlah titik. Thread-safe (diisi dari thread worker poll).
+    """
+
+    def __init__(self, max_age, tolerance=20.0, cell=0.002):
+        self.max_age = max_age
+        self.tolerance = tolerance
+        self.cell = cell
+        self.lock = threading.Lock()
+        self.grid = {}       # (i, j) sel grid → set key segmen
+        self.segments = {}   # key segmen (ujung geometri) → _Segment
+        self.added = 0
+
+    def __len__(self):
+        return len(self.segments)
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell)), int(math.floor(lon / self.cell))
+
+    def _cells_for(self, coords):
+        """Sel grid yang dilewati kotak batas segmen, diperlebar sebesar tolerance."""
+        margin = self.tolerance / 111000.0
+        lats = [c[0] for c in coords]
+        lons = [c[1] for c in coords]
+        i0, j0 = self._cell(min(lats) - margin, min(lons) - margin)
+        i1, j1 = self._cell(max(lats) + margin, max(lons) + margin)
+        return [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+
+    def add(self, flow, now=None):
+        """Indeks FlowSample (lihat flowdata.parse_flow). Kembalikan False jika tanpa geometri."""
+        coords = flow.coordinates
+        if not coords:
+            return False
+        now = time.monotonic() if now is None else now
+        key = (coords[0], coords[-1])
+        with self.lock:
+            old = self.segments.get(key)
+            if old is not None:
+                old.data, old.fetched = flow, now
+                return True
+            cells = self._cells_for(coords)
+            self.segments[key] = _Segment(coords, flow, now, cells)
+            for cell in cells:
+                self.grid.setdefault(cell, set()).add(key)
+            self.added += 1
+            if self.added % 64 == 0:
+                self._prune(now)
+        return True
+
+    def coordinates(self, first, last):
+        """Geometri tersimpan untuk segmen dengan ujung first & last, atau None (lihat flowdata.parse_flow)."""
+        with self.lock:
+            segment = self.segments.get((first, last))
+        return segment.coords if segment is not None else None
+
+    def find(self, lat, lon, max_age=None, now=None):
+        """FlowSample segmen segar (umur < max_age, default self.max_age) yang melewati titik (lat, lon), atau None."""
+        now = time.monotonic() if now is None else now
+        max_age = self.max_age if max_age is None else min(max_age, self.max_age)
+        with self.lock:
+            keys = self.grid.get(self._cell(lat, lon))
+            if not keys:
+                return None
+            best, best_distance = None, self.tolerance
+            for key in keys:
+                segment = self.segments[key]
+                if now - segment.fetched >= max_age:
+                    continue
+                distance = distance_to_polyline(lat, lon, segment.coords)
+                if distance <= best_distance:
+                    best, best_distance = segment, distance
+            return best.data if best is not None else None
+
+    def _prune(self, now):
+        """Buang segmen yang sudah lama tidak diperbarui (tidak ada titik pantau di sana lagi)."""
+        for key in [k for k, s in self.segments.items() if now - s.fetched >= self.max_age * 4]:
+            for cell in self.segments.pop(key).cells:
+                keys = self.grid.get(cell)
+                keys.discard(key)
+                if not keys:
+                    del self.grid[cell]
@@ -1,77 +1,90 @@
 # server.py
 import os
-import time
-import socket
-import threading
+import asyncio
+import signal
 import json
 from datetime import datetime
-from dotenv import load_dotenv
-import requests
+from urllib.parse import quote
+import config
+import tomtom
+import metrics
+import logutil
+from cache import TTLCache, SqliteStore, normalize_key, snap_coordinate
+from flowdata import UNKNOWN_ROAD, TrafficSummary, parse_flow, parse_street_name
+from registry import ClientRegistry
 
-# Load API key
-load_dotenv()
-TOMTOM_API_KEY = os.getenv("TOMTOM_API_KEY")
-if not TOMTOM_API_KEY:
-    raise ValueError("TOMTOM_API_KEY tidak ditemukan di .env")
+log = logutil.get_logger("server")
 
-# Konfigurasi
-SERVER_HOST = "0.0.0.0"  # Dengarkan semua antarmuka
-SERVER_PORT = 5005
-UPDATE_INTERVAL = 3.5  # detik
+# Konfigurasi (default < trafficflow.json < env/.env < flag CLI; lihat config.py)
+cfg = config.load(("host", "port", "interval", "watch", "upstream"),
+                  argv=None if __name__ == "__main__" else [],
+                  description="Server UDP lalu lintas (broadcast lokasi tetap)")
+TOMTOM_API_KEY = os.getenv("TOMTOM_API_KEY")  # Dicek saat start, bukan saat import
+SERVER_HOST = cfg.host
+SERVER_PORT = cfg.port
+UPDATE_INTERVAL = cfg.interval  # detik
+WATCH_LOCATIONS = cfg.watch or ("Jalan Raya Jemursari, Surabaya",)  # Sertakan kota agar geocode akurat
+GEOCODE_RETRY_MIN = 5.0        # Detik; jeda awal mengulang geocode yang gagal saat start
+GEOCODE_RETRY_MAX = 300.0
+GEOCODE_CACHE_TTL = 7 * 24 * 3600  # detik
+GEOCODE_CACHE_FILE = os.getenv("GEOCODE_CACHE_FILE", "geocode_cache.db")  # Kosongkan untuk cache memori saja
+GEOCODE_CACHE_MAX_ROWS = 100000  # Baris maksimum per tabel di GEOCODE_CACHE_FILE
+CACHE_PURGE_INTERVAL = 3600.0   # Detik; entri kedaluwarsa dibuang saat start lalu secara berkala
+REVERSE_GEOCODE_GRID = 0.0005           # Derajat (~55 m); titik dalam satu sel grid berbagi nama jalan
+REVERSE_GEOCODE_TTL = 24 * 3600         # Nama jalan untuk titik tetap praktis tidak berubah
+CLIENT_TIMEOUT = 90.0          # Detik tanpa pesan (PING/JOIN) sebelum client dianggap mati
+CLIENT_SWEEP_INTERVAL = 5.0
+MAX_CLIENTS = 10000
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # >0: endpoint HTTP /metrics (Prometheus)
 
-# Simpan client aktif: set dari (ip, port)
-clients = set()
-clients_lock = threading.Lock()
+tomtom.configure(base_url=cfg.upstream)
+
+# Simpan client aktif: (ip, port) → waktu terakhir terlihat. Hanya disentuh dari thread event loop.
+clients = ClientRegistry(timeout=CLIENT_TIMEOUT, max_clients=MAX_CLIENTS)
+
+# Nama jalan hasil reverseGeocode, di-cache per sel grid koordinat
+road_cache = TTLCache(maxsize=64, ttl=REVERSE_GEOCODE_TTL, name="road_cache")
 
 def get_traffic_data(lat, lon):
     """Ambil data lalu lintas & info jalan dari TomTom API secara lengkap."""
-    traffic_url = "https://api.tomtom.com/traffic/services/4/flowSegmentData/absolute/10/json"
-    road_url = f"https://api.tomtom.com/search/2/reverseGeocode/{lat},{lon}.json"
+    traffic_url = tomtom.url("/traffic/services/4/flowSegmentData/absolute/10/json")
+    road_url = tomtom.url(f"/search/2/reverseGeocode/{lat},{lon}.json")
 
     try:
-        # ==== 1️⃣ Request data lalu lintas ====
-        response = requests.get(traffic_url, params={
+        # ==== 1️⃣ Request data nama jalan (jarang berubah, pakai cache) ====
+        # Jika belum ada di cache, dijalankan paralel dengan request lalu lintas
+        road_key = snap_coordinate(lat, lon, REVERSE_GEOCODE_GRID)
+        road_name = road_cache.get(road_key)
+        road_future = None
+        if road_name is None and not tomtom.unavailable("reverse_geocode"):
+            road_future = tomtom.submit(tomtom.get, road_url, {"key": TOMTOM_API_KEY})
+
+        # ==== 2️⃣ Request data lalu lintas ====
+        response = tomtom.get(traffic_url, params={
             "point": f"{lat},{lon}",
             "key": TOMTOM_API_KEY
-        }, timeout=10)
+        })
         response.raise_for_status()
-        traffic_data = response.json()
-
-        # ==== 2️⃣ Request data nama jalan ====
-        response2 = requests.get(road_url, params={"key": TOMTOM_API_KEY}, timeout=10)
-        response2.raise_for_status()
-        road_data = response2.json()
-
-        # ==== 3️⃣ Ekstrak informasi utama ====
-        flow = traffic_data.get("flowSegmentData", {})
-        road_info = road_data.get("addresses", [{}])[0].get("address", {})
-
-        road_name = road_info.get("streetName", "Unknown")
-        current_speed = flow.get("currentSpeed", 0)
-        free_speed = flow.get("freeFlowSpeed", 1)
-        confidence = flow.get("confidence", 0)
-        congestion = max(0, min(1, 1 - (current_speed / free_speed))) if free_speed > 0 else 0
-
-        # ==== 4️⃣ Gabungkan hasil ====
-        result = {
-            "summary": {
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "latitude": lat,
-                "longitude": lon,
-                "road_name": road_name,
-                "current_speed": current_speed,
-                "free_flow_speed": free_speed,
-                "congestion_percent": round(congestion * 100, 1),
-                "confidence": confidence
-            },
-            "reverse_geocoding": road_data,   # response lengkap
-            "traffic_flow": traffic_data       # response lengkap
-        }
+        flow = parse_flow(response.content, geometry=False)
+
+        if road_future is not None:
+            try:
+                response2 = road_future.result()
+                response2.raise_for_status()
+                road_name = parse_street_name(response2.content, default="Unknown")
+                road_cache.set(road_key, road_name)
+            except Exception as e:
+                # Data lalu lintas tetap dikirim; nama jalan dicoba lagi di poll berikutnya
+                log.debug("[API ERROR] Nama jalan: %s", e)
 
+        # ==== 3️⃣ Ringkas hasil (response mentah tidak disimpan) ====
+        result = {"summary": TrafficSummary.from_flow(lat, lon, road_name or UNKNOWN_ROAD, flow)}
+        if road_name is None:
+            result["road_unknown"] = True   # traffic_updater memakai nama jalan terakhir jika ada
         return result
 
     except Exception as e:
-        print(f"[API ERROR] {e}")
+        log.warning("[API ERROR] %s", e)
         return {
             "error": True,
             "message": str(e),
@@ -80,111 +93,230 @@ def get_traffic_data(lat, lon):
 
 def broadcast_message(message):
     """Kirim pesan ke semua client."""
-    with clients_lock:
+    # Encode sekali; transport.sendto tidak memblokir event loop
+    payload = message.encode()
+    sent = 0
+    with BROADCAST_SECONDS.time():
         for client in list(clients):
             try:
-                sock.sendto(message.encode(), client)
+                transport.sendto(payload, client)
+                sent += 1
             except Exception as e:
-                print(f"[SEND ERROR] Gagal kirim ke {client}: {e}")
-                clients.discard(client)
+                SEND_ERRORS.inc()
+                log.warning("[SEND ERROR] Gagal kirim ke %s: %s", client, e)
+                clients.remove(client)
+    DATAGRAMS_OUT.inc(sent)
+    BYTES_OUT.inc(sent * len(payload))
+
+async def expire_clients():
+    """Buang client yang tidak mengirim apa pun selama CLIENT_TIMEOUT."""
+    while True:
+        await asyncio.sleep(CLIENT_SWEEP_INTERVAL)
+        gone = clients.expired()
+        if gone:
+            log.info("[SERVER] %d client kedaluwarsa dihapus (%d aktif).", len(gone), len(clients))
+
+async def purge_cache():
+    """Buang entri geocode kedaluwarsa (juga baris SQLite) saat start lalu setiap CACHE_PURGE_INTERVAL."""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            removed = await loop.run_in_executor(None, geocode_cache.purge)
+            if removed:
+                log.info("[SERVER] %d entri cache kedaluwarsa dihapus dari disk.", removed)
+        except Exception as e:
+            log.warning("[CACHE ERROR] Gagal membersihkan cache: %s", e)
+        await asyncio.sleep(CACHE_PURGE_INTERVAL)
+
 
+geocode_cache = TTLCache(
+    maxsize=256,
+    ttl=GEOCODE_CACHE_TTL,
+    store=SqliteStore(GEOCODE_CACHE_FILE, table="geocode", max_rows=GEOCODE_CACHE_MAX_ROWS) if GEOCODE_CACHE_FILE else None,
+    name="geocode_cache",
+)
 
 def geocode_address(query):
     """Ubah nama jalan/alamat menjadi (lat, lon) menggunakan TomTom Geocoding API."""
+    cached = geocode_cache.get(normalize_key(query))
+    if cached is not None:
+        log.info("[GEOCODE] '%s' → %s (cache)", query, tuple(cached))
+        return tuple(cached)
+
     # Encode spasi & karakter khusus secara aman
-    url = f"https://api.tomtom.com/search/2/geocode/{requests.utils.quote(query)}.json"
+    url = tomtom.url(f"/search/2/geocode/{quote(query)}.json")
     try:
-        response = requests.get(url, params={"key": TOMTOM_API_KEY}, timeout=10)
+        response = tomtom.get(url, params={"key": TOMTOM_API_KEY})
         response.raise_for_status()
         data = response.json()
         if data.get("results"):
             pos = data["results"][0]["position"]
-            print(f"[GEOCODE] '{query}' → ({pos['lat']}, {pos['lon']})")
+            log.info("[GEOCODE] '%s' → (%s, %s)", query, pos["lat"], pos["lon"])
+            geocode_cache.set(normalize_key(query), (pos["lat"], pos["lon"]))
             return pos["lat"], pos["lon"]
         else:
-            print(f"[GEOCODE] Tidak ditemukan hasil untuk: {query}")
+            log.warning("[GEOCODE] Tidak ditemukan hasil untuk: %s", query)
             return None, None
     except Exception as e:
-        print(f"[GEOCODE ERROR] {e}")
+        log.warning("[GEOCODE ERROR] %s", e)
         return None, None
 
 
-def traffic_updater():
-    #jl wonokromo
-    # LAT = -7.302352137612897
-    # LON = 112.73684452653953
-
-    #jl ahmad yani
-    # LAT = -7.385263061710606
-    # LON = 112.72859890463283
+async def locate(address):
+    """Koordinat alamat; geocode yang gagal diulang dengan jeda berlipat (tidak pernah menyerah)."""
+    loop = asyncio.get_running_loop()
+    delay = GEOCODE_RETRY_MIN
+    while True:
+        # HTTP blocking dijalankan di executor; alamat yang sudah di-cache langsung kembali
+        lat, lon = await loop.run_in_executor(None, geocode_address, address)
+        if lat is not None and lon is not None:
+            return lat, lon
+        log.warning("[SERVER] Geocode '%s' gagal, dicoba lagi dalam %.0f detik.", address, delay)
+        await asyncio.sleep(delay)
+        delay = min(GEOCODE_RETRY_MAX, delay * 2)
 
-    #Jalan Prabu Siliwangi
-    # LAT = -7.30841281142686 
-    # LON = 112.71237302449151 
-    # -7.100295982078176, 112.18871171571449
-    # LAT = -7.100295982078176 
-    # LON = 112.18871171571449
+def format_update(s):
+    """Pesan teks update lalu lintas; data basi diberi penanda di akhir (pola parser client tetap cocok)."""
+    msg = (
+        f"[LALU LINTAS] {s.timestamp} | "
+        f"Lokasi: {s.road_name} | "
+        f"Kecepatan: {s.current_speed} km/jam | "
+        f"Kemacetan: {s.congestion_percent}% | "
+        f"Confidence: {s.confidence}"
+    )
+    if s.stale:
+        msg += " | BASI (upstream gangguan)"
+    return msg
 
-       # 🔁 Ganti di sini: masukkan nama jalan yang ingin dipantau
-    LOCATION_NAME = "Jalan Raya Jemursari, Surabaya"  # Contoh: sesuaikan kota agar akurat!
+async def traffic_updater(address):
+    """Pantau satu alamat dan broadcast datanya ke semua client setiap UPDATE_INTERVAL.
 
-    # Ambil koordinat sekali di awal
-    lat, lon = geocode_address(LOCATION_NAME)
-    if lat is None or lon is None:
-        print(f"[FATAL] Tidak bisa memulai pemantauan karena gagal geocoding.")
-        return
+    Jika poll gagal (atau breaker flow terbuka) setelah pernah ada data,
+    ringkasan terakhir dikirim ulang dengan tanda basi alih-alih pesan error.
+    """
+    loop = asyncio.get_running_loop()
+    lat, lon = await locate(address)
+    log.info("[SERVER] Memantau '%s' (%s, %s)", address, lat, lon)
+    last = None
 
     while True:
-        traffic = get_traffic_data(lat, lon)
+        # Breaker terbuka: tidak perlu thread untuk request yang pasti ditolak
+        reason = tomtom.unavailable("flow")
+        if reason:
+            traffic = {"error": True, "message": reason}
+        else:
+            traffic = await loop.run_in_executor(None, get_traffic_data, lat, lon)
 
         if "error" not in traffic:
             s = traffic["summary"]
-            msg = (
-                f"[LALU LINTAS] {s['timestamp']} | "
-                f"Lokasi: {s['road_name']} | "
-                f"Kecepatan: {s['current_speed']} km/jam | "
-                f"Kemacetan: {s['congestion_percent']}% | "
-                f"Confidence: {s['confidence']}"
-            )
-            print(f"[SERVER] Broadcast: {msg}")
-            broadcast_message(msg)
+            if traffic.get("road_unknown") and last is not None:
+                s = s._replace(road_name=last.road_name)
+            last = s
+        elif last is not None:
+            log.info("[SERVER] Data basi dikirim untuk %s: %s", address, traffic["message"])
+            s = last._replace(stale=True)
         else:
             error_msg = f"[LALU LINTAS] Gagal ambil data: {traffic['message']}"
-            print(f"[SERVER] {error_msg}")
+            log.warning("[SERVER] %s", error_msg)
             broadcast_message(error_msg)
+            await asyncio.sleep(UPDATE_INTERVAL)
+            continue
 
-        time.sleep(UPDATE_INTERVAL)
+        msg = format_update(s)
+        log.debug("[SERVER] Broadcast: %s", msg)
+        broadcast_message(msg)
+        await asyncio.sleep(UPDATE_INTERVAL)
 
-def handle_client():
-    """Thread untuk menerima pesan dari client (JOIN, dll)."""
-    while True:
+# Metrik jalur panas (lihat STATS atau METRICS_PORT)
+DATAGRAMS_IN = metrics.counter("datagrams_in", "Datagram diterima dari client")
+BYTES_IN = metrics.counter("bytes_in", "Byte diterima dari client")
+DATAGRAMS_OUT = metrics.counter("datagrams_out", "Datagram terkirim ke client")
+BYTES_OUT = metrics.counter("bytes_out", "Byte terkirim ke client")
+SEND_ERRORS = metrics.counter("send_errors", "Pengiriman ke client yang gagal")
+RECV_ERRORS = metrics.counter("recv_errors", "Datagram yang gagal diproses")
+BROADCAST_SECONDS = metrics.histogram("broadcast_seconds", "Lama satu broadcast ke semua client")
+metrics.gauge("clients", lambda: len(clients), "Client aktif")
+for _name, _cache in (("geocode", geocode_cache), ("reverse_geocode", road_cache)):
+    metrics.gauge("cache_hit_rate", lambda c=_cache: c.stats()["hit_rate"], "Rasio hit cache", cache=_name)
+
+class TrafficServerProtocol(asyncio.DatagramProtocol):
+    """Terima pesan dari client (JOIN, dll) di event loop."""
+
+    def datagram_received(self, data, addr):
+        DATAGRAMS_IN.inc()
+        BYTES_IN.inc(len(data))
         try:
-            data, addr = sock.recvfrom(1024)
             message = data.decode().strip().upper()
-            with clients_lock:
-                if message == "JOIN":
-                    if addr not in clients:
-                        clients.add(addr)
-                        print(f"[SERVER] Client baru: {addr}")
-                        sock.sendto(b"[SERVER] Anda berhasil JOIN! Menunggu update lalu lintas...", addr)
-                # Bisa tambahkan perintah lain di sini (misal: QUIT, STATUS, dll)
+            # "JOIN:BIN" dari client baru tetap diterima; server ini hanya mengirim teks
+            if message.split(":", 1)[0] == "JOIN":
+                status = clients.touch(addr)
+                if status is None:
+                    transport.sendto(b"[SERVER] GAGAL: Server penuh, coba lagi nanti.", addr)
+                elif status:
+                    log.debug("[SERVER] Client baru: %s", addr)
+                    transport.sendto(b"[SERVER] Anda berhasil JOIN! Menunggu update lalu lintas...", addr)
+            elif addr in clients:
+                # Client terdaftar: pesan apa pun dihitung sebagai tanda hidup
+                clients.touch(addr)
+                if message == "PING":
+                    transport.sendto(b"PONG", addr)
+                elif message == "QUIT":
+                    clients.remove(addr)
+                    log.debug("[SERVER] Client keluar: %s", addr)
+                elif message == "STATS":
+                    stats = {"clients": len(clients), "metrics": metrics.REGISTRY.snapshot()}
+                    transport.sendto(f"[SERVER] STATS: {json.dumps(stats)}".encode(), addr)
         except Exception as e:
-            print(f"[RECV ERROR] {e}")
+            RECV_ERRORS.inc()
+            log.warning("[RECV ERROR] %s", e)
 
-if __name__ == "__main__":
+    def error_received(self, exc):
+        RECV_ERRORS.inc()
+        log.warning("[RECV ERROR] %s", exc)
+
+async def main():
+    global transport
+    loop = asyncio.get_running_loop()
     # Buat socket UDP
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind((SERVER_HOST, SERVER_PORT))
-    print(f"[SERVER] Berjalan di {SERVER_HOST}:{SERVER_PORT}")
-    print("[SERVER] Menunggu client...")
+    transport, _ = await loop.create_datagram_endpoint(
+        TrafficServerProtocol, local_addr=(SERVER_HOST, SERVER_PORT)
+    )
+    log.info("[SERVER] Berjalan di %s:%d", SERVER_HOST, SERVER_PORT)
+    log.info("[SERVER] Menunggu client...")
+    if not TOMTOM_API_KEY:
+        log.warning("[SERVER] TOMTOM_API_KEY kosong (.env/environment); request ke %s bisa ditolak.", tomtom.BASE_URL)
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = await metrics.serve_http("127.0.0.1", METRICS_PORT)
+        log.info("[SERVER] Metrik tersedia di http://127.0.0.1:%d/metrics", METRICS_PORT)
+
+    # Geocode & poll berjalan di latar; socket sudah melayani client sejak di atas
+    updaters = [loop.create_task(traffic_updater(address)) for address in WATCH_LOCATIONS]
+    sweeper = loop.create_task(expire_clients())
+    purger = loop.create_task(purge_cache())
 
-    # Jalankan thread
-    threading.Thread(target=handle_client, daemon=True).start()
-    threading.Thread(target=traffic_updater, daemon=True).start()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: andalkan KeyboardInterrupt
+    try:
+        await stop.wait()
+    finally:
+        log.info("\n[SERVER] Dimatikan.")
+        if metrics_server is not None:
+            metrics_server.close()
+        for updater in updaters:
+            updater.cancel()
+        sweeper.cancel()
+        purger.cancel()
+        transport.close()
+        geocode_cache.close()
 
+if __name__ == "__main__":
+    logutil.setup()
     try:
-        while True:
-            time.sleep(1)
+        asyncio.run(main())
     except KeyboardInterrupt:
-        print("\n[SERVER] Dimatikan.")
-        sock.close()
\ No newline at end of file
+        pass
@@ -1,198 +1,1040 @@
 # server.py
 import os
-import time
-import socket
-import threading
+import asyncio
+import signal
 import json
-from datetime import datetime
-from dotenv import load_dotenv
-import requests
+import ipaddress
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+import config
+import tomtom
+import metrics
+import logutil
+from watchlist import WatchList, DailyQuota
+from eventbus import EventBus
+from workers import Coordinator, reuseport_socket
+from registry import ClientRegistry
+from ratelimit import ClientRateLimiter
+from singleflight import SingleFlight, AsyncSingleFlight
+from segments import SegmentIndex, polyline_length
+from corridor import CorridorIndex
+from flowdata import UNKNOWN_ROAD, TrafficSummary, parse_flow, parse_street_name
+from history import HistoryStore, ROLLUPS
+from fanout import SubscriptionIndex, Sender
+from cache import TTLCache, SqliteStore, normalize_key, snap_coordinate
+import protocol
+
+log = logutil.get_logger("server")
+
+# Konfigurasi (default < trafficflow.json < env/.env < flag CLI; lihat config.py).
+# Worker "spawn" mengimpor modul ini sebagai __mp_main__ dengan sys.argv yang sama.
+cfg = config.load(("host", "port", "interval", "watch", "upstream", "workers", "corridors"),
+                  argv=None if __name__ in ("__main__", "__mp_main__") else [],
+                  description="Server UDP lalu lintas multi-lokasi")
+TOMTOM_API_KEY = os.getenv("TOMTOM_API_KEY")  # Dicek saat start, bukan saat import
+SERVER_HOST = cfg.host
+SERVER_PORT = cfg.port
+UPDATE_INTERVAL = cfg.interval   # Interval awal; selanjutnya menyesuaikan volatilitas data & jumlah subscriber
+WATCH_LOCATIONS = cfg.watch      # Dipantau sejak start tanpa menunggu subscriber, dan tidak pernah dilepas
+CORRIDORS = cfg.corridors        # Nama koridor → alamat titik anggota; dilanggan dengan CORRIDOR:<nama>
+CORRIDOR_MIN_INTERVAL = 1.0      # Detik; jeda minimum antar publikasi agregat satu koridor
+MIN_UPDATE_INTERVAL = 2.0      # Lokasi yang berubah cepat / banyak subscriber
+MAX_UPDATE_INTERVAL = 60.0     # Lokasi yang stabil (mis. jalan lengang dini hari)
+DAILY_QUOTA = int(os.getenv("DAILY_QUOTA", "0"))  # Request TomTom per hari, semua endpoint (paket gratis: 2500); 0 = tanpa batas
+POLL_WORKERS = 16       # Ukuran worker pool untuk request TomTom
+POLL_JITTER = 0.1       # Variasi acak interval (±10%) agar request tidak serempak
+API_RATE_LIMIT = 10.0   # Batas global request API per detik
+MAX_WATCHED = 500       # Jumlah maksimum lokasi yang dipantau bersamaan
+GEOCODE_CACHE_SIZE = 1024
+GEOCODE_CACHE_TTL = 7 * 24 * 3600   # Koordinat alamat praktis tidak berubah
+GEOCODE_CACHE_FILE = os.getenv("GEOCODE_CACHE_FILE", "geocode_cache.db")  # Kosongkan untuk cache memori saja
+GEOCODE_CACHE_MAX_ROWS = 100000  # Baris maksimum per tabel di GEOCODE_CACHE_FILE
+CACHE_PURGE_INTERVAL = 3600.0   # Detik; entri kedaluwarsa dibuang saat start lalu secara berkala
+HISTORY_DIR = os.getenv("HISTORY_DIR", "history")  # Riwayat per lokasi (titik mentah + rollup); kosongkan untuk memori saja
+HISTORY_DEFAULT_COUNT = 60     # Jumlah baris default untuk HISTORY
+HISTORY_MAX_COUNT = 1000
+HISTORY_RESOLUTIONS = ("raw", *ROLLUPS)
+REVERSE_GEOCODE_GRID = 0.0005           # Derajat (~55 m); titik dalam satu sel grid berbagi nama jalan
+REVERSE_GEOCODE_TTL = 24 * 3600         # Nama jalan untuk titik tetap praktis tidak berubah
+KEYFRAME_EVERY = 10     # Mode delta: kirim update lengkap setiap N update
+REPLAY_BUFFER = 32      # Update terakhir per lokasi yang disimpan untuk REPLAY
+SERVER_WORKERS = cfg.workers   # >1: beberapa proses dengan SO_REUSEPORT
+CLIENT_TIMEOUT = 90.0          # Detik tanpa pesan (PING/perintah lain) sebelum client dianggap mati
+CLIENT_SWEEP_INTERVAL = 5.0    # Seberapa sering client kedaluwarsa dibersihkan
+MAX_CLIENTS = 10000            # Batas ukuran registry client
+MAX_COMMAND_SIZE = 512         # Byte; datagram perintah yang lebih besar dibuang sebelum decode
+STATS_CACHE_TTL = 1.0          # Detik; balasan STATS dipakai ulang selama ini
+MAX_PENDING_LOOKUPS = 64       # Geocode berbeda yang boleh berjalan bersamaan untuk SEARCH/SUBSCRIBE/CORRIDOR
+# Rate limit per client: jenis perintah → (token per detik, burst)
+COMMAND_LIMITS = {
+    "control": (20.0, 40),     # PING, QUIT, JOIN, RESYNC, REPLAY, NAMES
+    "lookup": (1.0, 20),       # SEARCH, SUBSCRIBE, CORRIDOR, UNSUBSCRIBE (bisa memicu geocode)
+    "query": (0.5, 5),         # HISTORY, STATS, CORRIDORS (balasan besar)
+    "admin": (0.1, 1),         # RESET
+}
+PER_IP_LIMITS = ("lookup", "admin")   # Dihitung per IP, bukan per (ip, port), agar tak bisa diakali ganti port
+# Anggaran bersama semua client: jenis perintah → (token per detik, burst)
+GLOBAL_LIMITS = {
+    "lookup": (100.0, 2000),
+}
+SEGMENT_SHARING = os.getenv("SEGMENT_SHARING", "1") != "0"  # Titik di segmen jalan yang sama berbagi satu request flow
+SEGMENT_TOLERANCE = 20.0       # Meter; jarak maksimum titik ke geometri segmen agar dianggap di segmen itu
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # >0: endpoint HTTP /metrics (Prometheus); worker ke-i memakai port + i
+
+tomtom.configure(base_url=cfg.upstream)
+
+# Simpan client aktif. Semua state di bawah hanya disentuh dari thread event loop.
+clients = ClientRegistry(timeout=CLIENT_TIMEOUT, max_clients=MAX_CLIENTS)
+
+# Token bucket perintah per client/IP dan anggaran bersama (dibersihkan berkala di expire_clients)
+limiter = ClientRateLimiter(COMMAND_LIMITS, per_ip=PER_IP_LIMITS, shared=GLOBAL_LIMITS)
+
+# Client yang meminta protokol biner / mode delta saat JOIN
+binary_clients = set()
+delta_clients = set()
+
+# Indeks lokasi → client yang berlangganan
+subscriptions = SubscriptionIndex()
+
+# Tabel nama lokasi/jalan untuk protokol biner; saat penuh, nama di luar stream aktif dipakai ulang
+names = protocol.NameTable(live=lambda: [name for stream in streams.values() for _, name in stream.names])
+
+# Status stream per lokasi (nomor urut, state terakhir, & ring buffer update untuk REPLAY)
+streams = {}
+
+# Pesan teks update terakhir per lokasi, untuk snapshot client teks
+last_messages = {}
 
-# Load API key
-load_dotenv()
-TOMTOM_API_KEY = os.getenv("TOMTOM_API_KEY")
-if not TOMTOM_API_KEY:
-    raise ValueError("TOMTOM_API_KEY tidak ditemukan di .env")
+# Key lokasi dari WATCH_LOCATIONS; tetap dipantau walau tanpa subscriber
+pinned = set()
 
-# Konfigurasi
-SERVER_HOST = "0.0.0.0"
-SERVER_PORT = 5005
-UPDATE_INTERVAL = 3.5
+# Ringkasan sukses terakhir per lokasi; dikirim ulang (ditandai basi) selama upstream gangguan
+last_summaries = {}
 
-current_location = {}
-location_lock = threading.Lock() 
+# Panjang segmen jalan (meter) tiap lokasi dari hasil poll terakhir; bobot agregat koridor
+segment_lengths = {}
 
-# Simpan client aktif
-clients = set()
-clients_lock = threading.Lock()
+# Koridor jalan: definisi dari konfigurasi, aktif selama punya subscriber
+corridors = CorridorIndex()
+for _name, _addresses in CORRIDORS.items():
+    corridors.define(normalize_key(f"Koridor {_name}"), f"Koridor {_name}", _addresses)
+
+# Riwayat ringkasan lalu lintas per lokasi
+history = HistoryStore(HISTORY_DIR or None)
+
+# Executor untuk lookup blocking dari jalur perintah (geocode SEARCH/SUBSCRIBE)
+lookup_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lookup")
+background_tasks = set()
+
+# Balasan STATS terakhir: [waktu kedaluwarsa (monotonic), ringkasan, pesan lengkap untuk loopback]
+stats_cache = [0.0, None, None]
+
+# Koordinator antar worker (hanya di mode multi-worker)
+coordinator = None
+
+# Request identik yang bersamaan berbagi satu request upstream
+geocode_flight = AsyncSingleFlight("geocode")
+road_flight = SingleFlight("reverse_geocode")
+flow_flight = SingleFlight("flow")
+
+# Segmen jalan dari response flowSegmentData yang masih segar (umur < satu interval update)
+# Umur maksimum per titik = interval poll titik itu (lihat get_traffic_data); batas atas untuk pemangkasan
+segment_index = SegmentIndex(max_age=MAX_UPDATE_INTERVAL, tolerance=SEGMENT_TOLERANCE)
+SEGMENT_HITS = metrics.counter("segment_hits", "Poll yang memakai segmen hasil request titik lain")
+SEGMENT_MISSES = metrics.counter("segment_misses", "Poll yang butuh request flowSegmentData baru")
+
+geocode_cache = TTLCache(
+    maxsize=GEOCODE_CACHE_SIZE,
+    ttl=GEOCODE_CACHE_TTL,
+    store=SqliteStore(GEOCODE_CACHE_FILE, table="geocode_id", max_rows=GEOCODE_CACHE_MAX_ROWS) if GEOCODE_CACHE_FILE else None,
+    name="geocode_cache",
+)
 
 def geocode_address(address):
-    """Mengubah alamat/nama jalan menjadi koordinat (lat, lon)."""
-    geocode_url = f"https://api.tomtom.com/search/2/geocode/{address}.json"
+    """Mengubah alamat/nama jalan menjadi koordinat (lat, lon), memakai cache jika ada."""
+    cached = geocode_cache.get(normalize_key(address))
+    if cached is not None:
+        return tuple(cached)
+
+    geocode_url = tomtom.url(f"/search/2/geocode/{address}.json")
     try:
-        response = requests.get(geocode_url, params={"key": TOMTOM_API_KEY, "countrySet": "ID"}, timeout=10)
+        response = tomtom.get(geocode_url, params={"key": TOMTOM_API_KEY, "countrySet": "ID"})
         response.raise_for_status()
         data = response.json()
         if data and data.get("results"):
             pos = data["results"][0]["position"]
+            geocode_cache.set(normalize_key(address), (pos["lat"], pos["lon"]))
             return pos["lat"], pos["lon"]
         return None, None
     except Exception as e:
-        print(f"[GEOCODE ERROR] Gagal mengubah alamat '{address}': {e}")
+        log.warning("[GEOCODE ERROR] Gagal mengubah alamat '%s': %s", address, e)
         return None, None
 
-def get_traffic_data(lat, lon):
-    """Ambil data lalu lintas & info jalan dari TomTom API secara lengkap."""
-    traffic_url = "https://api.tomtom.com/traffic/services/4/flowSegmentData/absolute/10/json"
-    road_url = f"https://api.tomtom.com/search/2/reverseGeocode/{lat},{lon}.json"
+road_cache = TTLCache(
+    maxsize=MAX_WATCHED * 2,
+    ttl=REVERSE_GEOCODE_TTL,
+    store=SqliteStore(GEOCODE_CACHE_FILE, table="reverse_geocode", max_rows=GEOCODE_CACHE_MAX_ROWS) if GEOCODE_CACHE_FILE else None,
+    name="road_cache",
+)
+
+def fetch_road_name(lat, lon, key):
+    """Ambil nama jalan dari reverseGeocode dan simpan di cache (key = sel grid)."""
+    road_url = tomtom.url(f"/search/2/reverseGeocode/{lat},{lon}.json")
+    road_response = tomtom.get(road_url, params={"key": TOMTOM_API_KEY})
+    road_response.raise_for_status()
+    road_name = parse_street_name(road_response.content)
+    road_cache.set(key, road_name)
+    return road_name
+
+def fetch_flow(lat, lon):
+    """Ambil flowSegmentData untuk satu titik sebagai FlowSample (tanpa decode JSON penuh)."""
+    traffic_url = tomtom.url("/traffic/services/4/flowSegmentData/absolute/10/json")
+    traffic_response = tomtom.get(traffic_url, params={"point": f"{lat},{lon}", "key": TOMTOM_API_KEY})
+    traffic_response.raise_for_status()
+    return parse_flow(traffic_response.content, geometry=SEGMENT_SHARING, known=segment_index.coordinates)
+
+def traffic_change(old, new):
+    """Besar perubahan relatif antar dua hasil poll (0..1), atau None jika salah satunya error."""
+    if "error" in old or "error" in new:
+        return None
+    a, b = old["summary"], new["summary"]
+    speed = abs(b.current_speed - a.current_speed) / max(b.free_flow_speed, 1)
+    congestion = abs(b.congestion_percent - a.congestion_percent) / 100
+    return max(speed, congestion)
 
+def get_traffic_data(lat, lon, interval=UPDATE_INTERVAL):
+    """Ambil data lalu lintas & info jalan dari TomTom API secara lengkap.
+
+    Data segmen milik titik lain dipakai ulang selama umurnya di bawah
+    interval poll titik ini (lokasi stabil boleh memakai data lebih lama).
+    """
     try:
-        # Request data lalu lintas & nama jalan
-        traffic_response = requests.get(traffic_url, params={"point": f"{lat},{lon}", "key": TOMTOM_API_KEY}, timeout=10)
-        traffic_response.raise_for_status()
-        traffic_data = traffic_response.json()
-
-        road_response = requests.get(road_url, params={"key": TOMTOM_API_KEY}, timeout=10)
-        road_response.raise_for_status()
-        road_data = road_response.json()
-
-        # Ekstrak informasi utama
-        flow = traffic_data.get("flowSegmentData", {})
-        road_info = road_data.get("addresses", [{}])[0].get("address", {})
-
-        road_name = road_info.get("streetName", "Unknown Road")
-        current_speed = flow.get("currentSpeed", 0)
-        free_speed = flow.get("freeFlowSpeed", 1)
-        confidence = flow.get("confidence", 0)
-        congestion = max(0, min(1, 1 - (current_speed / free_speed))) if free_speed > 0 else 0
-
-        result = {
-            "summary": {
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "latitude": lat,
-                "longitude": lon,
-                "road_name": road_name,
-                "current_speed": current_speed,
-                "free_flow_speed": free_speed,
-                "congestion_percent": round(congestion * 100, 1),
-                "confidence": confidence
-            }
-        }
+        # Nama jalan dari cache; jika belum ada, diambil paralel dengan data lalu lintas.
+        # Lokasi lain di sel grid yang sama yang sedang menunggu nama jalan ikut memakai request ini.
+        road_key = snap_coordinate(lat, lon, REVERSE_GEOCODE_GRID)
+        road_name = road_cache.get(road_key)
+        road_future = None
+        if road_name is None and not tomtom.unavailable("reverse_geocode"):
+            road_future = tomtom.submit(road_flight.do, road_key, fetch_road_name, lat, lon, road_key)
+
+        flow = segment_index.find(lat, lon, max_age=interval) if SEGMENT_SHARING else None
+        if flow is not None:
+            SEGMENT_HITS.inc()
+        else:
+            SEGMENT_MISSES.inc()
+            flow = flow_flight.do(f"{lat},{lon}", fetch_flow, lat, lon)
+            if SEGMENT_SHARING:
+                segment_index.add(flow)
+
+        if road_future is not None:
+            try:
+                road_name = road_future.result()
+            except Exception as e:
+                # Data lalu lintas tetap diterbitkan; nama jalan dicoba lagi di poll berikutnya
+                log.debug("[API ERROR] Nama jalan: %s", e)
+
+        # Hanya ringkasan (tuple ringan) yang disimpan; response mentah tidak ikut
+        result = {"summary": TrafficSummary.from_flow(lat, lon, road_name or UNKNOWN_ROAD, flow),
+                  "length": polyline_length(flow.coordinates)}
+        if road_name is None:
+            result["road_unknown"] = True   # Penerima memakai nama jalan terakhir lokasi ini jika ada
         return result
 
+    except (tomtom.CircuitOpenError, tomtom.QuotaExceededError) as e:
+        log.debug("[API ERROR] %s", e)
+        return {"error": True, "message": str(e)}
     except Exception as e:
-        print(f"[API ERROR] {e}")
+        log.warning("[API ERROR] %s", e)
         return {"error": True, "message": str(e)}
 
 def broadcast_message(message):
-    """Kirim pesan ke semua client."""
-    with clients_lock:
-        for client in list(clients):
+    """Kirim pesan ke semua client (pesan server, bukan update lalu lintas)."""
+    sender.send(message.encode(), tuple(clients))
+
+def publish(key, message):
+    """Kirim pesan hanya ke client yang berlangganan lokasi key (di-encode sekali)."""
+    sender.send(message.encode(), subscriptions.subscribers(key))
+
+def publish_update(location, summary, message):
+    """Kirim update lalu lintas ke subscriber: record biner atau teks sesuai mode client."""
+    subs = subscriptions.subscribers(location.key)
+    if not subs:
+        return
+    bin_subs = subs & binary_clients
+    text_subs = subs - bin_subs
+    if text_subs:
+        sender.send(message.encode(), text_subs)
+    # Stream selalu diperbarui (juga tanpa subscriber biner) agar snapshot & REPLAY siap kapan saja
+    loc_id = names.intern(location.name)
+    road_id = names.intern(summary.road_name, keep=(location.name,))
+    stream = streams.get(location.key)
+    if stream is None or stream.loc_id != loc_id:
+        stream = streams[location.key] = protocol.DeltaStream(loc_id, KEYFRAME_EVERY, REPLAY_BUFFER)
+    refs = ((loc_id, location.name), (road_id, summary.road_name))
+    flags = protocol.FLAG_STALE if summary.stale else 0
+    full, delta = stream.next(protocol.summary_fields(road_id, summary, flags), summary.epoch, refs)
+    if bin_subs:
+        if delta is None:
+            sender.send_record(full, bin_subs, refs)
+        else:
+            delta_subs = bin_subs & delta_clients
+            sender.send_record(full, bin_subs - delta_subs, refs)
+            sender.send_record(delta, delta_subs, refs, protocol.MSG_DELTA)
+
+def set_client_mode(addr, binary, delta):
+    """Catat mode protokol client (biner / teks, dengan atau tanpa delta)."""
+    if binary:
+        binary_clients.add(addr)
+    else:
+        binary_clients.discard(addr)
+    if binary and delta:
+        delta_clients.add(addr)
+    else:
+        delta_clients.discard(addr)
+    sender.forget(addr)
+
+def reply(addr, message):
+    """Kirim balasan ke satu client (langsung, tanpa menunggu batch)."""
+    sender.send_now(message.encode(), addr)
+
+def drop_client(addr):
+    """Hapus client (QUIT, kedaluwarsa, atau gagal dikirimi) beserta semua langganannya."""
+    clients.remove(addr)
+    binary_clients.discard(addr)
+    delta_clients.discard(addr)
+    sender.forget(addr)
+    release_locations(subscriptions.unsubscribe_all(addr))
+
+async def purge_caches():
+    """Task periodik: buang entri cache kedaluwarsa (juga baris SQLite) saat start lalu setiap CACHE_PURGE_INTERVAL."""
+    loop = asyncio.get_running_loop()
+    while True:
+        for cache in (geocode_cache, road_cache):
             try:
-                sock.sendto(message.encode(), client)
+                removed = await loop.run_in_executor(lookup_executor, cache.purge)
             except Exception as e:
-                print(f"[SEND ERROR] Gagal kirim ke {client}: {e}")
-                clients.discard(client)
+                log.warning("[CACHE ERROR] Gagal membersihkan cache: %s", e)
+                continue
+            if removed:
+                log.info("[SERVER] %d entri cache kedaluwarsa dihapus dari disk.", removed)
+        await asyncio.sleep(CACHE_PURGE_INTERVAL)
 
-def traffic_updater():
-    """Thread yang secara periodik mengambil dan menyebarkan data lalu lintas."""
+async def expire_clients():
+    """Task periodik: buang client yang tidak mengirim apa pun selama CLIENT_TIMEOUT, dan bucket rate limit yang sudah penuh."""
     while True:
-        lat, lon, name = None, None, None
-        
-        with location_lock:
-            if "lat" in current_location:
-                lat = current_location["lat"]
-                lon = current_location["lon"]
-                name = current_location["name"]
-        
-        # Jika lat, lon, dan name ada (tidak None), baru jalankan API
-        if lat is not None and lon is not None:
-            # Pindahkan print ke sini agar tidak spam saat idle
-            print(f"[SERVER] Mengambil data untuk: {name} ({lat}, {lon})")
-            
-            traffic = get_traffic_data(lat, lon)
-
-            if "error" not in traffic:
-                s = traffic["summary"]
-                msg = (
-                    f"[LALU LINTAS] {s['timestamp']} | "
-                    f"Lokasi: {s['road_name']} | "
-                    f"Kecepatan: {s['current_speed']} km/jam | "
-                    f"Kemacetan: {s['congestion_percent']}% | "
-                    f"Confidence: {s['confidence']}"
-                )
-                print(f"[SERVER] {msg}")
-                broadcast_message(msg)
-            else:
-                error_msg = f"[LALU LINTAS] Gagal ambil data: {traffic['message']}"
-                print(f"[SERVER] {error_msg}")
-                broadcast_message(error_msg)
-        
-        time.sleep(UPDATE_INTERVAL)
-
-def handle_client():
-    """Thread untuk menerima pesan dari client (JOIN, SEARCH, RESET)."""
-    while True:
-        try:
-            data, addr = sock.recvfrom(1024)
-            message = data.decode().strip()
-            
-            with clients_lock:
-                if addr not in clients:
-                    clients.add(addr)
-                    print(f"[SERVER] Client baru: {addr}")
-                    sock.sendto(b"[SERVER] Anda berhasil terhubung! Server dalam mode standby. Silakan cari lokasi.", addr)
-
-            if message.upper() == "JOIN":
-                pass
-            
-            elif message.upper().startswith("SEARCH:"):
-                address = message.split(":", 1)[1].strip()
-                print(f"[SERVER] Menerima permintaan pencarian untuk: '{address}' dari {addr}")
-                
-                lat, lon = geocode_address(address)
-                
-                if lat and lon:
-                    with location_lock:
-                        current_location["name"] = address
-                        current_location["lat"] = lat
-                        current_location["lon"] = lon
-                    
-                    success_msg = f"[SERVER] OK: Lokasi pemantauan diubah ke '{address}'. Update akan dimulai."
-                    print(success_msg)
-                    broadcast_message(success_msg) 
-                else:
-                    error_msg = f"[SERVER] GAGAL: Lokasi '{address}' tidak ditemukan."
-                    print(error_msg)
-                    sock.sendto(error_msg.encode(), addr) 
-
-            elif message.upper() == "RESET":
-                print(f"[SERVER] Menerima permintaan RESET dari {addr}")
-                
-                with location_lock:
-                    if current_location:
-                        current_location.clear()
-                        reset_msg = "[SERVER] OK: Pemantauan dihentikan. Server kembali ke mode standby."
-                        print(reset_msg)
-                        broadcast_message(reset_msg)
-                    else:
-                        sock.sendto(b"[SERVER] INFO: Server sudah dalam mode standby.", addr)
+        await asyncio.sleep(CLIENT_SWEEP_INTERVAL)
+        gone = clients.expired()
+        for addr in gone:
+            drop_client(addr)
+        limiter.prune()
+        if gone:
+            log.info("[SERVER] %d client kedaluwarsa dihapus (%d aktif).", len(gone), len(clients))
+
+async def watch(key, name, lat, lon):
+    """Mulai memantau lokasi: langsung, atau lewat worker pemilik di mode multi-worker. False jika daftar pantau penuh."""
+    if coordinator is not None:
+        return await coordinator.watch(key, name, lat, lon)
+    return watchlist.add(key, name, lat, lon)
+
+def unwatch(key):
+    if coordinator is not None:
+        return coordinator.unwatch(key)
+    return watchlist.remove(key)
+
+def is_watched(key):
+    if coordinator is not None:
+        return coordinator.is_watched(key)
+    return key in watchlist
+
+def on_watch_result(location, traffic):
+    """Hasil poll watch-list: simpan ke riwayat, lalu terbitkan ke bus atau teruskan ke worker yang berminat."""
+    if "error" not in traffic:
+        # Hanya proses yang mem-poll lokasi ini yang menulis riwayatnya
+        summary = traffic["summary"]
+        history.append(location.key, summary.epoch, protocol.summary_fields(0, summary)[1:5])
+    if coordinator is not None:
+        coordinator.distribute(location, traffic)
+    else:
+        bus.publish("traffic", location, traffic)
+
+def release_locations(keys):
+    """Berhenti memantau lokasi yang sudah tidak punya subscriber."""
+    for key in keys:
+        if key in pinned or corridors.holds(key):
+            continue
+        corridor = corridors.deactivate(key)
+        if corridor is not None:
+            streams.pop(key, None)
+            last_messages.pop(key, None)
+            log.info("[SERVER] %s dilepas (tanpa subscriber).", corridor.name)
+            release_locations([m for m in corridor.members if not subscriptions.subscribers(m)])
+            continue
+        streams.pop(key, None)
+        last_messages.pop(key, None)
+        last_summaries.pop(key, None)
+        segment_lengths.pop(key, None)
+        history.forget(key)
+        if unwatch(key):
+            log.info("[SERVER] Lokasi '%s' dilepas dari daftar pantau (tanpa subscriber).", key)
+
+def reset_monitoring():
+    """Hapus semua langganan di proses ini dan beri tahu client-nya; WATCH_LOCATIONS dipantau lagi."""
+    subscriptions.clear()
+    streams.clear()
+    last_messages.clear()
+    last_summaries.clear()
+    segment_lengths.clear()
+    corridors.clear()
+    reset_msg = "[SERVER] OK: Pemantauan dihentikan. Server kembali ke mode standby."
+    log.info(reset_msg)
+    broadcast_message(reset_msg)
+    if WATCH_LOCATIONS:
+        # Lokasi tetap tidak ikut di-reset; koordinat diambil dari cache geocode
+        spawn(watch_startup_locations())
+
+def location_key(address):
+    """Kunci daftar pantau untuk satu alamat."""
+    return normalize_key(address)
+
+async def watch_location(address, addr):
+    """Pastikan alamat ada di daftar pantau. Kembalikan key, atau None jika gagal (client sudah diberi tahu)."""
+    key = location_key(address)
+    if is_watched(key):
+        return key
+
+    # Geocode (HTTP blocking) dijalankan di executor agar event loop tetap melayani client lain.
+    # SEARCH bersamaan untuk alamat yang sama menunggu satu request geocode yang sama.
+    loop = asyncio.get_running_loop()
+    lat, lon = await geocode_flight.run(
+        key, lambda: loop.run_in_executor(lookup_executor, geocode_address, address)
+    )
+    if not (lat and lon):
+        log.info("[SERVER] GAGAL: Lokasi '%s' tidak ditemukan.", address)
+        reply(addr, f"[SERVER] GAGAL: Lokasi '{address}' tidak ditemukan.")
+        return None
+
+    if is_watched(key):
+        # Sudah didaftarkan pemanggil lain yang menunggu geocode yang sama
+        return key
+    if not await watch(key, address, lat, lon):
+        full_msg = f"[SERVER] GAGAL: Daftar pantau penuh (maksimal {MAX_WATCHED} lokasi)."
+        log.warning(full_msg)
+        reply(addr, full_msg)
+        return None
+    return key
+
+async def watch_startup_locations():
+    """Pantau WATCH_LOCATIONS di latar setelah socket siap; alamat yang sudah di-cache tidak butuh request."""
+    loop = asyncio.get_running_loop()
+    for address in WATCH_LOCATIONS:
+        key = location_key(address)
+        pinned.add(key)
+        if is_watched(key):
+            continue
+        lat, lon = await geocode_flight.run(
+            key, lambda: loop.run_in_executor(lookup_executor, geocode_address, address)
+        )
+        if not (lat and lon):
+            log.warning("[SERVER] Lokasi awal '%s' tidak ditemukan, dilewati.", address)
+        elif not is_watched(key) and not await watch(key, address, lat, lon):
+            log.warning("[SERVER] Daftar pantau penuh, lokasi awal '%s' dilewati.", address)
+
+async def search_location(address, addr):
+    """SEARCH = ganti fokus client ke satu lokasi (langganan lama dilepas)."""
+    key = await watch_location(address, addr)
+    if key:
+        orphaned = subscriptions.unsubscribe_all(addr)
+        subscriptions.subscribe(addr, key)
+        release_locations(k for k in orphaned if k != key)
+        success_msg = (
+            f"[SERVER] OK: Lokasi pemantauan diubah ke '{address}' "
+            f"({len(subscriptions.by_location)} lokasi dipantau). Update akan dimulai."
+        )
+        log.debug("[SERVER] Client %s memantau '%s'", addr, address)
+        reply(addr, success_msg)
+        send_snapshot(addr, [key])
+
+async def subscribe_location(address, addr):
+    key = await watch_location(address, addr)
+    if key:
+        subscriptions.subscribe(addr, key)
+        reply(addr, f"[SERVER] OK: Berlangganan '{address}'.")
+        send_snapshot(addr, [key])
+
+def corridor_key(name):
+    """Key topik koridor; nama boleh dengan atau tanpa awalan "Koridor"."""
+    key = location_key(name)
+    return key if key in corridors.definitions else location_key(f"Koridor {name}")
+
+async def subscribe_corridor(key, addr):
+    """Langganan agregat koridor; titik anggotanya dipantau saat koridor pertama kali dilanggan."""
+    name, addresses = corridors.definitions[key]
+    corridor = corridors.active.get(key)
+    if corridor is None:
+        members = [k for k in await asyncio.gather(*(watch_location(a, addr) for a in addresses)) if k]
+        # Pemanggil lain bisa sudah mengaktifkan koridor ini selama geocode
+        corridor = corridors.active.get(key)
+        if corridor is None:
+            if not members:
+                reply(addr, f"[SERVER] GAGAL: Tidak ada titik {name} yang bisa dipantau.")
+                return
+            corridor = corridors.activate(key, members)
+            for member in members:
+                if member in last_summaries:
+                    corridor.update(member, last_summaries[member], segment_lengths.get(member))
+            if corridor.latest:
+                publish_corridor(corridor)
+            log.info("[SERVER] %s aktif (%d titik).", name, len(members))
+    subscriptions.subscribe(addr, key)
+    reply(addr, f"[SERVER] OK: Berlangganan '{name}' ({len(corridor.members)} titik).")
+    send_snapshot(addr, [key])
 
+def send_snapshot(addr, keys):
+    """Kirim state terakhir lokasi-lokasi keys ke satu client tanpa menunggu poll berikutnya.
+
+    Client biner menerima keyframe yang digabung Sender menjadi sesedikit
+    mungkin datagram; client teks menerima pesan terakhir, beberapa baris per
+    datagram (dipisah newline) selama muat di bawah MAX_DATAGRAM.
+    """
+    if addr in binary_clients:
+        for key in keys:
+            stream = streams.get(key)
+            if stream is not None and stream.last_full is not None:
+                sender.send_record(stream.last_full, (addr,), stream.names)
+        return
+    lines = [last_messages[key].encode() for key in keys if key in last_messages]
+    chunk = b""
+    for line in lines:
+        if chunk and len(chunk) + 1 + len(line) > protocol.MAX_DATAGRAM:
+            sender.send_now(chunk, addr)
+            chunk = b""
+        chunk = chunk + b"\n" + line if chunk else line
+    if chunk:
+        sender.send_now(chunk, addr)
+
+def send_replay(addr, loc_id, seq):
+    """Kirim ulang update lokasi loc_id sejak nomor urut seq (atau keyframe terakhir jika sudah terlalu lama)."""
+    name = names.lookup(loc_id)
+    stream = streams.get(location_key(name)) if name is not None else None
+    if stream is None:
+        return
+    for record in stream.replay(seq):
+        sender.send_record(record, (addr,), stream.names)
+
+def reply_history(addr, address, resolution, rows):
+    """Kirim deret riwayat sebagai JSON, dipecah menjadi beberapa datagram di bawah MAX_DATAGRAM."""
+    if resolution == "raw":
+        rows = [(e, s, f, c / 10, q / 10000) for e, s, f, c, q in rows]
+    else:
+        rows = [(e, n, a / 10, lo, hi, c / 10, q / 10000) for e, n, a, lo, hi, c, q in rows]
+    budget = protocol.MAX_DATAGRAM - 200   # Sisa untuk prefix & field header
+    chunks, chunk, size = [], [], 0
+    for row in rows:
+        row_size = len(json.dumps(row)) + 1
+        if chunk and size + row_size > budget:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(row)
+        size += row_size
+    chunks.append(chunk)
+    for part, chunk in enumerate(chunks, 1):
+        body = {"location": address, "resolution": resolution, "fields": history.fields(resolution),
+                "part": part, "parts": len(chunks), "rows": chunk}
+        reply(addr, f"[SERVER] HISTORY: {json.dumps(body)}")
+
+async def query_history(addr, address, resolution, count):
+    # Lokasi milik worker lain dibaca dari file: jangan di event loop
+    loop = asyncio.get_running_loop()
+    rows = await loop.run_in_executor(lookup_executor, history.query, location_key(address), resolution, count)
+    reply_history(addr, address, resolution, rows)
+
+def spawn(coro):
+    """Jalankan coroutine sebagai task latar; referensi disimpan agar tidak di-GC."""
+    task = asyncio.get_running_loop().create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def format_update(s):
+    """Pesan teks update lalu lintas; data basi diberi penanda di akhir (pola parser client tetap cocok)."""
+    msg = (
+        f"[LALU LINTAS] {s.timestamp} | "
+        f"Lokasi: {s.road_name} | "
+        f"Kecepatan: {s.current_speed} km/jam | "
+        f"Kemacetan: {s.congestion_percent}% | "
+        f"Confidence: {s.confidence}"
+    )
+    if s.stale:
+        msg += " | BASI (upstream gangguan)"
+    return msg
+
+def format_corridor(corridor, s):
+    """Pesan teks agregat koridor: pola [LALU LINTAS] yang sama, plus cakupan dan titik terpadat."""
+    return (format_update(s._replace(road_name=corridor.name))
+            + f" | Koridor: {len(corridor.latest)}/{len(corridor.members)} titik, terpadat {s.road_name}")
+
+def publish_corridor(corridor):
+    corridor.published = time.monotonic()
+    s = corridor.summary()
+    msg = format_corridor(corridor, s)
+    last_messages[corridor.key] = msg
+    publish_update(corridor, s, msg)
+
+def flush_corridor(corridor):
+    # Koridor bisa sudah dilepas/di-reset sebelum jadwal ini tiba
+    if corridors.active.get(corridor.key) is corridor:
+        publish_corridor(corridor)
+
+def update_corridors(key, s):
+    """Perbarui agregat koridor yang memuat lokasi key; publikasi maks. sekali per CORRIDOR_MIN_INTERVAL."""
+    for corridor in corridors.of_member(key):
+        pending = corridor.published > time.monotonic()
+        corridor.update(key, s, segment_lengths.get(key))
+        if pending:
+            continue   # Sudah dijadwalkan; agregat terbaru ikut terkirim saat itu
+        delay = corridor.published + CORRIDOR_MIN_INTERVAL - time.monotonic()
+        if delay <= 0:
+            publish_corridor(corridor)
+        else:
+            corridor.published += CORRIDOR_MIN_INTERVAL   # Tandai terjadwal
+            asyncio.get_running_loop().call_later(delay, flush_corridor, corridor)
+
+def traffic_updater(location, traffic):
+    """Handler event 'traffic': sebarkan hasil lalu lintas satu lokasi ke subscriber-nya.
+
+    Jika poll gagal tetapi lokasi pernah punya data, ringkasan terakhir dikirim
+    ulang dengan tanda basi (stale) alih-alih pesan error.
+    """
+    if "error" not in traffic:
+        # Dari worker lain ringkasan tiba sebagai list JSON
+        s = TrafficSummary.from_list(traffic["summary"])
+        last = last_summaries.get(location.key)
+        if traffic.get("road_unknown") and last is not None:
+            s = s._replace(road_name=last.road_name)
+        last_summaries[location.key] = s
+        if traffic.get("length"):
+            segment_lengths[location.key] = traffic["length"]
+    else:
+        last = last_summaries.get(location.key)
+        if last is None:
+            error_msg = f"[LALU LINTAS] Gagal ambil data ({location.name}): {traffic['message']}"
+            log.warning("[SERVER] [LALU LINTAS] Gagal ambil data (%s): %s", location.name, traffic["message"])
+            publish(location.key, error_msg)
+            return
+        log.info("[SERVER] Data basi dikirim untuk %s: %s", location.name, traffic["message"])
+        s = last._replace(stale=True)
+    # Alamat pantauan ikut dikirim agar client teks bisa UNSUBSCRIBE per lokasi, bukan per nama jalan
+    msg = f"{format_update(s)} | Alamat: {location.name}"
+    log.debug("[SERVER] %s", msg)
+    last_messages[location.key] = msg
+    with BROADCAST_SECONDS.time():
+        publish_update(location, s, msg)
+        update_corridors(location.key, s)
+
+# Bus event internal: hasil watch-list diterbitkan sebagai topik "traffic"
+bus = EventBus()
+bus.subscribe("traffic", traffic_updater)
+
+watchlist = WatchList(
+    fetch=get_traffic_data,
+    on_result=on_watch_result,
+    max_workers=POLL_WORKERS,
+    default_interval=UPDATE_INTERVAL,
+    jitter=POLL_JITTER,
+    rate_limit=API_RATE_LIMIT,
+    max_locations=MAX_WATCHED,
+    min_interval=MIN_UPDATE_INTERVAL,
+    max_interval=MAX_UPDATE_INTERVAL,
+    change=traffic_change,
+    # Di mode multi-worker hanya subscriber worker pemilik yang terhitung
+    weight=lambda key: len(subscriptions.subscribers(key)),
+    daily_quota=DAILY_QUOTA,
+    # Breaker flow terbuka: lewati poll (tanpa thread/kuota), subscriber menerima data basi.
+    # Saat half-open hanya satu poll yang dijalankan sebagai probe.
+    gate=lambda: tomtom.unavailable("flow", probe=True),
+)
+
+# Metrik jalur panas (lihat STATS atau METRICS_PORT)
+DATAGRAMS_IN = metrics.counter("datagrams_in", "Datagram diterima dari client")
+BYTES_IN = metrics.counter("bytes_in", "Byte diterima dari client")
+RECV_ERRORS = metrics.counter("recv_errors", "Datagram yang gagal diproses")
+HANDLE_SECONDS = metrics.histogram("handle_seconds", "Lama memproses satu datagram")
+BROADCAST_SECONDS = metrics.histogram("publish_seconds", "Lama menyiapkan fan-out satu update lokasi")
+REJECTED_MALFORMED = metrics.counter("rejected_datagrams", "Datagram yang ditolak", reason="malformed")
+REJECTED_UNKNOWN = metrics.counter("rejected_datagrams", "Datagram yang ditolak", reason="unknown")
+REJECTED_RATE = metrics.counter("rejected_datagrams", "Datagram yang ditolak", reason="rate_limit")
+REJECTED_BUSY = metrics.counter("rejected_datagrams", "Datagram yang ditolak", reason="busy")
+metrics.gauge("clients", lambda: len(clients), "Client aktif")
+metrics.gauge("rate_limit_buckets", lambda: len(limiter), "Bucket rate limit client yang aktif")
+metrics.gauge("watched_locations", lambda: len(watchlist), "Lokasi di daftar pantau proses ini")
+metrics.gauge("subscribed_locations", lambda: len(subscriptions.by_location), "Lokasi yang punya subscriber")
+metrics.gauge("poll_interval_avg",
+              lambda: sum(map(watchlist.effective_interval, watchlist.locations.values())) / len(watchlist) if len(watchlist) else None,
+              "Rata-rata interval poll efektif (detik)")
+metrics.gauge("quota_remaining", lambda: watchlist.quota.remaining() if watchlist.quota else None,
+              "Sisa kuota request TomTom hari ini")
+metrics.gauge("indexed_segments", lambda: len(segment_index), "Segmen jalan di indeks spasial")
+for _name, _cache in (("geocode", geocode_cache), ("reverse_geocode", road_cache)):
+    metrics.gauge("cache_hit_rate", lambda c=_cache: c.stats()["hit_rate"], "Rasio hit cache", cache=_name)
+    metrics.gauge("cache_size", lambda c=_cache: len(c), "Jumlah entri cache", cache=_name)
+
+def cmd_ping(addr, arg):
+    # Keepalive: last_seen sudah diperbarui oleh touch()
+    sender.send_now(b"PONG", addr)
+
+def cmd_quit(addr, arg):
+    log.debug("[SERVER] Client keluar: %s", addr)
+    reply(addr, "[SERVER] OK: Sampai jumpa.")
+    drop_client(addr)
+
+def cmd_join(addr, arg):
+    # JOIN[:BIN[,DELTA]] — mode biner & delta opsional, default teks
+    options = arg.upper().split(",") if arg else []
+    set_client_mode(addr, "BIN" in options, "DELTA" in options)
+    if "BIN" in options:
+        mode = "BIN,DELTA" if "DELTA" in options else "BIN"
+        reply(addr, f"[SERVER] MODE: {mode} v{protocol.VERSION}")
+    # JOIN ulang (mis. ganti mode atau client restart di port yang sama): langsung kirim state langganan yang ada
+    send_snapshot(addr, subscriptions.topics(addr))
+
+def parse_index(text, limit):
+    """Bilangan bulat 0 <= n < limit dari digit ASCII, atau None (mis. "²" atau "-1")."""
+    text = text.strip()
+    if not (text.isascii() and text.isdecimal()):
+        return None
+    value = int(text)
+    return value if value < limit else None
+
+def cmd_resync(addr, arg):
+    if arg is None:
+        # RESYNC: snapshot semua lokasi yang dilanggan client
+        send_snapshot(addr, subscriptions.topics(addr))
+    elif (loc_id := parse_index(arg, len(names.names))) is not None:
+        # RESYNC:<loc_id>: client mendeteksi paket hilang, kirim ulang keyframe terakhir lokasi tsb
+        name = names.lookup(loc_id)
+        stream = streams.get(location_key(name)) if name is not None else None
+        if stream is not None and stream.last_full is not None:
+            sender.send_record(stream.last_full, (addr,), stream.names)
+
+def cmd_replay(addr, arg):
+    # REPLAY:<loc_id>,<seq> — kirim ulang update sejak seq dari ring buffer
+    parts = arg.split(",")
+    if len(parts) == 2:
+        loc_id = parse_index(parts[0], len(names.names))
+        seq = parse_index(parts[1], 1 << 32)
+        if loc_id is not None and seq is not None:
+            send_replay(addr, loc_id, seq)
+
+def cmd_names(addr, arg):
+    # Client meminta ulang tabel nama (mis. paket MSG_NAMES hilang)
+    records = []
+    for part in arg.split(","):
+        name_id = parse_index(part, len(names.names))
+        name = names.lookup(name_id) if name_id is not None else None
+        if name is not None:
+            records.append(protocol.encode_name(name_id, name))
+    for datagram in protocol.pack(protocol.MSG_NAMES, records):
+        sender.send_now(datagram, addr)
+
+def spawn_lookup(addr, key, fn, *args):
+    """spawn() untuk perintah yang bisa memicu geocode baru untuk lokasi/koridor key.
+
+    Yang dibatasi (MAX_PENDING_LOOKUPS) hanya geocode berbeda yang sedang
+    berjalan: key yang sudah dipantau atau sedang di-geocode pemanggil lain
+    selalu diterima, jadi lonjakan untuk beberapa jalan populer tetap dilayani.
+    """
+    ready = is_watched(key) or key in corridors.active or key in geocode_flight
+    if not ready and len(geocode_flight) >= MAX_PENDING_LOOKUPS:
+        REJECTED_BUSY.inc()
+        reply(addr, "[SERVER] GAGAL: Server sedang sibuk, coba lagi nanti.")
+        return
+    spawn(fn(*args))
+
+def cmd_search(addr, arg):
+    log.debug("[SERVER] Menerima permintaan pencarian untuk: '%s' dari %s", arg, addr)
+    if location_key(arg) in corridors.definitions:
+        # Key koridor bukan alamat: jangan dipantau sebagai satu titik di bawah topik koridor
+        reply(addr, f"[SERVER] GAGAL: '{arg}' adalah koridor. Gunakan CORRIDOR:<nama> atau SUBSCRIBE.")
+        return
+    spawn_lookup(addr, location_key(arg), search_location, arg, addr)
+
+def cmd_subscribe(addr, arg):
+    if location_key(arg) in corridors.definitions:
+        spawn_lookup(addr, location_key(arg), subscribe_corridor, location_key(arg), addr)
+    else:
+        spawn_lookup(addr, location_key(arg), subscribe_location, arg, addr)
+
+def cmd_corridor(addr, arg):
+    key = corridor_key(arg)
+    if key in corridors.definitions:
+        spawn_lookup(addr, key, subscribe_corridor, key, addr)
+    else:
+        reply(addr, f"[SERVER] GAGAL: Koridor '{arg}' tidak dikenal. Kirim CORRIDORS untuk daftar koridor.")
+
+def cmd_corridors(addr, arg):
+    listing = {name: list(addresses) for name, addresses in corridors.definitions.values()}
+    reply(addr, f"[SERVER] CORRIDORS: {json.dumps(listing)}")
+
+def cmd_unsubscribe(addr, arg):
+    key = location_key(arg)
+    if addr not in subscriptions.subscribers(key):
+        reply(addr, f"[SERVER] GAGAL: Tidak berlangganan '{arg}'.")
+        return
+    if subscriptions.unsubscribe(addr, key):
+        release_locations([key])
+    reply(addr, f"[SERVER] OK: Berhenti berlangganan '{arg}'.")
+
+def cmd_history(addr, arg):
+    # HISTORY:<alamat>[,<raw|1m|15m|1h>[,<jumlah>]] — alamat boleh berisi koma, opsi dibaca dari belakang
+    parts = [p.strip() for p in arg.split(",")]
+    count = parse_index(parts[-1], 1 << 32) if len(parts) > 1 else None
+    if count is not None:
+        parts.pop()
+    else:
+        count = HISTORY_DEFAULT_COUNT
+    resolution = parts.pop().lower() if len(parts) > 1 and parts[-1].lower() in HISTORY_RESOLUTIONS else "1m"
+    address = ", ".join(parts)
+    spawn(query_history(addr, address, resolution, min(count, HISTORY_MAX_COUNT)))
+
+def build_stats():
+    """(pesan ringkasan, pesan-pesan lengkap dengan snapshot metrik) untuk STATS."""
+    stats = {
+        "geocode_cache": geocode_cache.stats(),
+        "road_cache": road_cache.stats(),
+        "watched": len(watchlist),
+        "clients": len(clients),
+    }
+    if coordinator is not None:
+        stats["worker"] = coordinator.index
+    budget = protocol.MAX_DATAGRAM - len(json.dumps(stats)) - 60   # Sisa untuk prefix, part & parts
+    chunks, chunk, size = [], {}, 0
+    for name, value in metrics.REGISTRY.snapshot().items():
+        item_size = len(json.dumps({name: value})) + 1
+        if chunk and size + item_size > budget:
+            chunks.append(chunk)
+            chunk, size = {}, 0
+        chunk[name] = value
+        size += item_size
+    chunks.append(chunk)
+    parts = [f"[SERVER] STATS: {json.dumps(dict(stats, part=part, parts=len(chunks), metrics=chunk))}"
+             for part, chunk in enumerate(chunks, 1)]
+    return f"[SERVER] STATS: {json.dumps(stats)}", parts
+
+def cmd_stats(addr, arg):
+    """Ringkasan server dalam satu datagram; client loopback juga menerima snapshot metrik.
+
+    Snapshot metrik jauh lebih besar dari perintahnya, jadi hanya dikirim ke
+    127.0.0.1/::1 (dipecah di bawah MAX_DATAGRAM). Dari jaringan, pakai METRICS_PORT.
+    Balasan dipakai ulang selama STATS_CACHE_TTL agar lonjakan STATS murah.
+    """
+    now = time.monotonic()
+    if now >= stats_cache[0]:
+        stats_cache[:] = [now + STATS_CACHE_TTL, *build_stats()]
+    if not ipaddress.ip_address(addr[0]).is_loopback:
+        reply(addr, stats_cache[1])
+        return
+    for message in stats_cache[2]:
+        reply(addr, message)
+
+def cmd_reset(addr, arg):
+    log.info("[SERVER] Menerima permintaan RESET dari %s", addr)
+    if coordinator is not None:
+        # Semua worker (termasuk yang ini) membersihkan state & memberi tahu client-nya
+        coordinator.reset()
+    elif set(watchlist.locations) - pinned or subscriptions.by_location:
+        watchlist.clear()
+        reset_monitoring()
+    else:
+        reply(addr, "[SERVER] INFO: Server sudah dalam mode standby.")
+
+class Command(NamedTuple):
+    handler: object
+    kind: str       # Jenis perintah untuk rate limit (key COMMAND_LIMITS)
+    arg: object     # True: wajib "PERINTAH:<argumen>", False: tanpa argumen, None: opsional
+
+# Tabel perintah: nama (huruf besar, sebelum ":") → handler(addr, argumen atau None)
+COMMANDS = {
+    "PING": Command(cmd_ping, "control", False),
+    "QUIT": Command(cmd_quit, "control", False),
+    "JOIN": Command(cmd_join, "control", None),
+    "RESYNC": Command(cmd_resync, "control", None),
+    "REPLAY": Command(cmd_replay, "control", True),
+    "NAMES": Command(cmd_names, "control", True),
+    "SEARCH": Command(cmd_search, "lookup", True),
+    "SUBSCRIBE": Command(cmd_subscribe, "lookup", True),
+    "CORRIDOR": Command(cmd_corridor, "lookup", True),
+    "UNSUBSCRIBE": Command(cmd_unsubscribe, "lookup", True),
+    "CORRIDORS": Command(cmd_corridors, "query", False),
+    "HISTORY": Command(cmd_history, "query", True),
+    "STATS": Command(cmd_stats, "query", False),
+    "RESET": Command(cmd_reset, "admin", False),
+}
+
+def handle_client(data, addr):
+    """Proses satu datagram perintah dari client lewat tabel COMMANDS.
+
+    Paket yang terlalu besar, tidak diawali huruf, atau bukan UTF-8 dibuang
+    sebelum/saat decode; perintah tidak dikenal atau dengan argumen yang
+    salah diabaikan tanpa mendaftarkan client. Tiap jenis perintah dibatasi
+    token bucket per alamat sumber (COMMAND_LIMITS; per IP untuk PER_IP_LIMITS)
+    dan anggaran bersama (GLOBAL_LIMITS) sebelum client didaftarkan
+    atau dibalas: penolakan pertama dijawab, berikutnya dibuang diam-diam agar
+    server tidak bisa dipakai memantulkan trafik ke alamat palsu.
+    """
+    if len(data) > MAX_COMMAND_SIZE or not data[:1].isalpha():
+        REJECTED_MALFORMED.inc()
+        return
+    try:
+        message = data.decode()
+    except UnicodeDecodeError:
+        REJECTED_MALFORMED.inc()
+        return
+    name, sep, arg = message.partition(":")
+    command = COMMANDS.get(name.strip().upper())
+    arg = arg.strip() if sep else None
+    if command is None or (command.arg is False and sep) or (command.arg is True and not arg):
+        REJECTED_UNKNOWN.inc()
+        return
+
+    # Rate limit lebih dulu: alamat yang dibanjiri tidak didaftarkan dan tidak dibalas berulang
+    rejected = limiter.acquire(addr, command.kind)
+    if rejected:
+        REJECTED_RATE.inc()
+        if rejected == 1:
+            reply(addr, "[SERVER] GAGAL: Terlalu banyak permintaan, coba lagi sebentar lagi.")
+        return
+
+    status = clients.touch(addr)
+    if status is None:
+        reply(addr, "[SERVER] GAGAL: Server penuh, coba lagi nanti.")
+        return
+    if status:
+        log.debug("[SERVER] Client baru: %s", addr)
+        reply(addr, "[SERVER] Anda berhasil terhubung! Server dalam mode standby. Silakan cari lokasi.")
+    command.handler(addr, arg)
+
+class TrafficServerProtocol(asyncio.DatagramProtocol):
+    """Inti server UDP: semua datagram diproses di satu event loop tanpa lock."""
+
+    def datagram_received(self, data, addr):
+        DATAGRAMS_IN.inc()
+        BYTES_IN.inc(len(data))
+        start = time.perf_counter()
+        try:
+            handle_client(data, addr)
         except Exception as e:
-            print(f"[RECV ERROR] {e}")
+            RECV_ERRORS.inc()
+            log.warning("[RECV ERROR] %s", e)
+        HANDLE_SECONDS.observe(time.perf_counter() - start)
 
-if __name__ == "__main__":
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind((SERVER_HOST, SERVER_PORT))
-    print(f"[SERVER] Berjalan di {SERVER_HOST}:{SERVER_PORT}")
-    print(f"[SERVER] Menunggu client untuk mencari lokasi...")
+    def error_received(self, exc):
+        # ICMP port unreachable dsb. untuk UDP; tidak fatal
+        RECV_ERRORS.inc()
+        log.warning("[RECV ERROR] %s", exc)
+
+async def main(worker_index=0, worker_count=1):
+    global sender, coordinator
+    loop = asyncio.get_running_loop()
+    if worker_count > 1:
+        transport, _ = await loop.create_datagram_endpoint(
+            TrafficServerProtocol, sock=reuseport_socket(SERVER_HOST, SERVER_PORT)
+        )
+        coordinator = Coordinator(worker_index, worker_count, SERVER_PORT, watchlist, bus, on_reset=reset_monitoring)
+        await coordinator.start()
+        if DAILY_QUOTA:
+            # Kuota dibagi rata: tiap worker hanya mem-poll lokasi miliknya
+            watchlist.quota = DailyQuota(max(1, DAILY_QUOTA // worker_count))
+    else:
+        transport, _ = await loop.create_datagram_endpoint(
+            TrafficServerProtocol, local_addr=(SERVER_HOST, SERVER_PORT)
+        )
+    # Semua request TomTom proses ini (poll, geocode, reverse geocode) memakai kuota yang sama
+    tomtom.set_quota(watchlist.quota)
+    sender = Sender(transport, on_error=drop_client)
+    watchlist.start()
+    if WATCH_LOCATIONS:
+        spawn(watch_startup_locations())
+    sweeper = loop.create_task(expire_clients())
+    purger = loop.create_task(purge_caches())
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = await metrics.serve_http("127.0.0.1", METRICS_PORT + worker_index)
+        log.info("[SERVER] Metrik tersedia di http://127.0.0.1:%d/metrics", METRICS_PORT + worker_index)
+    if worker_count > 1:
+        log.info("[SERVER] Worker %d/%d berjalan di %s:%d (pid %d)", worker_index, worker_count, SERVER_HOST, SERVER_PORT, os.getpid())
+    else:
+        log.info("[SERVER] Berjalan di %s:%d", SERVER_HOST, SERVER_PORT)
+        log.info("[SERVER] Menunggu client untuk mencari lokasi...")
+    if not TOMTOM_API_KEY and worker_index == 0:
+        log.warning("[SERVER] TOMTOM_API_KEY kosong (.env/environment); request ke %s bisa ditolak.", tomtom.BASE_URL)
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: andalkan KeyboardInterrupt
+    try:
+        await stop.wait()
+    finally:
+        if worker_count == 1:
+            log.info("\n[SERVER] Dimatikan.")
+        sweeper.cancel()
+        purger.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
+        await watchlist.stop()
+        sender.flush()
+        transport.close()
+        if coordinator is not None:
+            coordinator.close()
+        lookup_executor.shutdown(wait=False, cancel_futures=True)
+        history.close()
+        geocode_cache.close()
+        road_cache.close()
 
-    threading.Thread(target=handle_client, daemon=True).start()
-    threading.Thread(target=traffic_updater, daemon=True).start()
+def run_worker(index, count):
+    """Entry point satu proses worker (mode multi-worker)."""
+    logutil.setup()
+    try:
+        asyncio.run(main(index, count))
+    except KeyboardInterrupt:
+        pass
+
+def run_workers(count):
+    """Jalankan count proses worker yang berbagi port lewat SO_REUSEPORT."""
+    import multiprocessing
+
+    # "spawn": tiap worker membuka koneksi SQLite & thread pool sendiri
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=run_worker, args=(i, count), name=f"worker-{i}") for i in range(count)]
+    for proc in procs:
+        proc.start()
+    log.info("[SERVER] %d worker berjalan di %s:%d", count, SERVER_HOST, SERVER_PORT)
 
+    def terminate(*_):
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+    signal.signal(signal.SIGTERM, terminate)
     try:
-        while True:
-            time.sleep(1)
+        for proc in procs:
+            proc.join()
     except KeyboardInterrupt:
-        print("\n[SERVER] Dimatikan.")
-        sock.close()
\ No newline at end of file
+        # SIGINT sudah diterima juga oleh worker (satu process group); tunggu mereka selesai
+        for proc in procs:
+            proc.join()
+    log.info("\n[SERVER] Dimatikan.")
+
+if __name__ == "__main__":
+    logutil.setup()
+    if SERVER_WORKERS > 1 and hasattr(socket, "SO_REUSEPORT"):
+        run_workers(SERVER_WORKERS)
+    else:
+        if SERVER_WORKERS > 1:
+            log.warning("[SERVER] SO_REUSEPORT tidak didukung di platform ini, berjalan dengan 1 proses.")
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,91 @@
+# singleflight.py
+import asyncio
+import threading
+
+import metrics
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Gabungkan pemanggilan identik yang berjalan bersamaan (untuk thread worker).
+
+    Pemanggil pertama untuk satu key menjalankan fn; pemanggil lain dengan key
+    yang sama selama fn masih berjalan menunggu dan menerima hasil (atau
+    exception) yang sama, tanpa request upstream tambahan. Setelah selesai key
+    dilepas, jadi hasil tidak di-cache di sini.
+    """
+
+    def __init__(self, name="default"):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.shared = metrics.counter("singleflight_shared", "Pemanggilan yang menumpang request yang sedang berjalan", flight=name)
+
+    def do(self, key, fn, *args):
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = self.calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            self.shared.inc()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """Versi asyncio: pemanggil yang menunggu tidak memakai thread apa pun.
+
+    Dipakai dari thread event loop saja. factory() dipanggil sekali per key yang
+    sedang berjalan dan harus mengembalikan awaitable (coroutine atau future).
+    """
+
+    def __init__(self, name="default"):
+        self.pending = {}
+        self.shared = metrics.counter("singleflight_shared", "Pemanggilan yang menumpang request yang sedang berjalan", flight=name)
+
+    async def run(self, key, factory):
+        future = self.pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self.pending[key] = future
+            future.add_done_callback(lambda f: self._release(key, f))
+        else:
+            self.shared.inc()
+        # shield: satu pemanggil yang dibatalkan tidak membatalkan request bersama
+        return await asyncio.shield(future)
+
+    def _release(self, key, future):
+        if self.pending.get(key) is future:
+            del self.pending[key]
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __contains__(self, key):
+        return key in self.pending
@@ -0,0 +1,267 @@
+# tomtom.py
+# requests/urllib3 baru di-import saat session pertama dibuat (di thread worker),
+# bukan saat modul di-import, agar server bisa bind & melayani client secepatnya.
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from breaker import CLOSED, CircuitBreaker, CircuitOpenError
+from logutil import get_logger
+
+log = get_logger("tomtom")
+
+# Konfigurasi pool koneksi HTTP ke TomTom. Nilai di bawah adalah default;
+# environment (nama variabel di _ENV) dibaca saat pertama dipakai, bukan saat
+# import, agar nilai dari .env yang dimuat config.load() ikut berlaku.
+HTTP_POOL_SIZE = 32       # Koneksi keep-alive maksimum per host
+HTTP_RETRIES = 2          # Retry untuk error koneksi / 429 / 5xx
+HTTP_BACKOFF = 0.3        # Detik; jeda retry = backoff * 2^(n-1)
+HTTP_TIMEOUT = 10
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+BASE_URL = "https://api.tomtom.com"   # Arahkan ke mock_tomtom.py untuk uji beban
+BREAKER_THRESHOLD = 5     # Kegagalan beruntun sebelum breaker terbuka
+BREAKER_BACKOFF = 5.0     # Detik; lama terbuka pertama, berlipat dua tiap probe gagal
+BREAKER_MAX_BACKOFF = 300.0
+
+# Variabel environment → (nama konstanta, tipe)
+_ENV = {
+    "HTTP_POOL_SIZE": ("HTTP_POOL_SIZE", int),
+    "HTTP_RETRIES": ("HTTP_RETRIES", int),
+    "HTTP_BACKOFF": ("HTTP_BACKOFF", float),
+    "TOMTOM_BASE_URL": ("BASE_URL", str),
+    "BREAKER_THRESHOLD": ("BREAKER_THRESHOLD", int),
+    "BREAKER_BACKOFF": ("BREAKER_BACKOFF", float),
+    "BREAKER_MAX_BACKOFF": ("BREAKER_MAX_BACKOFF", float),
+}
+_env_loaded = False
+_env_lock = threading.Lock()
+
+_session = None
+_session_lock = threading.Lock()
+
+# Kuota harian bersama (objek dengan try_consume/refund, mis. watchlist.DailyQuota), atau None
+_quota = None
+
+# Circuit breaker per endpoint (flow, reverse_geocode, geocode, other)
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# Worker untuk sub-request paralel (terpisah dari worker pool pemanggil agar tidak deadlock),
+# dibuat saat pertama dipakai agar ukurannya mengikuti HTTP_POOL_SIZE dari environment
+_parallel = None
+_parallel_lock = threading.Lock()
+
+
+def _load_env():
+    """Timpa default di atas dengan environment, sekali per proses."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _env_lock:
+        if _env_loaded:
+            return
+        values = globals()
+        for env, (name, kind) in _ENV.items():
+            raw = os.getenv(env)
+            if raw:
+                try:
+                    values[name] = kind(raw)
+                except ValueError:
+                    log.warning("[CONFIG] Nilai %s tidak valid: %r, memakai %r", env, raw, values[name])
+        values["BASE_URL"] = BASE_URL.rstrip("/")
+        _env_loaded = True
+
+
+class QuotaExceededError(Exception):
+    """Request ditolak lokal karena kuota harian TomTom sudah habis."""
+
+
+def _build_session(pool_size):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    # Tanpa retry urllib3: get() mengulang sendiri agar tiap percobaan memakai kuota & tercatat di breaker
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def configure(pool_size=None, retries=None, backoff=None, base_url=None):
+    """Atur ulang ukuran pool, kebijakan retry, dan URL dasar. Session lama ditutup."""
+    global _session, HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_BACKOFF, BASE_URL
+    _load_env()
+    with _session_lock:
+        BASE_URL = BASE_URL if base_url is None else base_url.rstrip("/")
+        HTTP_POOL_SIZE = pool_size or HTTP_POOL_SIZE
+        HTTP_RETRIES = HTTP_RETRIES if retries is None else retries
+        HTTP_BACKOFF = HTTP_BACKOFF if backoff is None else backoff
+        old, _session = _session, None
+    if old is not None:
+        old.close()
+
+
+def set_quota(quota):
+    """Hitung setiap request yang benar-benar dikirim terhadap quota (None = tanpa batas)."""
+    global _quota
+    _quota = quota
+
+
+def get_session():
+    """Session bersama (thread-safe) dengan keep-alive, pool koneksi, dan retry + backoff."""
+    global _session
+    session = _session
+    if session is None:
+        _load_env()
+        with _session_lock:
+            if _session is None:
+                _session = _build_session(HTTP_POOL_SIZE)
+            session = _session
+    return session
+
+
+def url(path):
+    """URL lengkap endpoint TomTom, mis. url("/search/2/geocode/x.json")."""
+    _load_env()
+    return BASE_URL + path
+
+
+def endpoint_name(url):
+    """Label endpoint untuk metrik: flow, reverse_geocode, geocode, atau other."""
+    if "/flowSegmentData/" in url:
+        return "flow"
+    if "/reverseGeocode/" in url:
+        return "reverse_geocode"
+    if "/geocode/" in url:
+        return "geocode"
+    return "other"
+
+
+def breaker(endpoint):
+    """Circuit breaker untuk endpoint (dibuat saat pertama dipakai)."""
+    found = _breakers.get(endpoint)
+    if found is None:
+        _load_env()
+        with _breakers_lock:
+            found = _breakers.get(endpoint)
+            if found is None:
+                found = _breakers[endpoint] = CircuitBreaker(
+                    endpoint, BREAKER_THRESHOLD, BREAKER_BACKOFF, BREAKER_MAX_BACKOFF)
+    return found
+
+
+def _failed(circuit):
+    if circuit.failure():
+        log.warning("[UPSTREAM] Circuit breaker %s terbuka selama %.0f detik.", circuit.name, circuit.backoff)
+
+
+def _send(url, params, timeout, endpoint, circuit):
+    """Satu percobaan request: potong kuota, cek breaker, kirim, lalu catat hasilnya."""
+    quota = _quota
+    if quota is not None and not quota.try_consume():
+        raise QuotaExceededError("Kuota harian TomTom habis, dicoba lagi setelah reset tengah malam")
+    try:
+        circuit.check()
+    except CircuitOpenError:
+        if quota is not None:
+            quota.refund()
+        raise
+    start = time.perf_counter()
+    try:
+        response = get_session().get(url, params=params, timeout=timeout)
+    except Exception:
+        metrics.counter("upstream_errors", "Request TomTom gagal", endpoint=endpoint).inc()
+        _failed(circuit)
+        raise
+    finally:
+        metrics.histogram("upstream_latency_seconds", "Latensi request TomTom", endpoint=endpoint).observe(
+            time.perf_counter() - start)
+    if response.status_code >= 400:
+        metrics.counter("upstream_errors", "Request TomTom gagal", endpoint=endpoint).inc()
+    if response.status_code == 429 or response.status_code >= 500:
+        _failed(circuit)
+    else:
+        if circuit.state != CLOSED:
+            log.info("[UPSTREAM] Circuit breaker %s tertutup kembali.", endpoint)
+        circuit.success()
+    return response
+
+
+def _retry_delay(attempt, response):
+    delay = HTTP_BACKOFF * 2 ** (attempt - 1)
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdecimal():
+        delay = max(delay, min(int(retry_after), HTTP_TIMEOUT))
+    return delay
+
+
+def get(url, params=None, timeout=HTTP_TIMEOUT):
+    """GET lewat session bersama (pengganti requests.get), dengan metrik latensi & error per endpoint.
+
+    Naikkan CircuitOpenError tanpa request jika breaker endpoint sedang terbuka,
+    atau QuotaExceededError jika kuota harian (set_quota) habis. Error koneksi
+    dan status RETRY_STATUSES diulang hingga HTTP_RETRIES kali dengan backoff;
+    setiap percobaan memakai satu kuota dan dicatat breaker. Read timeout tidak
+    diulang (upstream lambat tidak membaik dengan dibebani lagi), begitu pula
+    bila breaker sudah terbuka atau kuota habis: hasil percobaan terakhir
+    langsung dikembalikan. Error koneksi/timeout, 429, dan 5xx dihitung sebagai
+    kegagalan upstream; 4xx lain (mis. alamat tidak valid) tidak.
+    """
+    import requests
+
+    endpoint = endpoint_name(url)
+    circuit = breaker(endpoint)
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            response = _send(url, params, timeout, endpoint, circuit)
+        except (CircuitOpenError, QuotaExceededError):
+            if attempt == 1:
+                raise
+            # Ditolak lokal selama jeda retry: laporkan hasil percobaan terakhir yang sebenarnya
+            if error is not None:
+                raise error
+            return response
+        except requests.ConnectionError as e:
+            error, response = e, None
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            error = None
+        quota = _quota
+        if (attempt > HTTP_RETRIES or circuit.retry_after() > 0
+                or (quota is not None and quota.remaining() == 0)):
+            if error is not None:
+                raise error
+            return response
+        metrics.counter("upstream_retries", "Request TomTom yang diulang", endpoint=endpoint).inc()
+        time.sleep(_retry_delay(attempt, response))
+
+
+def unavailable(endpoint, probe=False):
+    """Pesan alasan jika endpoint sedang tidak boleh dipanggil (breaker terbuka / menunggu probe), atau None.
+
+    probe=True: jika breaker half-open, pemanggil yang mendapat None memesan
+    satu-satunya probe (CircuitBreaker.reserve); pemanggil berikutnya ditolak.
+    """
+    circuit = breaker(endpoint)
+    wait = circuit.reserve() if probe else circuit.retry_after()
+    if wait > 0:
+        return f"Upstream {endpoint} sedang gangguan, dicoba lagi dalam {math.ceil(wait)} detik"
+    return None
+
+
+def submit(fn, *args):
+    """Jalankan fn di worker HTTP; kembalikan Future."""
+    global _parallel
+    if _parallel is None:
+        _load_env()
+        with _parallel_lock:
+            if _parallel is None:
+                _parallel = ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE, thread_name_prefix="http")
+    return _parallel.submit(fn, *args)
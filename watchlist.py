@@ -0,0 +1,343 @@
+# watchlist.py
+import asyncio
+import heapq
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from logutil import get_logger
+
+log = get_logger("watchlist")
+
+
+class RateBudget:
+    """Token bucket global untuk membatasi jumlah request ke API per detik."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+    def try_acquire(self):
+        """Ambil satu token. Kembalikan 0 jika berhasil, atau lama tunggu (detik) jika belum ada token."""
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (1 - self.tokens) / self.rate
+
+    def set_rate(self, rate):
+        """Ubah laju isi ulang (token yang sudah ada tetap)."""
+        self._refill(time.monotonic())
+        self.rate = float(rate)
+        self.capacity = max(1.0, self.rate)
+        self.tokens = min(self.tokens, self.capacity)
+
+
+class DailyQuota:
+    """Kuota request API harian (mis. 2500/hari untuk paket gratis TomTom), reset tengah malam waktu lokal.
+
+    Dipakai dari thread HTTP (tomtom.get memanggil try_consume tiap request)
+    dan dari event loop (penjadwal membaca remaining), jadi thread-safe.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.day = datetime.now().date()
+        self.lock = threading.Lock()
+
+    def _roll(self):
+        today = datetime.now().date()
+        if today != self.day:
+            self.day, self.used = today, 0
+
+    def remaining(self):
+        with self.lock:
+            self._roll()
+            return max(0, self.limit - self.used)
+
+    def try_consume(self):
+        """Pakai satu request dari kuota. False jika kuota hari ini sudah habis."""
+        with self.lock:
+            self._roll()
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+    def refund(self):
+        """Kembalikan satu request yang ternyata tidak jadi dikirim."""
+        with self.lock:
+            self.used = max(0, self.used - 1)
+
+    def seconds_until_reset(self):
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        return max(1.0, (midnight - now).total_seconds())
+
+    def sustainable_rate(self):
+        """Laju (request/detik) yang menghabiskan sisa kuota tepat saat reset."""
+        return self.remaining() / self.seconds_until_reset()
+
+
+class WatchedLocation:
+    """Satu titik yang dipantau beserta jadwalnya."""
+
+    __slots__ = ("key", "name", "lat", "lon", "interval", "next_due", "in_flight", "generation", "last_result",
+                 "volatility")
+
+    def __init__(self, key, name, lat, lon, interval):
+        self.key = key
+        self.name = name
+        self.lat = lat
+        self.lon = lon
+        self.interval = interval
+        self.next_due = 0.0
+        self.in_flight = False
+        self.generation = 0
+        self.last_result = None
+        self.volatility = None   # EWMA perubahan relatif antar poll (0..1); None = belum diketahui
+
+
+class WatchList:
+    """Daftar pantau banyak lokasi yang di-poll bersamaan di worker pool terbatas.
+
+    Penjadwal berjalan sebagai task asyncio; request HTTP (blocking) dijalankan
+    di ThreadPoolExecutor sehingga event loop tidak pernah tertahan. Tiap lokasi
+    punya jadwal sendiri (interval + jitter) dan jadwal berikutnya baru dihitung
+    setelah request selesai, jadi satu lokasi yang lambat tidak menunda lokasi
+    lain. Semua request berbagi satu RateBudget global.
+
+    Interval tiap lokasi adaptif jika diberi fungsi change(hasil lama, hasil baru):
+    lokasi yang datanya sering berubah di-poll lebih rapat (sampai min_interval),
+    yang stabil makin jarang (sampai max_interval); lokasi dengan banyak
+    subscriber (weight) di-poll lebih sering. Lokasi yang jatuh tempo masuk
+    antrean prioritas, sehingga saat anggaran request terbatas, refresh paling
+    bernilai jalan lebih dulu. Dengan daily_quota, laju global diturunkan agar
+    sisa kuota cukup sampai reset, dan poll berhenti saat kuota habis. Kuota
+    dihitung per request HTTP (juga geocode) oleh tomtom.get, bukan per poll.
+
+    gate() (opsional) dipanggil sebelum tiap poll; jika mengembalikan pesan
+    (mis. circuit breaker upstream terbuka), poll dilewati tanpa memakai
+    thread, token, maupun kuota, dan on_result menerima hasil error berisi
+    pesan itu sesuai jadwal biasa.
+
+    fetch(lat, lon, interval) dipanggil di thread worker; interval adalah
+    interval efektif lokasi saat itu (mis. batas umur data bersama yang boleh
+    dipakai ulang).
+
+    Semua method dipanggil dari thread event loop.
+    """
+
+    VOLATILITY_HIGH = 0.05   # Perubahan relatif rata-rata di atas ini: interval dipersingkat
+    VOLATILITY_LOW = 0.01    # Di bawah ini: interval diperpanjang
+    VOLATILITY_ALPHA = 0.3   # Bobot EWMA untuk perubahan terbaru
+
+    def __init__(self, fetch, on_result, max_workers=16, default_interval=3.5,
+                 jitter=0.1, rate_limit=10.0, max_locations=500, min_interval=None,
+                 max_interval=None, change=None, weight=None, daily_quota=None, gate=None):
+        self.fetch = fetch
+        self.gate = gate
+        self.on_result = on_result
+        self.default_interval = default_interval
+        self.min_interval = min_interval or default_interval
+        self.max_interval = max_interval or default_interval
+        self.jitter = jitter
+        self.max_locations = max_locations
+        self.change = change
+        self.weight = weight or (lambda key: 1)
+        self.rate_limit = rate_limit
+        self.budget = RateBudget(rate_limit)
+        self.quota = DailyQuota(daily_quota) if daily_quota else None
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="poller")
+        self.locations = {}
+        self.heap = []
+        self.ready = []   # Antrean prioritas lokasi yang sudah jatuh tempo
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.polls = set()
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __contains__(self, key):
+        return key in self.locations
+
+    def _schedule(self, loc, due):
+        loc.next_due = due
+        heapq.heappush(self.heap, (due, loc.generation, loc.key))
+        self.wakeup.set()
+
+    def add(self, key, name, lat, lon, interval=None):
+        """Tambahkan (atau perbarui) lokasi. Kembalikan False jika daftar pantau penuh."""
+        loc = self.locations.get(key)
+        if loc is None:
+            if len(self.locations) >= self.max_locations:
+                return False
+            loc = WatchedLocation(key, name, lat, lon, interval or self.default_interval)
+            self.locations[key] = loc
+        else:
+            loc.name, loc.lat, loc.lon = name, lat, lon
+            loc.interval = interval or loc.interval
+            loc.generation += 1
+        # Poll pertama segera, jadwal selanjutnya mengikuti interval
+        self._schedule(loc, time.monotonic())
+        return True
+
+    def remove(self, key):
+        return self.locations.pop(key, None) is not None
+
+    def clear(self):
+        self.locations.clear()
+        self.heap.clear()
+        self.ready.clear()
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+        for poll in list(self.polls):
+            poll.cancel()
+        pending = [t for t in (self.task, *self.polls) if t is not None]
+        await asyncio.gather(*pending, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _adapt(self, loc, previous, result):
+        """Perbarui volatilitas dan interval dasar lokasi dari perubahan hasil poll."""
+        if self.change is None or previous is None:
+            return
+        change = self.change(previous, result)
+        if change is None:
+            return
+        if loc.volatility is None:
+            loc.volatility = change
+        else:
+            loc.volatility += self.VOLATILITY_ALPHA * (change - loc.volatility)
+        if loc.volatility >= self.VOLATILITY_HIGH:
+            loc.interval = max(self.min_interval, loc.interval * 0.7)
+        elif loc.volatility < self.VOLATILITY_LOW:
+            loc.interval = min(self.max_interval, loc.interval * 1.25)
+
+    def effective_interval(self, loc):
+        """Interval dasar dipersingkat sesuai jumlah subscriber (log2), dibatasi min/max."""
+        weight = max(1, self.weight(loc.key))
+        interval = loc.interval / (1 + 0.5 * math.log2(weight))
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def priority(self, loc, now):
+        """Nilai satu refresh: subscriber × volatilitas × keterlambatan relatif."""
+        volatility = self.VOLATILITY_HIGH if loc.volatility is None else loc.volatility
+        overdue = max(0.0, now - loc.next_due) / self.effective_interval(loc)
+        return max(1, self.weight(loc.key)) * (0.5 + volatility / self.VOLATILITY_HIGH) * (1 + overdue)
+
+    def _next_interval(self, loc):
+        return self.effective_interval(loc) * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _update_rate(self):
+        """Laju global = min(rate_limit, laju yang masih muat di sisa kuota harian)."""
+        if self.quota is not None:
+            self.budget.set_rate(min(self.rate_limit, self.quota.sustainable_rate()))
+
+    async def _sleep_until(self, deadline):
+        """Tidur sampai deadline, atau lebih cepat jika ada jadwal baru (add)."""
+        self.wakeup.clear()
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _collect_due(self, now):
+        """Pindahkan lokasi yang jatuh tempo dari heap waktu ke antrean prioritas."""
+        while self.heap and self.heap[0][0] <= now:
+            _, generation, key = heapq.heappop(self.heap)
+            loc = self.locations.get(key)
+            # Entri basi (lokasi dihapus / dijadwal ulang) dilewati saja.
+            # Lokasi yang sedang di-poll akan dijadwalkan ulang oleh _poll.
+            if loc is None or loc.generation != generation or loc.in_flight:
+                continue
+            heapq.heappush(self.ready, (-self.priority(loc, now), loc.next_due, generation, key))
+
+    async def _run(self):
+        """Loop penjadwal: ambil lokasi jatuh tempo dengan prioritas tertinggi dan jalankan di worker pool."""
+        while True:
+            now = time.monotonic()
+            self._collect_due(now)
+            if not self.ready:
+                await self._sleep_until(self.heap[0][0] if self.heap else None)
+                continue
+            _, _, generation, key = self.ready[0]
+            loc = self.locations.get(key)
+            if loc is None or loc.generation != generation or loc.in_flight:
+                heapq.heappop(self.ready)   # Basi sejak masuk antrean
+                continue
+
+            reason = self.gate() if self.gate is not None else None
+            if reason:
+                heapq.heappop(self.ready)
+                self._deliver(loc, {"error": True, "skipped": True, "message": reason})
+                continue
+
+            if self.quota is not None and not self.quota.remaining():
+                # Kuota harian habis: tidak ada request sampai reset
+                await self._sleep_until(now + min(60.0, self.quota.seconds_until_reset()))
+                continue
+
+            self._update_rate()
+            wait = self.budget.try_acquire()
+            if wait:
+                # Anggaran request habis: tunggu token berikutnya (atau lokasi baru)
+                await self._sleep_until(now + min(wait, 60.0))
+                continue
+
+            # Kuota dipotong tomtom.get saat request benar-benar dikirim (lihat tomtom.set_quota)
+            heapq.heappop(self.ready)
+
+            loc.in_flight = True
+            poll = asyncio.get_running_loop().create_task(self._poll(loc, generation))
+            self.polls.add(poll)
+            poll.add_done_callback(self.polls.discard)
+
+    async def _poll(self, loc, generation):
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, self.fetch, loc.lat, loc.lon,
+                                                self.effective_interval(loc))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result = {"error": True, "message": str(e)}
+        finally:
+            loc.in_flight = False
+
+        if self.locations.get(loc.key) is not loc:
+            return
+        if loc.generation != generation:
+            # Koordinat berubah selama request berjalan: hasil lama dibuang, poll ulang segera
+            self._schedule(loc, time.monotonic())
+            return
+        previous, loc.last_result = loc.last_result, result
+        self._adapt(loc, previous, result)
+        self._deliver(loc, result)
+
+    def _deliver(self, loc, result):
+        """Jadwalkan poll berikutnya lalu serahkan hasil ke on_result."""
+        self._schedule(loc, time.monotonic() + self._next_interval(loc))
+        try:
+            self.on_result(loc, result)
+        except Exception as e:
+            log.error("[WATCHLIST ERROR] Callback gagal untuk %s: %s", loc.name, e)
@@ -0,0 +1,184 @@
+# workers.py
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import zlib
+
+from logutil import get_logger
+from watchlist import WatchedLocation
+
+log = get_logger("workers")
+
+WATCH_TIMEOUT = 2.0   # Detik menunggu jawaban worker pemilik atas permintaan watch
+
+
+def reuseport_socket(host, port):
+    """Socket UDP dengan SO_REUSEPORT: beberapa proses bisa bind ke port yang sama.
+
+    Kernel membagi datagram berdasarkan hash alamat pengirim, sehingga satu client
+    selalu dilayani worker yang sama.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.setblocking(False)
+    return sock
+
+
+def socket_path(port, index):
+    return os.path.join(tempfile.gettempdir(), f"trafficflow-{port}-{index}.sock")
+
+
+class CoordinatorProtocol(asyncio.DatagramProtocol):
+    def __init__(self, coordinator):
+        self.coordinator = coordinator
+
+    def datagram_received(self, data, addr):
+        try:
+            self.coordinator.handle(json.loads(data))
+        except Exception as e:
+            log.warning("[WORKER ERROR] Pesan koordinasi tidak valid: %s", e)
+
+    def error_received(self, exc):
+        log.warning("[WORKER ERROR] %s", exc)
+
+
+class Coordinator:
+    """Koordinasi antar worker lewat socket Unix datagram lokal.
+
+    Setiap lokasi punya satu worker pemilik (hash key % jumlah worker) yang
+    satu-satunya mem-poll TomTom untuk lokasi itu. Worker lain yang punya
+    subscriber mendaftarkan minat ke pemilik (yang menjawab apakah lokasi
+    masuk daftar pantaunya), lalu menerima hasilnya dan melakukan fan-out ke
+    client-nya sendiri.
+    """
+
+    def __init__(self, index, count, port, watchlist, bus, on_reset=None):
+        self.index = index
+        self.count = count
+        self.port = port
+        self.watchlist = watchlist
+        self.bus = bus
+        self.on_reset = on_reset
+        self.path = socket_path(port, index)
+        self.local = set()       # Lokasi yang punya subscriber di worker ini
+        self.interest = {}       # Lokasi milik worker ini → worker yang berminat
+        self.pending = {}        # Nomor permintaan watch → Future jawaban pemilik
+        self.next_request = 0
+        self.transport = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.path)
+        sock.setblocking(False)
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: CoordinatorProtocol(self), sock=sock)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def owner(self, key):
+        return zlib.crc32(key.encode()) % self.count
+
+    def _send(self, index, message):
+        if index == self.index:
+            self.handle(message)
+            return
+        try:
+            self.transport.sendto(json.dumps(message).encode(), socket_path(self.port, index))
+        except OSError as e:
+            log.warning("[WORKER ERROR] Gagal kirim ke worker %s: %s", index, e)
+
+    def is_watched(self, key):
+        return key in self.local
+
+    async def watch(self, key, name, lat, lon, timeout=WATCH_TIMEOUT):
+        """Daftarkan minat worker ini pada lokasi; pemilik yang mem-poll.
+
+        Kembalikan hasil WatchList.add di worker pemilik (False = daftar pantau
+        penuh). Jika pemilik tidak menjawab dalam timeout, minat tetap dicatat.
+        """
+        owner = self.owner(key)
+        if owner == self.index:
+            added = self._add_interest(key, name, lat, lon, self.index)
+        else:
+            self.next_request += 1
+            request = self.next_request
+            future = self.pending[request] = asyncio.get_running_loop().create_future()
+            self._send(owner, {"op": "watch", "key": key, "name": name, "lat": lat, "lon": lon,
+                               "from": self.index, "request": request})
+            try:
+                added = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                log.warning("[WORKER %s] Worker %s tidak menjawab watch '%s'.", self.index, owner, key)
+                added = True
+            finally:
+                self.pending.pop(request, None)
+        if added:
+            self.local.add(key)
+        return added
+
+    def _add_interest(self, key, name, lat, lon, worker):
+        """Di worker pemilik: pantau lokasi dan catat worker yang berminat. False jika daftar pantau penuh."""
+        if key not in self.watchlist and not self.watchlist.add(key, name, lat, lon):
+            log.warning("[WORKER %s] Daftar pantau penuh, '%s' tidak dipantau.", self.index, key)
+            return False
+        self.interest.setdefault(key, set()).add(worker)
+        return True
+
+    def unwatch(self, key):
+        if key not in self.local:
+            return False
+        self.local.discard(key)
+        self._send(self.owner(key), {"op": "unwatch", "key": key, "from": self.index})
+        return True
+
+    def reset(self):
+        for index in range(self.count):
+            self._send(index, {"op": "reset"})
+
+    def distribute(self, location, traffic):
+        """Dipanggil di worker pemilik setiap ada hasil poll: teruskan ke worker yang berminat."""
+        message = {"op": "traffic", "key": location.key, "name": location.name,
+                   "lat": location.lat, "lon": location.lon, "traffic": traffic}
+        for index in self.interest.get(location.key, ()):
+            if index == self.index:
+                self.bus.publish("traffic", location, traffic)
+            else:
+                self._send(index, message)
+
+    def handle(self, message):
+        op = message.get("op")
+        key = message.get("key")
+        if op == "watch":
+            added = self._add_interest(key, message["name"], message["lat"], message["lon"], message["from"])
+            self._send(message["from"], {"op": "watched", "request": message["request"], "added": added})
+        elif op == "watched":
+            future = self.pending.get(message["request"])
+            if future is not None and not future.done():
+                future.set_result(message["added"])
+        elif op == "unwatch":
+            workers = self.interest.get(key)
+            if workers is not None:
+                workers.discard(message["from"])
+                if not workers:
+                    del self.interest[key]
+                    self.watchlist.remove(key)
+        elif op == "traffic":
+            if key in self.local:
+                location = WatchedLocation(key, message["name"], message["lat"], message["lon"], 0)
+                self.bus.publish("traffic", location, message["traffic"])
+        elif op == "reset":
+            self.local.clear()
+            self.interest.clear()
+            self.watchlist.clear()
+            if self.on_reset:
+                self.on_reset()